@@ -0,0 +1,208 @@
+# Python imports
+import os
+import struct
+from base64 import b64decode, b64encode
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Algorand library imports.
+from algosdk import account, encoding
+
+# Import utility classes.
+from utils import Account
+
+# A keyring of named accounts, loaded once and shared by every operation. Keys are held as raw 64 byte ed25519 secret
+# keys (the 32 byte seed followed by the 32 byte public key) packed in one bytearray, so the address of an account is
+# read straight from its key instead of being derived again, and an `Account` is only built (once) for the accounts
+# actually used. Accounts are looked up in constant time by name (e.g. the "creator", "seller" and "buyer" roles) or by
+# address.
+#
+# Keystore file format: the KEYSTORE_MAGIC header, then one record per account: the length of the name (2 bytes, big
+# endian), the UTF-8 name, and the 64 byte raw key. Records are appended to the end of the file, so a keystore can be
+# written as the accounts are generated.
+
+KEY_LENGTH = 64
+KEYSTORE_MAGIC = b"ESCKEYS1"
+KEYSTORE_PATH = os.environ.get("ESCROW_KEYSTORE")
+ROLES = ("creator", "seller", "buyer")
+
+# Useful Classes
+# =============================================================================================
+
+class Keyring:
+    """Holds named accounts as raw keys, building (and caching) an `Account` for each account on first use."""
+
+    def __init__(self) -> None:
+        self.keys = bytearray()
+        self.names: List[str] = []
+
+        # the index of each account, by name and by raw public key.
+        self.by_name: Dict[str, int] = dict()
+        self.by_public_key: Dict[bytes, int] = dict()
+        self.accounts: Dict[int, Account] = dict()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.by_name
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __getitem__(self, name: str) -> Account:
+        index = self.by_name.get(name)
+        if index is None:
+            raise KeyError(f"No account named {name} in the keyring.")
+        return self.account(index)
+
+    def account(self, index: int) -> Account:
+        """ The account at an index of the keyring, built on first use."""
+        cached = self.accounts.get(index)
+        if cached is not None:
+            return cached
+
+        raw_key = bytes(self.keys[index * KEY_LENGTH:(index + 1) * KEY_LENGTH])
+        cached = Account(b64encode(raw_key).decode(), encoding.encode_address(raw_key[32:]))
+        self.accounts[index] = cached
+        return cached
+
+    def get(self, name: str) -> Optional[Account]:
+        index = self.by_name.get(name)
+        return self.account(index) if index is not None else None
+
+    def by_address(self, address: str) -> Optional[Account]:
+        """ The account of an address, if it is in the keyring."""
+        index = self.by_public_key.get(encoding.decode_address(address))
+        return self.account(index) if index is not None else None
+
+    def add_raw(self, name: str, raw_key: bytes) -> int:
+        """Add an account by its raw 64 byte secret key, replacing any account with the same name.
+
+        Returns:
+            The index of the account in the keyring.
+        """
+        if len(raw_key) != KEY_LENGTH:
+            raise Exception(f"Invalid private key for {name}: expected {KEY_LENGTH} bytes, got {len(raw_key)}.")
+
+        index = self.by_name.get(name)
+        if index is None:
+            index = len(self.names)
+            self.names.append(name)
+            self.keys += raw_key
+        else:
+            del self.by_public_key[bytes(self.keys[index * KEY_LENGTH + 32:(index + 1) * KEY_LENGTH])]
+            self.keys[index * KEY_LENGTH:(index + 1) * KEY_LENGTH] = raw_key
+            self.accounts.pop(index, None)
+
+        self.by_name[name] = index
+        self.by_public_key[bytes(raw_key[32:])] = index
+        return index
+
+    def add(self, name: str, private_key: str) -> Account:
+        """ Add an account by its private key, as returned by `algosdk.account.generate_account`."""
+        return self.account(self.add_raw(name, b64decode(private_key)))
+
+    def generate(self, name: str) -> Account:
+        """ Generate a new account and add it under a name."""
+        private_key, _ = account.generate_account()
+        return self.add(name, private_key)
+
+    def items(self) -> Iterator[Tuple[str, bytes]]:
+        """ The name and raw key of every account, in the order they were added."""
+        for index, name in enumerate(self.names):
+            yield name, bytes(self.keys[index * KEY_LENGTH:(index + 1) * KEY_LENGTH])
+
+    # Keystore files
+    # =============================================================================================
+
+    def save(self, path: str) -> None:
+        """ Write every account of the keyring to a keystore file, replacing it."""
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(KEYSTORE_MAGIC)
+            write_records(file, self.items())
+        os.replace(temporary_path, path)
+
+    def load(self, path: str) -> "Keyring":
+        """ Add every account of a keystore file to the keyring."""
+        with open(path, "rb") as file:
+            data = file.read()
+        if not data.startswith(KEYSTORE_MAGIC):
+            raise Exception(f"{path} is not a keystore file.")
+
+        for name, raw_key, _ in read_records(data):
+            self.add_raw(name, raw_key)
+        return self
+
+    @classmethod
+    def from_file(cls, path: str) -> "Keyring":
+        return cls().load(path)
+
+    @classmethod
+    def from_env(cls, roles: Iterable[str] = ROLES) -> "Keyring":
+        """ A keyring of the role accounts set in the environment (or .env) as <ROLE>_PK, e.g. CREATOR_PK."""
+        keyring = cls()
+        for role in roles:
+            private_key = os.environ.get(f"{role.upper()}_PK")
+            if private_key:
+                keyring.add(role, private_key)
+        return keyring
+
+def read_records(data: bytes) -> Iterator[Tuple[str, bytes, int]]:
+    """ The name, raw key and end offset of every complete record of the content of a keystore file."""
+    offset = len(KEYSTORE_MAGIC)
+    while offset + 2 <= len(data):
+        (name_length,) = struct.unpack_from(">H", data, offset)
+        end = offset + 2 + name_length + KEY_LENGTH
+        if end > len(data):
+            # a record cut short, by a writer killed in the middle of it.
+            return
+        yield data[offset + 2:offset + 2 + name_length].decode(), data[end - KEY_LENGTH:end], end
+        offset = end
+
+def open_keystore(path: str) -> BinaryIO:
+    """ Open a keystore file to append records to it, writing the header if the file is new, and dropping a record
+    cut short at its end if there is one."""
+    file = open(path, "r+b" if os.path.exists(path) else "w+b")
+    data = file.read()
+    if not data:
+        file.write(KEYSTORE_MAGIC)
+        return file
+    if not data.startswith(KEYSTORE_MAGIC):
+        file.close()
+        raise Exception(f"{path} is not a keystore file.")
+
+    end = len(KEYSTORE_MAGIC)
+    for _, _, end in read_records(data):
+        pass
+    file.seek(end)
+    file.truncate()
+    return file
+
+def write_records(file: BinaryIO, records: Iterable[Tuple[str, bytes]]) -> int:
+    """Write (name, raw key) records to an open keystore file.
+
+    Returns:
+        The number of records written.
+    """
+    count = 0
+    for name, raw_key in records:
+        encoded_name = name.encode()
+        file.write(struct.pack(">H", len(encoded_name)) + encoded_name + raw_key)
+        count += 1
+    return count
+
+# The default keyring, shared by the whole process.
+# =============================================================================================
+
+_default_keyring: Optional[Keyring] = None
+
+def get_keyring() -> Keyring:
+    """ The keyring of the role accounts from the environment, plus the keystore at ESCROW_KEYSTORE if set. Loaded once."""
+    global _default_keyring
+    if _default_keyring is None:
+        keyring = Keyring.from_env()
+        if KEYSTORE_PATH is not None and os.path.exists(KEYSTORE_PATH):
+            keyring.load(KEYSTORE_PATH)
+        _default_keyring = keyring
+    return _default_keyring
@@ -0,0 +1,195 @@
+# Python imports
+import os
+import sys
+import json
+import hashlib
+import threading
+from os.path import join, dirname
+from typing import Callable, Dict, Optional, Tuple
+from base64 import b64decode, b64encode
+from importlib import metadata
+
+# Algorand library and Pyteal imports.
+from algosdk.v2client.algod import AlgodClient
+from pyteal import compileTeal, Mode, Expr
+
+# Instrumentation of the compile stages.
+from instrumentation import span
+
+# Compiled program artifacts are content addressed: the key is a hash over the generated TEAL, the TEAL version and
+# the installed pyteal version, so any change to the contract (or to the compiler) produces a new entry and never
+# serves stale bytecode. Entries live in memory for the lifetime of the process and on disk in ARTIFACT_DIR, which can
+# be prebuilt on a connected machine (`python artifacts.py`) and copied to air-gapped deploy hosts.
+
+TEAL_VERSION = 5
+ARTIFACT_DIR = os.environ.get("ESCROW_ARTIFACT_DIR", join(dirname(__file__), ".artifacts"))
+PYTEAL_VERSION = metadata.version("pyteal")
+
+# Useful Classes
+# =============================================================================================
+
+class CompiledProgram:
+    """Represents a compiled TEAL program together with its source and the program hash returned by algod."""
+
+    def __init__(self, key: str, teal: str, program: bytes, program_hash: str) -> None:
+        self.key = key
+        self.teal = teal
+        self.program = program
+        self.hash = program_hash
+
+    def to_json(self) -> Dict[str, str]:
+        return {
+            "key": self.key,
+            "teal": self.teal,
+            "program": b64encode(self.program).decode(),
+            "hash": self.hash,
+            "teal_version": TEAL_VERSION,
+            "pyteal_version": PYTEAL_VERSION,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, str]) -> "CompiledProgram":
+        return cls(data["key"], data["teal"], b64decode(data["program"]), data["hash"])
+
+class ArtifactCache:
+    """An in-memory and on-disk cache of compiled programs, keyed by the content of the generated TEAL."""
+
+    def __init__(self, directory: Optional[str] = ARTIFACT_DIR) -> None:
+        self.directory = directory
+        self.memory: Dict[str, CompiledProgram] = dict()
+        self.compile_calls = 0
+        self.lock = threading.Lock()
+
+    def key(self, teal: str, version: int = TEAL_VERSION) -> str:
+        """ The content address of a TEAL program for the given TEAL version and the installed pyteal version."""
+        digest = hashlib.sha256()
+        digest.update(f"teal-v{version}|pyteal-{PYTEAL_VERSION}|".encode())
+        digest.update(teal.encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return join(self.directory, key + ".json")
+
+    def get(self, teal: str, version: int = TEAL_VERSION) -> Optional[CompiledProgram]:
+        key = self.key(teal, version)
+        compiled = self.memory.get(key)
+        if compiled is not None or self.directory is None:
+            return compiled
+
+        try:
+            with open(self.path(key)) as file:
+                compiled = CompiledProgram.from_json(json.load(file))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # an entry whose stored source does not match is treated as a miss rather than trusted.
+        if compiled.key != key or compiled.teal != teal:
+            return None
+
+        self.memory[key] = compiled
+        return compiled
+
+    def put(self, compiled: CompiledProgram) -> None:
+        self.memory[compiled.key] = compiled
+        if self.directory is None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        # write to a temporary file first so a concurrent reader never sees a half written entry.
+        temporary_path = self.path(compiled.key) + f".{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(compiled.to_json(), file)
+        os.replace(temporary_path, self.path(compiled.key))
+
+    def compile(self, client: Optional[AlgodClient], teal: str, version: int = TEAL_VERSION) -> CompiledProgram:
+        """Get the compiled program for some TEAL source, only calling algod `/compile` on a cache miss.
+
+        Args:
+            client: An algod client used to compile on a miss. Can be None when the cache is known to be warm.
+            teal: The TEAL source code.
+            version: The TEAL version the source was generated for.
+
+        Returns:
+            The compiled program.
+        """
+        compiled = self.get(teal, version)
+        if compiled is not None:
+            return compiled
+
+        with self.lock:
+            # another thread may have compiled the same program while we waited.
+            compiled = self.get(teal, version)
+            if compiled is not None:
+                return compiled
+
+            if client is None:
+                raise Exception("Program not found in the artifact cache and no algod client to compile it with.")
+
+            with span("stage", stage="algod_compile"):
+                response = client.compile(teal)
+            self.compile_calls += 1
+            compiled = CompiledProgram(self.key(teal, version), teal, b64decode(response["result"]), response["hash"])
+            self.put(compiled)
+
+        return compiled
+
+# Compiling functions
+# =============================================================================================
+
+default_cache = ArtifactCache()
+
+# generated TEAL per program builder, so the PyTeal AST is only built once per process.
+_teal_sources: Dict[Tuple[str, int], str] = dict()
+
+def generate_teal(program: Callable[[], Expr], version: int = TEAL_VERSION) -> str:
+    """ Build the PyTeal expression returned by `program` and compile it to TEAL source, once per process."""
+    name = (f"{program.__module__}.{program.__qualname__}", version)
+    teal = _teal_sources.get(name)
+    if teal is None:
+        with span("stage", stage="pyteal_compile"):
+            teal = compileTeal(program(), mode=Mode.Application, version=version)
+        _teal_sources[name] = teal
+    return teal
+
+def compile_program(
+    client: Optional[AlgodClient],
+    program: Callable[[], Expr],
+    version: int = TEAL_VERSION,
+    cache: Optional[ArtifactCache] = None,
+) -> CompiledProgram:
+    """Compile a PyTeal program builder (e.g. `contract.approval_program`) through the artifact cache.
+
+    Args:
+        client: An algod client used to compile on a cache miss.
+        program: A function returning the PyTeal expression of the program.
+        version: The TEAL version to generate.
+        cache: The artifact cache to use, the module default if not given.
+
+    Returns:
+        The compiled program.
+    """
+    cache = default_cache if cache is None else cache
+    return cache.compile(client, generate_teal(program, version), version)
+
+def known_programs() -> Dict[str, Callable[[], Expr]]:
+    """ All the programs deployed by the operations, by name."""
+    from contract import approval_program, clear_state_program, multi_listing_approval_program
+
+    return {
+        "approval_program": approval_program,
+        "clear_state_program": clear_state_program,
+        "multi_listing_approval_program": multi_listing_approval_program,
+    }
+
+def prebuild(client: AlgodClient, cache: Optional[ArtifactCache] = None) -> Dict[str, CompiledProgram]:
+    """ Compile every known program into the artifact cache, e.g. before shipping it to an air-gapped deploy host."""
+    return {name: compile_program(client, program, cache=cache) for name, program in known_programs().items()}
+
+
+if __name__ == "__main__":
+    from utils import get_client
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else ARTIFACT_DIR
+    for name, compiled in prebuild(get_client(), ArtifactCache(directory)).items():
+        print(f"{name}: {len(compiled.program)} bytes, hash {compiled.hash}, key {compiled.key}")
+    print(f"Artifacts written to {directory}")
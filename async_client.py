@@ -0,0 +1,223 @@
+# Python imports
+import ssl
+import json
+import asyncio
+from base64 import b64decode
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+# Algorand library imports.
+from algosdk import constants, encoding, error
+from algosdk.future.transaction import SuggestedParams
+
+# Import the node configuration.
+from utils import ALGOD_ADDRESS, ALGOD_TOKEN
+
+# An asyncio algod client over a pool of keep-alive HTTP/1.1 connections. The algosdk AlgodClient opens a new
+# connection (and blocks a thread) per request; here a bounded number of connections is shared by every coroutine, and
+# the pool size doubles as the concurrency limit towards the node.
+
+class ConnectionPool:
+    """A bounded pool of persistent HTTP/1.1 connections to a single host."""
+
+    def __init__(self, address: str, max_connections: int = 16) -> None:
+        url = urlparse(address)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if url.scheme == "https" else None
+        self.base_path = url.path.rstrip("/")
+
+        self.max_connections = max_connections
+        self.semaphore = asyncio.Semaphore(max_connections)
+        self.idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.connections_opened = 0
+
+    async def request(
+        self, method: str, path: str, headers: Dict[str, str], body: Optional[bytes] = None
+    ) -> Tuple[int, bytes]:
+        """Send a request over an idle connection (or a new one), waiting for a free slot if the pool is exhausted.
+
+        Returns:
+            The status code and body of the response.
+        """
+        async with self.semaphore:
+            reused = bool(self.idle)
+            connection = self.idle.pop() if reused else await self._connect()
+            try:
+                status, response, keep_alive = await self._exchange(connection, method, path, headers, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection[1].close()
+                if not reused:
+                    raise
+                # the server closed an idle connection under us, retry once on a fresh one.
+                connection = await self._connect()
+                try:
+                    status, response, keep_alive = await self._exchange(connection, method, path, headers, body)
+                except BaseException:
+                    connection[1].close()
+                    raise
+            except BaseException:
+                # a cancelled or failed exchange leaves the connection in an unknown state.
+                connection[1].close()
+                raise
+
+            if keep_alive:
+                self.idle.append(connection)
+            else:
+                connection[1].close()
+            return status, response
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        self.connections_opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+
+    async def _exchange(
+        self,
+        connection: Tuple[asyncio.StreamReader, asyncio.StreamWriter],
+        method: str,
+        path: str,
+        headers: Dict[str, str],
+        body: Optional[bytes],
+    ) -> Tuple[int, bytes, bool]:
+        reader, writer = connection
+        body = body or b""
+
+        lines = [f"{method} {self.base_path}{path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append(f"Content-Length: {len(body)}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        status_line = await reader.readuntil(b"\r\n")
+        status = int(status_line.split(b" ", 2)[1])
+
+        response_headers: Dict[str, str] = dict()
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            response = b"".join(chunks)
+        else:
+            response = await reader.readexactly(int(response_headers.get("content-length", 0)))
+
+        keep_alive = response_headers.get("connection", "").lower() != "close"
+        return status, response, keep_alive
+
+    async def close(self) -> None:
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
+
+class AsyncAlgodClient:
+    """An asyncio counterpart of algosdk's AlgodClient, covering the endpoints the project uses.
+
+    Args:
+        algod_token: The API token of the node.
+        algod_address: The address of the node, e.g. "http://localhost:4001".
+        max_connections: The number of keep-alive connections, and so of concurrent requests, towards the node.
+    """
+
+    def __init__(self, algod_token: str, algod_address: str, max_connections: int = 16) -> None:
+        self.algod_token = algod_token
+        self.algod_address = algod_address
+        self.pool = ConnectionPool(algod_address, max_connections)
+
+    async def algod_request(
+        self,
+        method: str,
+        requrl: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        header = {constants.algod_auth_header: self.algod_token}
+        if headers:
+            header.update(headers)
+
+        if requrl not in constants.unversioned_paths:
+            requrl = "/v2" + requrl
+        if params:
+            requrl = requrl + "?" + urlencode(params)
+
+        status, response = await self.pool.request(method, requrl, header, data)
+        if status >= 400:
+            message = response.decode("utf-8", "replace")
+            try:
+                message = json.loads(message)["message"]
+            except (ValueError, KeyError):
+                pass
+            raise error.AlgodHTTPError(message, status)
+
+        try:
+            return json.loads(response)
+        except ValueError as e:
+            raise error.AlgodResponseError("Failed to parse JSON response from algod") from e
+
+    async def status(self) -> Dict[str, Any]:
+        return await self.algod_request("GET", "/status")
+
+    async def status_after_block(self, block_num: int) -> Dict[str, Any]:
+        return await self.algod_request("GET", "/status/wait-for-block-after/" + str(block_num))
+
+    async def suggested_params(self) -> SuggestedParams:
+        res = await self.algod_request("GET", "/transactions/params")
+        return SuggestedParams(
+            res["fee"],
+            res["last-round"],
+            res["last-round"] + 1000,
+            res["genesis-hash"],
+            res["genesis-id"],
+            False,
+            res["consensus-version"],
+            res["min-fee"],
+        )
+
+    async def compile(self, source: str) -> Dict[str, Any]:
+        return await self.algod_request(
+            "POST", "/teal/compile", data=source.encode("utf-8"), headers={"Content-Type": "application/x-binary"}
+        )
+
+    async def send_raw_transaction(self, txn: bytes) -> str:
+        response = await self.algod_request(
+            "POST", "/transactions", data=txn, headers={"Content-Type": "application/x-binary"}
+        )
+        return response["txId"]
+
+    async def send_transaction(self, txn: Any) -> str:
+        return await self.send_transactions([txn])
+
+    async def send_transactions(self, txns: List[Any]) -> str:
+        return await self.send_raw_transaction(b"".join(b64decode(encoding.msgpack_encode(txn)) for txn in txns))
+
+    async def pending_transaction_info(self, transaction_id: str) -> Dict[str, Any]:
+        return await self.algod_request("GET", "/transactions/pending/" + transaction_id, params={"format": "json"})
+
+    async def application_info(self, application_id: int) -> Dict[str, Any]:
+        return await self.algod_request("GET", "/applications/" + str(application_id))
+
+    async def account_info(self, address: str) -> Dict[str, Any]:
+        return await self.algod_request("GET", "/accounts/" + address)
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    async def __aenter__(self) -> "AsyncAlgodClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+def get_async_client(max_connections: int = 16) -> AsyncAlgodClient:
+    """ The asyncio counterpart of `utils.get_client`."""
+    return AsyncAlgodClient(ALGOD_TOKEN, ALGOD_ADDRESS, max_connections)
@@ -0,0 +1,159 @@
+# Python imports
+from base64 import b64decode
+from typing import Dict, Optional, Tuple, Union
+
+# Algorand library imports.
+from algosdk.future.transaction import SuggestedParams
+
+# Import the contract programs and the compiled program artifact cache.
+from contract import approval_program, clear_state_program
+from artifacts import CompiledProgram, default_cache, generate_teal
+
+# Import the async client.
+from async_client import AsyncAlgodClient
+
+# Import the transaction builders shared with the blocking operations.
+from operations import DEFAULT_PRICE, create_escrow_txn, fund_escrow_txn, deposit_NFT_txns, pay_contract_txns
+
+# Import utility classes and functions.
+from utils import Account, Pending_txn_response, carbon_credit_txn, decodeState
+
+# asyncio variants of the operations in operations.py and utils.py. They build exactly the same transactions, but
+# talk to algod through an AsyncAlgodClient, so hundreds of trades can run concurrently on a single thread over a
+# bounded pool of keep-alive connections.
+
+# Async utility functions.
+# =============================================================================================
+
+async def wait_for_transaction(
+    client: AsyncAlgodClient, txID: str, timeout: int = 10
+) -> Pending_txn_response:
+    lastStatus = await client.status()
+    lastRound = lastStatus["last-round"]
+    startRound = lastRound
+
+    while lastRound < startRound + timeout:
+        pending_txn = await client.pending_transaction_info(txID)
+
+        if pending_txn.get("confirmed-round", 0) > 0:
+            return Pending_txn_response(pending_txn)
+
+        if pending_txn["pool-error"]:
+            raise Exception("Pool error: {}".format(pending_txn["pool-error"]))
+
+        lastStatus = await client.status_after_block(lastRound + 1)
+
+        lastRound += 1
+
+    raise Exception(
+        "Transaction {} not confirmed after {} rounds".format(txID, timeout)
+    )
+
+async def get_app_global_state(
+    client: AsyncAlgodClient, appID: int
+) -> Dict[bytes, Union[int, bytes]]:
+    appInfo = await client.application_info(appID)
+    return decodeState(appInfo["params"]["global-state"])
+
+async def compile_program(client: AsyncAlgodClient, program) -> CompiledProgram:
+    """ Compile a PyTeal program builder through the artifact cache, see `artifacts.compile_program`."""
+    teal = generate_teal(program)
+    compiled = default_cache.get(teal)
+    if compiled is None:
+        response = await client.compile(teal)
+        compiled = CompiledProgram(default_cache.key(teal), teal, b64decode(response["result"]), response["hash"])
+        default_cache.put(compiled)
+    return compiled
+
+async def create_NFT(seller: Account, client: AsyncAlgodClient, suggested_params: Optional[SuggestedParams] = None):
+    """ Create NFT in the sender account, see `utils.create_NFT`.
+
+    Returns:
+        NFT_ID: The NFT ID.
+    """
+    suggested_params = await client.suggested_params() if suggested_params is None else suggested_params
+    signed_NFT_txn = carbon_credit_txn(seller, suggested_params).sign(seller.getPrivateKey())
+    NFT_creation_txn = await client.send_transaction(signed_NFT_txn)
+
+    response = await wait_for_transaction(client, NFT_creation_txn)
+    return response.assetIndex
+
+# Async operation functions.
+# =============================================================================================
+
+async def get_contracts(client: AsyncAlgodClient) -> Tuple[bytes, bytes]:
+    """ Get the compiled TEAL contracts for the escrow, see `operations.get_contracts`."""
+    approval = await compile_program(client, approval_program)
+    clear = await compile_program(client, clear_state_program)
+    return approval.program, clear.program
+
+async def create_escrow_contract(client: AsyncAlgodClient, creator: Account) -> int:
+    """Create a new escrow contract, see `operations.create_escrow_contract`.
+
+    Returns:
+        The ID of the newly created escrow contract.
+    """
+    approval, clear = await get_contracts(client)
+    txn = create_escrow_txn(creator, approval, clear, await client.suggested_params())
+
+    signed_txn = txn.sign(creator.getPrivateKey())
+    await client.send_transaction(signed_txn)
+
+    response = await wait_for_transaction(client, signed_txn.get_txid())
+    assert response.applicationIndex is not None and response.applicationIndex > 0
+    return response.applicationIndex
+
+async def fund_escrow_contract(client: AsyncAlgodClient, funder: Account, application_ID: int):
+    """Fund the escrow contract, see `operations.fund_escrow_contract`.
+
+    Returns:
+        signed_fund_txn_id: the transaction ID of the funding transaction.
+    """
+    txn = fund_escrow_txn(funder, application_ID, await client.suggested_params())
+
+    signed_fund_txn = txn.sign(funder.getPrivateKey())
+    await client.send_transaction(signed_fund_txn)
+
+    signed_fund_txn_id = signed_fund_txn.get_txid()
+    await wait_for_transaction(client, signed_fund_txn_id)
+
+    return signed_fund_txn_id
+
+async def deposit_NFT(
+    client: AsyncAlgodClient, seller: Account, application_ID: int, NFT_ID: int, price: int = DEFAULT_PRICE
+):
+    """Deposit an NFT from the seller into the escrow contract at a price, see `operations.deposit_NFT`.
+
+    Returns:
+        signed_deposit_NFT_txn_id: the transaction ID of the NFT deposit transaction.
+    """
+    on_deposit_txn, deposit_NFT_txn = deposit_NFT_txns(
+        seller, application_ID, NFT_ID, await client.suggested_params(), price
+    )
+
+    signed_on_deposit_txn = on_deposit_txn.sign(seller.getPrivateKey())
+    signed_deposit_NFT_txn = deposit_NFT_txn.sign(seller.getPrivateKey())
+    await client.send_transactions([signed_on_deposit_txn, signed_deposit_NFT_txn])
+
+    signed_deposit_NFT_txn_id = signed_deposit_NFT_txn.get_txid()
+    await wait_for_transaction(client, signed_deposit_NFT_txn_id)
+
+    return signed_deposit_NFT_txn_id
+
+async def pay_contract(client: AsyncAlgodClient, application_ID: int, buyer: Account):
+    """Buy the NFT deposited in the escrow contract, see `operations.pay_contract`.
+
+    Returns:
+        signed_pay_txn_id: the transaction ID of the payment transaction from the buyer to the smart contract.
+    """
+    application_global_state = await get_app_global_state(client, application_ID)
+    suggested_params = await client.suggested_params()
+
+    txns = pay_contract_txns(application_ID, buyer, application_global_state, suggested_params)
+    signed_txns = [txn.sign(buyer.getPrivateKey()) for txn in txns]
+    await client.send_transactions(signed_txns)
+
+    signed_pay_txn_id = signed_txns[1].get_txid()
+    await wait_for_transaction(client, signed_pay_txn_id)
+
+    return signed_pay_txn_id
@@ -0,0 +1,289 @@
+# Python imports
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+# Algorand library imports.
+from algosdk.v2client.algod import AlgodClient
+
+# Import the local algod stand-in.
+from stub_algod import StubAlgodServer, StubLedger
+
+# Import the simulated ledger.
+from simulator import SimulatedAlgod, SimulatedLedger
+
+# Import the compiled program artifact cache, to start every run from a cold cache.
+import artifacts
+
+# Import the shared confirmation tracker and suggested params provider.
+from tracker import ConfirmationTracker
+from params import SuggestedParamsProvider
+
+# Import the keyring.
+from accounts import Keyring
+
+# Import operation functions.
+from operations import create_escrow_contract, fund_escrow_contract, deposit_NFT, pay_contract
+
+# Import utility functions.
+from utils import create_NFT
+
+# An end-to-end load test of the trade lifecycle (create, fund, mint, deposit, buy), running N lifecycles concurrently
+# through the operations against a local stub algod with a configurable block time. Every algod request is timed and
+# attributed to a stage by its endpoint, and every lifecycle step records its latency and the number of rounds it took.
+#
+#   python bench.py --trades 200 --concurrency 50 --block-time 0.5 --output bench.json
+#
+# Run with --naive to measure the operations without a shared confirmation tracker and suggested params provider, and
+# with --ledger simulated to run the trades against the simulated ledger (balances, holdings and contract logic) instead
+# of the stub, or --ledger in-process to skip HTTP altogether (no algod request timings then).
+
+LEDGERS = ("stub", "simulated", "in-process")
+# the balance of every account on the simulated ledger, so the generated accounts need no funding.
+SIMULATED_BALANCE = 10 ** 12
+
+# the stage of each algod endpoint, matched on the start of the request path.
+STAGES = (
+    ("/teal/compile", "compile"),
+    ("/transactions/params", "suggested_params"),
+    ("/transactions/pending", "confirmation"),
+    ("/transactions", "send"),
+    ("/status", "confirmation"),
+    ("/applications", "state_read"),
+    ("/accounts", "state_read"),
+)
+STEPS = ("create", "fund", "mint", "deposit", "buy")
+
+# Useful Classes
+# =============================================================================================
+
+class Recorder:
+    """Collects latency samples by name, from any number of threads."""
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = dict()
+        self.lock = threading.Lock()
+
+    def record(self, name: str, value: float) -> None:
+        with self.lock:
+            self.samples.setdefault(name, []).append(value)
+
+    def summary(self, scale: float = 1.0) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            return {name: summarize(values, scale) for name, values in sorted(self.samples.items())}
+
+class TimedAlgodClient(AlgodClient):
+    """An algod client timing every request, by stage."""
+
+    def __init__(self, algod_token: str, algod_address: str, recorder: Recorder) -> None:
+        super().__init__(algod_token, algod_address)
+        self.recorder = recorder
+
+    def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format="json"):
+        started = time.perf_counter()
+        try:
+            return super().algod_request(method, requrl, params, data, headers, response_format)
+        finally:
+            stage = next((stage for prefix, stage in STAGES if requrl.startswith(prefix)), "other")
+            self.recorder.record(stage, time.perf_counter() - started)
+
+# Statistics
+# =============================================================================================
+
+def percentile(values: List[float], fraction: float) -> float:
+    """ The nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    rank = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+def summarize(values: List[float], scale: float = 1.0) -> Dict[str, float]:
+    ordered = sorted(value * scale for value in values)
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+        "p50": percentile(ordered, 0.50),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Benchmark
+# =============================================================================================
+
+def run_benchmark(
+    trades: int = 100,
+    concurrency: int = 16,
+    block_time: float = 0.0,
+    naive: bool = False,
+    ledger_kind: str = "stub",
+) -> Dict[str, Any]:
+    """Run concurrent trade lifecycles against a fresh stub algod and measure them.
+
+    Args:
+        trades: The number of trade lifecycles to run.
+        concurrency: The number of lifecycles running at once.
+        block_time: The block time of the stub algod in seconds, 0 to produce blocks on demand.
+        naive: Whether to run the operations without a shared confirmation tracker and suggested params provider.
+        ledger_kind: The ledger to run against, one of LEDGERS.
+
+    Returns:
+        The configuration and results of the run, ready to be written as JSON.
+    """
+    server: Optional[StubAlgodServer] = None
+    if ledger_kind == "stub":
+        ledger = StubLedger(block_time)
+    elif ledger_kind in LEDGERS:
+        ledger = SimulatedLedger(block_time, default_balance=SIMULATED_BALANCE)
+    else:
+        raise Exception(f"Unknown ledger {ledger_kind}, expected one of {', '.join(LEDGERS)}.")
+    requests = Recorder()
+    steps = Recorder()
+    step_rounds = Recorder()
+    lifecycles = Recorder()
+    failures: List[str] = []
+
+    # every run compiles from scratch, so compile times are comparable across runs.
+    previous_cache = artifacts.default_cache
+    artifacts.default_cache = artifacts.ArtifactCache(tempfile.mkdtemp(prefix="escrow-bench-"))
+
+    if ledger_kind == "in-process":
+        client: AlgodClient = SimulatedAlgod(ledger)
+    else:
+        server = StubAlgodServer(ledger).start()
+        client = TimedAlgodClient("a" * 64, server.address, requests)
+    tracker: Optional[ConfirmationTracker] = None
+    params: Optional[SuggestedParamsProvider] = None
+    if not naive:
+        tracker = ConfirmationTracker(client).start()
+        params = SuggestedParamsProvider(client).attach(tracker)
+
+    keyring = Keyring()
+    for index in range(trades):
+        for role in ("creator", "seller", "buyer"):
+            keyring.generate(f"{role}-{index}")
+
+    def lifecycle(index: int) -> None:
+        creator, seller, buyer = (keyring[f"{role}-{index}"] for role in ("creator", "seller", "buyer"))
+        started = time.perf_counter()
+        state: Dict[str, Any] = dict()
+
+        def step(name: str, operation) -> None:
+            step_started, round_started = time.perf_counter(), ledger.round
+            state[name] = operation()
+            steps.record(name, time.perf_counter() - step_started)
+            step_rounds.record(name, ledger.round - round_started)
+
+        try:
+            step("create", lambda: create_escrow_contract(client, creator, tracker=tracker, params=params))
+            step("fund", lambda: fund_escrow_contract(client, creator, state["create"], tracker=tracker, params=params))
+            step("mint", lambda: create_NFT(seller, client, tracker=tracker, params=params))
+            step("deposit", lambda: deposit_NFT(client, seller, state["create"], state["mint"], tracker=tracker, params=params))
+            step("buy", lambda: pay_contract(client, state["create"], buyer, tracker=tracker, params=params))
+        except Exception as error:
+            failures.append(f"trade {index}: {error}")
+            return
+        lifecycles.record("lifecycle", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        # the operations print transaction IDs, which would drown the report.
+        with redirect_stdout(io.StringIO()), ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(lifecycle, range(trades)))
+    finally:
+        elapsed = time.perf_counter() - started
+        if tracker is not None:
+            tracker.stop()
+        if server is not None:
+            server.stop()
+        else:
+            ledger.stopping.set()
+        artifacts.default_cache = previous_cache
+
+    completed = trades - len(failures)
+    return {
+        "config": {
+            "trades": trades,
+            "concurrency": concurrency,
+            "block_time": block_time,
+            "naive": naive,
+            "ledger": ledger_kind,
+            "python": platform.python_version(),
+            "revision": git_revision(),
+        },
+        "elapsed_s": elapsed,
+        "completed": completed,
+        "failures": failures,
+        "throughput_trades_per_s": completed / elapsed if elapsed > 0 else 0.0,
+        "rounds": ledger.round,
+        "request_counts": dict(sorted(ledger.request_counts.items())),
+        "lifecycle_ms": lifecycles.summary(1000.0).get("lifecycle", summarize([])),
+        "stages_ms": requests.summary(1000.0),
+        "steps_ms": steps.summary(1000.0),
+        "steps_rounds": step_rounds.summary(),
+    }
+
+def print_results(results: Dict[str, Any]) -> None:
+    config = results["config"]
+    print(
+        f"{results['completed']}/{config['trades']} trades in {results['elapsed_s']:.2f}s "
+        f"({results['throughput_trades_per_s']:.1f} trades/s), {config['concurrency']} concurrent, "
+        f"block time {config['block_time']}s, {results['rounds']} rounds"
+    )
+    for title, key, unit in (
+        ("algod requests by stage", "stages_ms", "ms"),
+        ("lifecycle steps", "steps_ms", "ms"),
+        ("confirmation rounds by step", "steps_rounds", "rounds"),
+    ):
+        print(f"\n{title} ({unit}):")
+        print(f"    {'':<20}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for name, stats in results[key].items():
+            print(
+                f"    {name:<20}{stats['count']:>8}{stats['p50']:>10.2f}{stats['p95']:>10.2f}"
+                f"{stats['p99']:>10.2f}{stats['max']:>10.2f}"
+            )
+    for failure in results["failures"][:10]:
+        print("FAILED: " + failure)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the trade lifecycle against a local stub algod.")
+    parser.add_argument("--trades", type=int, default=100, help="the number of trade lifecycles")
+    parser.add_argument("--concurrency", type=int, default=16, help="the number of lifecycles running at once")
+    parser.add_argument("--block-time", type=float, default=0.0, help="the block time in seconds, 0 for on demand")
+    parser.add_argument("--naive", action="store_true", help="run without the shared tracker and params provider")
+    parser.add_argument("--ledger", choices=LEDGERS, default="stub", help="the ledger to run the trades against")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    arguments = parser.parse_args()
+
+    results = run_benchmark(
+        arguments.trades, arguments.concurrency, arguments.block_time, arguments.naive, arguments.ledger
+    )
+    if arguments.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {arguments.output}", file=sys.stderr)
+    sys.exit(1 if results["failures"] else 0)
@@ -0,0 +1,247 @@
+# Python imports
+import time
+import itertools
+import threading
+from urllib.error import URLError
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+# Algorand library imports.
+from algosdk import error
+from algosdk.v2client.algod import AlgodClient
+
+# Import the busy node errors of the submission scheduler.
+from scheduler import is_busy
+
+# An algod client spreading its requests over several nodes. It is an `AlgodClient` (every request of the SDK goes
+# through `algod_request`, which the pool overrides), so it can be passed to every operation in place of a single node:
+#
+#   client = ClientPool(["http://node-a:4001", "http://node-b:4001", "http://node-c:4001"], token).start()
+#
+# The pool keeps the last round and a moving average of the request latency of each node, from the requests it sends
+# and from a health check polling the status of every node every `health_interval` seconds (from a background thread
+# once started, from the requesting thread otherwise). It also keeps the highest round any node has shown it (a status,
+# an account round, a confirmed round), so a read never goes to a node behind what the client has already seen: an
+# operation reading the state of an app right after its call was confirmed reads it from a node that has the call.
+# Reads go to the fastest of the nodes at that round (or within `max_lag` rounds of it, to trade freshness for spread);
+# submissions go round robin over the nodes within `submit_lag` rounds. A node that cannot be reached (or answers with a
+# server error, or that its pool is full) is skipped for `cooldown` seconds and the request fails over to the next
+# node. A pending transaction unknown to a node (not gossiped there yet) is looked up on the others before giving up.
+#
+# `get_client` returns a pool shared by the whole process when ALGOD_ADDRESSES lists several nodes.
+
+# the weight of the latest request in the latency moving average.
+LATENCY_SMOOTHING = 0.3
+
+# Useful Classes
+# =============================================================================================
+
+class Endpoint:
+    """An algod node of a pool, with its last known round and request latency."""
+
+    def __init__(self, address: str, token: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.address = address
+        self.client = AlgodClient(token, address, headers)
+        self.last_round: Optional[int] = None
+        # the moving average of the request latency in seconds, None until a first request returned.
+        self.latency: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_error: Optional[Exception] = None
+
+    def available(self, now: float) -> bool:
+        return self.down_until <= now
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "address": self.address,
+            "last_round": self.last_round,
+            "latency": self.latency,
+            "requests": self.requests,
+            "failures": self.failures,
+            "available": self.available(time.monotonic()),
+        }
+
+class ClientPool(AlgodClient):
+    """An algod client routing reads to the fastest node in sync and spreading submissions, failing over on errors.
+
+    Args:
+        addresses: The addresses of the algod nodes.
+        token: The API token of the nodes.
+        headers: Additional headers sent with every request.
+        max_lag: The number of rounds a node may be behind the latest round seen and still be read from.
+        submit_lag: The number of rounds a node may be behind the latest round seen and still be sent transactions.
+        cooldown: The number of seconds a failed node is skipped for.
+        health_interval: The number of seconds between health checks.
+    """
+
+    def __init__(
+        self,
+        addresses: Sequence[str],
+        token: str,
+        headers: Optional[Dict[str, str]] = None,
+        max_lag: int = 0,
+        submit_lag: int = 2,
+        cooldown: float = 5.0,
+        health_interval: float = 2.0,
+    ) -> None:
+        if not addresses:
+            raise Exception("A client pool needs at least one algod address")
+        super().__init__(token, addresses[0], headers)
+        self.endpoints = [Endpoint(address, token, headers) for address in addresses]
+        self.max_lag = max_lag
+        self.submit_lag = submit_lag
+        self.cooldown = cooldown
+        self.health_interval = health_interval
+
+        self.submissions = itertools.count()
+        # the highest round any node has shown this client.
+        self.observed_round = 0
+        self.lock = threading.Lock()
+        self.checked_at: Optional[float] = None
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    # Routing
+    # =============================================================================================
+
+    def _order(self, submission: bool) -> List[Endpoint]:
+        """ The endpoints to try a request on, in order: the in sync ones, then the lagging ones, then the down ones."""
+        now = time.monotonic()
+        with self.lock:
+            available = [endpoint for endpoint in self.endpoints if endpoint.available(now)]
+            latest = max([self.observed_round] + [endpoint.last_round or 0 for endpoint in available])
+            lowest = latest - (self.submit_lag if submission else self.max_lag)
+            in_sync = [endpoint for endpoint in available if (endpoint.last_round or 0) >= lowest]
+            # when no node is known to be there, the most advanced ones are the best bet.
+            lagging = sorted(
+                (endpoint for endpoint in available if (endpoint.last_round or 0) < lowest),
+                key=lambda endpoint: -(endpoint.last_round or 0),
+            )
+            down = sorted(
+                (endpoint for endpoint in self.endpoints if not endpoint.available(now)),
+                key=lambda endpoint: endpoint.down_until,
+            )
+
+        if submission and in_sync:
+            start = next(self.submissions) % len(in_sync)
+            in_sync = in_sync[start:] + in_sync[:start]
+        else:
+            # nodes never timed go first, so every node gets measured.
+            in_sync.sort(key=lambda endpoint: endpoint.latency if endpoint.latency is not None else -1.0)
+        return in_sync + lagging + down
+
+    def algod_request(
+        self,
+        method: str,
+        requrl: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        response_format: str = "json",
+    ) -> Any:
+        # without the background thread, the health check runs in the requesting thread when it is due.
+        if self.thread is None and (
+            self.checked_at is None or time.monotonic() - self.checked_at >= self.health_interval
+        ):
+            self.check()
+
+        submission = method == "POST" and requrl == "/transactions"
+        # waiting for a round takes as long as the round, not as long as the node.
+        timed = not requrl.startswith("/status/wait-for-block-after")
+        pending = requrl.startswith("/transactions/pending/")
+
+        last_error: Optional[Exception] = None
+        for endpoint in self._order(submission):
+            started = time.perf_counter()
+            try:
+                response = endpoint.client.algod_request(method, requrl, params, data, headers, response_format)
+            except error.AlgodHTTPError as request_error:
+                if pending and request_error.code == 404:
+                    # not in the pool of this node (yet); another node may have it.
+                    last_error = request_error
+                    continue
+                if (request_error.code or 0) < 500 and not is_busy(request_error):
+                    # the request itself is wrong, e.g. a rejected transaction: every node would say the same.
+                    raise
+                self._failed(endpoint, request_error)
+                last_error = request_error
+                continue
+            except (URLError, OSError, error.AlgodResponseError) as request_error:
+                self._failed(endpoint, request_error)
+                last_error = request_error
+                continue
+
+            self._succeeded(endpoint, response, time.perf_counter() - started if timed else None)
+            return response
+
+        raise last_error
+
+    def _succeeded(self, endpoint: Endpoint, response: Any, latency: Optional[float]) -> None:
+        with self.lock:
+            endpoint.requests += 1
+            endpoint.down_until = 0.0
+            if latency is not None:
+                endpoint.latency = latency if endpoint.latency is None else (
+                    LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * endpoint.latency
+                )
+            # status, account and confirmed transaction responses carry a round the node has reached.
+            if isinstance(response, dict):
+                round = response.get("last-round") or response.get("round") or response.get("confirmed-round")
+                if round:
+                    endpoint.last_round = max(endpoint.last_round or 0, round)
+                    self.observed_round = max(self.observed_round, round)
+
+    def _failed(self, endpoint: Endpoint, request_error: Exception) -> None:
+        with self.lock:
+            endpoint.requests += 1
+            endpoint.failures += 1
+            endpoint.last_error = request_error
+            endpoint.down_until = time.monotonic() + self.cooldown
+
+    # Health checks
+    # =============================================================================================
+
+    def check(self) -> List[Dict[str, Any]]:
+        """Check the status of every node at once, updating their last round, latency and availability.
+
+        Returns:
+            The state of every endpoint, as JSON-ready dictionaries.
+        """
+        def check_endpoint(endpoint: Endpoint) -> None:
+            started = time.perf_counter()
+            try:
+                status = endpoint.client.status()
+            except Exception as check_error:
+                self._failed(endpoint, check_error)
+                return
+            self._succeeded(endpoint, status, time.perf_counter() - started)
+
+        with ThreadPoolExecutor(len(self.endpoints)) as executor:
+            list(executor.map(check_endpoint, self.endpoints))
+        self.checked_at = time.monotonic()
+        return self.stats()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [endpoint.to_json() for endpoint in self.endpoints]
+
+    def start(self) -> "ClientPool":
+        """ Check the health of the nodes from a background thread, every `health_interval` seconds."""
+        if self.thread is None:
+            self.check()
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name="client-pool-health", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
+    def _run(self) -> None:
+        while not self.stopping.wait(self.health_interval):
+            self.check()
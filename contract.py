@@ -15,11 +15,31 @@ def approval_program():
         Approve(),
     )
 
-    # A method called by the seller to deposit the NFT in the contract.
+    # A method called by the seller to deposit the NFT in the contract, grouped with the NFT transfer to the contract
+    # right after it. The contract must be empty, or its previous NFT sold: the buyer of that NFT is cleared, so the
+    # state of a contract reused after a sale shows it is for sale again.
+    # app args: "deposit", seller address (the sender of the call), NFT ID (8 bytes), price (8 bytes).
+    deposit_txn = Gtxn[Txn.group_index() + Int(1)]
+    deposited_nft_id = App.globalGetEx(Int(0), nft_id_key)
+    sold_to = App.globalGetEx(Int(0), buyer_address_key)
     on_deposit = Seq(
+        deposited_nft_id,
+        sold_to,
+        Assert(
+            And(
+                Or(Not(deposited_nft_id.hasValue()), sold_to.hasValue()),
+                Txn.application_args[1] == Txn.sender(),
+                deposit_txn.type_enum() == TxnType.AssetTransfer,
+                deposit_txn.xfer_asset() == Btoi(Txn.application_args[2]),
+                deposit_txn.asset_amount() == Int(1),
+                deposit_txn.asset_receiver() == Global.current_application_address(),
+                deposit_txn.sender() == Txn.sender(),
+            )
+        ),
         App.globalPut(seller_address_key, Txn.application_args[1]),
         App.globalPut(nft_id_key, Btoi(Txn.application_args[2])),
         App.globalPut(price_key, Btoi(Txn.application_args[3])),
+        App.globalDel(buyer_address_key),
         InnerTxnBuilder.Begin(),
         InnerTxnBuilder.SetFields(
             {
@@ -55,9 +75,24 @@ def approval_program():
             ),
         )
 
-    # A method called by the buyer to deposit the required NFT price in Algos in the smart contract.
+    # A method called by the buyer, grouped right after their payment of the NFT price to the smart contract.
     # It also handles the transfer of the NFT from the smart contract to the buyer.
+    # app args: "buy", buyer address (the sender of the call). The NFT must still be for sale: no buyer yet.
+    payment_txn = Gtxn[Txn.group_index() - Int(1)]
+    previous_buyer = App.globalGetEx(Int(0), buyer_address_key)
     on_buy = Seq(
+        previous_buyer,
+        Assert(
+            And(
+                Not(previous_buyer.hasValue()),
+                Txn.group_index() > Int(0),
+                Txn.application_args[1] == Txn.sender(),
+                payment_txn.type_enum() == TxnType.Payment,
+                payment_txn.sender() == Txn.sender(),
+                payment_txn.receiver() == Global.current_application_address(),
+                payment_txn.amount() == App.globalGet(price_key),
+            )
+        ),
         App.globalPut(buyer_address_key, Txn.application_args[1]),
 
         # start inner transaction payment of money from contract to seller
@@ -103,3 +138,133 @@ def approval_program():
 def clear_state_program():
     # no logic here, as not necessary 
     return Approve()
+
+# The multi-listing mode: a single application holding many concurrent listings, one per NFT. Each listing lives in its
+# own global state key, the 8 byte NFT ID, holding the seller address (32 bytes) followed by the price (8 bytes), so up
+# to MAX_LISTINGS listings share one deployment and one minimum balance.
+MAX_LISTINGS = 64
+
+def multi_listing_approval_program():
+    # the listing of the NFT passed as the first foreign asset of the app call.
+    nft_id = Txn.assets[0]
+    listing_key = Itob(nft_id)
+    listing = App.globalGetEx(Int(0), listing_key)
+    listing_seller = Extract(listing.value(), Int(0), Int(32))
+    listing_price = ExtractUint64(listing.value(), Int(32))
+
+    # a "constructor" method for contracts to allow for some logic to be executed upon deployment.
+    on_create = Seq(
+        Approve(),
+    )
+
+    @Subroutine(TealType.none)
+    def close_nft_to(assetID: Expr, account: Expr) -> Expr:
+        """ Helper function to transfer the NFT held by the contract to the required account, closing the holding."""
+        return Seq(
+            InnerTxnBuilder.Begin(),
+            InnerTxnBuilder.SetFields(
+                {
+                    TxnField.type_enum: TxnType.AssetTransfer,
+                    TxnField.xfer_asset: assetID,
+                    TxnField.asset_close_to: account,
+                }
+            ),
+            InnerTxnBuilder.Submit(),
+        )
+
+    # A method called by a seller to list an NFT at a price, grouped with the NFT transfer to the contract right after it.
+    # app args: "deposit", price (8 bytes).
+    deposit_txn = Gtxn[Txn.group_index() + Int(1)]
+    asset_holding = AssetHolding.balance(Global.current_application_address(), nft_id)
+    on_deposit = Seq(
+        listing,
+        Assert(Not(listing.hasValue())),
+        Assert(Len(Txn.application_args[1]) == Int(8)),
+        Assert(
+            And(
+                deposit_txn.type_enum() == TxnType.AssetTransfer,
+                deposit_txn.xfer_asset() == nft_id,
+                deposit_txn.asset_amount() == Int(1),
+                deposit_txn.asset_receiver() == Global.current_application_address(),
+                deposit_txn.sender() == Txn.sender(),
+            )
+        ),
+        App.globalPut(listing_key, Concat(Txn.sender(), Txn.application_args[1])),
+        # opt the contract into the NFT, unless it still is from an earlier listing of the same NFT.
+        asset_holding,
+        If(Not(asset_holding.hasValue())).Then(
+            Seq(
+                InnerTxnBuilder.Begin(),
+                InnerTxnBuilder.SetFields(
+                    {
+                        TxnField.type_enum: TxnType.AssetTransfer,
+                        TxnField.xfer_asset: nft_id,
+                        TxnField.asset_receiver: Global.current_application_address(),
+                    }
+                ),
+                InnerTxnBuilder.Submit(),
+            )
+        ),
+        Approve(),
+    )
+
+    # A method called by a buyer, grouped right after their payment of the listing price to the contract. It pays the
+    # seller and sends the NFT to the buyer. The seller must be passed as the second account of the app call.
+    payment_txn = Gtxn[Txn.group_index() - Int(1)]
+    on_buy = Seq(
+        listing,
+        Assert(listing.hasValue()),
+        Assert(
+            And(
+                Txn.group_index() > Int(0),
+                payment_txn.type_enum() == TxnType.Payment,
+                payment_txn.sender() == Txn.sender(),
+                payment_txn.receiver() == Global.current_application_address(),
+                payment_txn.amount() == listing_price,
+            )
+        ),
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.amount: listing_price,
+                TxnField.receiver: listing_seller,
+            }
+        ),
+        InnerTxnBuilder.Submit(),
+        close_nft_to(nft_id, Txn.sender()),
+        App.globalDel(listing_key),
+        Approve(),
+    )
+
+    # A method called by the seller to take an NFT off the market and get it back.
+    on_cancel = Seq(
+        listing,
+        Assert(listing.hasValue()),
+        Assert(listing_seller == Txn.sender()),
+        close_nft_to(nft_id, Txn.sender()),
+        App.globalDel(listing_key),
+        Approve(),
+    )
+
+    # handling the calling of methods.
+    on_call = Cond(
+        [Txn.application_args[0] == Bytes("deposit"), on_deposit],
+        [Txn.application_args[0] == Bytes("buy"), on_buy],
+        [Txn.application_args[0] == Bytes("cancel"), on_cancel],
+    )
+
+    program = Cond(
+        [Txn.application_id() == Int(0), on_create],
+        [Txn.on_completion() == OnComplete.NoOp, on_call],
+        [
+            Or(
+                Txn.on_completion() == OnComplete.OptIn,
+                Txn.on_completion() == OnComplete.CloseOut,
+                Txn.on_completion() == OnComplete.UpdateApplication,
+            ),
+            Reject(),
+        ],
+    )
+
+    return program
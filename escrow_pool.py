@@ -0,0 +1,294 @@
+# Python imports
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Set, Tuple, Union
+
+# Algorand library imports.
+from algosdk.v2client.algod import AlgodClient
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+
+# Import the shared confirmation tracker and suggested params provider.
+from tracker import ConfirmationTracker
+from params import SuggestedParamsProvider
+
+# Import the global state cache and the submission scheduler.
+from state_cache import GlobalStateCache
+from scheduler import SubmissionScheduler
+
+# Import the instrumentation counters.
+from instrumentation import count
+
+# Import the escrow operations.
+from operations import (
+    DEFAULT_PRICE, ESCROW_FUNDING_AMOUNT, MAX_GROUP_SIZE, create_escrow_contracts, deposit_NFT, fund_escrow_txn,
+    pay_contract,
+)
+
+# Import utility classes and functions.
+from utils import Account, decodeState, get_suggested_params, send_and_wait
+
+# A pool of escrow contracts created and funded ahead of time, so listing an NFT only takes the deposit round instead
+# of waiting for a contract to be created and funded first. An escrow contract can be reused once its NFT is sold: the
+# next deposit overwrites the seller, NFT ID and price (and clears the buyer), so sold escrows go back to the pool.
+#
+#   pool = EscrowPool(client, creator, size=16, tracker=tracker).start()
+#   app_ID = pool.deposit(seller, NFT_ID, price)      # one round
+#   pool.buy(buyer, app_ID)                           # the escrow is recycled once the sale is confirmed
+#
+# Recycled escrows are checked against their global state (nothing deposited, or sold) and their balance is topped up
+# with the fees the last sale spent before they are handed out again. Escrows whose state does not check out are
+# dropped from the pool. A background thread (`start`) keeps `size` escrows idle; without it, `acquire` fills the pool
+# itself when it runs dry.
+
+# Useful Classes
+# =============================================================================================
+
+def escrow_reusable(application_global_state: Dict[bytes, Union[int, bytes]]) -> bool:
+    """ Whether an escrow contract can take a new deposit: nothing was deposited yet, or the NFT was bought."""
+    return b"seller" not in application_global_state or b"buyer" in application_global_state
+
+class EscrowPool:
+    """Keeps a number of idle, funded escrow contracts ready for deposits, and recycles them after a sale.
+
+    Args:
+        client: An algod client.
+        creator: The account creating the escrow contracts.
+        size: The number of idle escrow contracts to keep ready.
+        funder: The account funding (and topping up) the escrow contracts, the creator if not given.
+        tracker: A confirmation tracker to wait on, a new one if not given.
+        params: A suggested params provider to build the transactions with, if any.
+        state_cache: A global state cache to seed and keep up to date, if any.
+        scheduler: A submission scheduler to send the deposits, purchases and top-ups through, if any.
+    """
+
+    def __init__(
+        self,
+        client: AlgodClient,
+        creator: Account,
+        size: int = 8,
+        funder: Optional[Account] = None,
+        tracker: Optional[ConfirmationTracker] = None,
+        params: Optional[SuggestedParamsProvider] = None,
+        state_cache: Optional[GlobalStateCache] = None,
+        scheduler: Optional[SubmissionScheduler] = None,
+    ) -> None:
+        self.client = client
+        self.creator = creator
+        self.size = size
+        self.funder = creator if funder is None else funder
+        self.tracker = ConfirmationTracker(client) if tracker is None else tracker
+        self.params = params
+        self.state_cache = state_cache
+        self.scheduler = scheduler
+
+        # escrows ready for a deposit, and escrows handed back, waiting to be checked and topped up.
+        self.idle: Deque[int] = deque()
+        self.returned: Deque[int] = deque()
+        self.leased: Set[int] = set()
+
+        self.condition = threading.Condition()
+        # a single fill at a time, from the background thread or a caller finding the pool empty.
+        self.fill_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.error: Optional[Exception] = None
+
+    def __len__(self) -> int:
+        """ The number of idle escrows."""
+        return len(self.idle)
+
+    # Handing out and taking back escrows
+    # =============================================================================================
+
+    def acquire(self, timeout: Optional[float] = None) -> int:
+        """Take an idle escrow contract out of the pool, waiting for one if the pool is empty.
+
+        Args:
+            timeout: The number of seconds to wait for an escrow when the pool is replenished in the background.
+
+        Returns:
+            The application ID of the escrow contract.
+        """
+        if self.thread is None and not self.idle:
+            self.fill()
+
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.idle or self.error is not None, timeout):
+                raise Exception(f"No escrow contract available after {timeout} seconds")
+            if not self.idle:
+                raise Exception("The escrow pool failed to replenish") from self.error
+
+            application_ID = self.idle.popleft()
+            self.leased.add(application_ID)
+            # wake the replenishing thread, the pool just went below its size.
+            self.condition.notify_all()
+        count("escrow_pool_acquired")
+        return application_ID
+
+    def release(self, application_ID: int) -> None:
+        """ Hand an escrow contract back to the pool, once its NFT is sold (or if it was never deposited to)."""
+        with self.condition:
+            self.leased.discard(application_ID)
+            self.returned.append(application_ID)
+            self.condition.notify_all()
+
+    def deposit(self, seller: Account, NFT_ID: int, price: int = DEFAULT_PRICE) -> int:
+        """List an NFT in an escrow contract of the pool.
+
+        Args:
+            seller: An account that possesses the NFT.
+            NFT_ID: The NFT ID.
+            price: The price the NFT is sold at, in microAlgos.
+
+        Returns:
+            The application ID of the escrow contract the NFT is listed in.
+        """
+        application_ID = self.acquire()
+        try:
+            deposit_NFT(
+                self.client, seller, application_ID, NFT_ID, price,
+                tracker=self.tracker, params=self.params, state_cache=self.state_cache, scheduler=self.scheduler,
+            )
+        except Exception:
+            # the state check decides whether the escrow is still usable.
+            self.release(application_ID)
+            raise
+        with self.condition:
+            self.leased.discard(application_ID)
+        return application_ID
+
+    def buy(self, buyer: Account, application_ID: int) -> str:
+        """Buy the NFT of an escrow contract of the pool, then recycle the escrow.
+
+        Returns:
+            The transaction ID of the payment transaction from the buyer to the escrow contract.
+        """
+        signed_pay_txn_id = pay_contract(
+            self.client, application_ID, buyer,
+            tracker=self.tracker, params=self.params, state_cache=self.state_cache, scheduler=self.scheduler,
+        )
+        self.release(application_ID)
+        return signed_pay_txn_id
+
+    # Replenishing
+    # =============================================================================================
+
+    def fill(self) -> int:
+        """Check and top up the escrows handed back, then create and fund new ones until `size` escrows are idle.
+
+        Returns:
+            The number of escrows added to the idle ones.
+
+        Raises:
+            Exception: Some escrows could not be created; those created and funded are still added to the idle ones.
+        """
+        with self.fill_lock:
+            with self.condition:
+                returned = list(self.returned)
+                self.returned.clear()
+            try:
+                recycled = self._recycle(returned) if returned else []
+
+                with self.condition:
+                    missing = self.size - len(self.idle) - len(recycled)
+                created: List[int] = []
+                # escrows created but not funded, topped up by the next fill like the escrows handed back.
+                unfunded: List[int] = []
+                failed: Dict[int, str] = dict()
+                if missing > 0:
+                    results, failed = create_escrow_contracts(
+                        self.client, self.creator, missing, self.funder,
+                        tracker=self.tracker, params=self.params, state_cache=self.state_cache,
+                    )
+                    for index, result in enumerate(results):
+                        if result is not None:
+                            (unfunded if index in failed else created).append(result[0])
+                    count("escrow_pool_created", len(created))
+            except Exception:
+                # the escrows handed back are checked (and topped up) again by the next fill, instead of leaking.
+                with self.condition:
+                    self.returned.extendleft(reversed(returned))
+                raise
+
+            with self.condition:
+                self.idle.extend(recycled)
+                self.idle.extend(created)
+                self.returned.extend(unfunded)
+                self.condition.notify_all()
+            if failed:
+                raise Exception(f"Failed to create {len(failed)} escrow contracts: {next(iter(failed.values()))}")
+            return len(recycled) + len(created)
+
+    def _inspect(self, application_ID: int) -> Tuple[Dict[bytes, Union[int, bytes]], int]:
+        """ The global state of an escrow contract, read from the node, and the balance of its account."""
+        state = decodeState(self.client.application_info(application_ID)["params"].get("global-state", []))
+        balance = self.client.account_info(get_application_address(application_ID))["amount"]
+        return state, balance
+
+    def _recycle(self, application_IDs: List[int]) -> List[int]:
+        """ The escrows which can take a new deposit, topped up with the fees of their last sale."""
+        with ThreadPoolExecutor(min(16, len(application_IDs))) as executor:
+            inspected = dict(zip(application_IDs, executor.map(self._inspect, application_IDs)))
+
+        reusable = [application_ID for application_ID, (state, _) in inspected.items() if escrow_reusable(state)]
+        count("escrow_pool_dropped", len(application_IDs) - len(reusable))
+        top_ups = [
+            (application_ID, ESCROW_FUNDING_AMOUNT - inspected[application_ID][1])
+            for application_ID in reusable
+            if inspected[application_ID][1] < ESCROW_FUNDING_AMOUNT
+        ]
+
+        if top_ups:
+            suggested_params = get_suggested_params(self.client, self.params)
+            for start in range(0, len(top_ups), MAX_GROUP_SIZE):
+                txns = [
+                    fund_escrow_txn(self.funder, application_ID, suggested_params, amount)
+                    for application_ID, amount in top_ups[start:start + MAX_GROUP_SIZE]
+                ]
+                if len(txns) > 1:
+                    transaction.assign_group_id(txns)
+                send_and_wait(self.client, txns, self.funder, tracker=self.tracker, scheduler=self.scheduler)
+
+        count("escrow_pool_recycled", len(reusable))
+        return reusable
+
+    # Background replenishing
+    # =============================================================================================
+
+    def start(self) -> "EscrowPool":
+        """ Keep the pool filled from a background thread; the first fill happens before returning."""
+        if self.thread is None:
+            self.fill()
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name="escrow-pool", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self.thread is not None:
+            self.stopping.set()
+            with self.condition:
+                self.condition.notify_all()
+            self.thread.join()
+            self.thread = None
+
+    def _run(self) -> None:
+        while not self.stopping.is_set():
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.stopping.is_set() or self.returned or len(self.idle) < self.size
+                )
+            if self.stopping.is_set():
+                return
+            try:
+                self.fill()
+                self.error = None
+            except Exception as error:
+                # waiting callers give up with this error rather than waiting forever; the next fill tries again.
+                count("escrow_pool_errors")
+                with self.condition:
+                    self.error = error
+                    self.condition.notify_all()
+                self.stopping.wait(1.0)
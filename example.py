@@ -1,9 +1,15 @@
 # Importing some utility classes and functions.
-from utils import Account, get_client, create_NFT, get_app_global_state, get_account
+from utils import Account, get_client, create_NFT, get_app_global_state
+
+# Import the shared keyring of accounts.
+from accounts import get_keyring
 
 # Import operation functions.
 from operations import create_escrow_contract, fund_escrow_contract, deposit_NFT, pay_contract
 
+# Import the global state cache, shared by the steps below so the contract state is never fetched.
+from state_cache import GlobalStateCache
+
 # Some Algorand library functions.
 from algosdk.logic import get_application_address
 
@@ -18,7 +24,7 @@ def create_and_fund(creator: Account):
         application_id: The application id.
         application_address: The application address.
     """
-    algod_client = get_client()
+    algod_client = client
     creator_info = algod_client.account_info(creator.getAddress())
     creator_balance = creator_info.get('amount')
 
@@ -26,7 +32,7 @@ def create_and_fund(creator: Account):
     print(f"Initial Creator Balance: {creator_balance} microAlgos")
 
     print("Creating Escrow Contract...")
-    application_id = create_escrow_contract(algod_client, creator)
+    application_id = create_escrow_contract(algod_client, creator, state_cache=state_cache)
 
     print("Funding Escrow Contract...")
     fund_escrow_contract(algod_client, creator, application_id)
@@ -49,11 +55,11 @@ def buy_and_transfer_NFT(application_ID: int, buyer: Account):
         signed_pay_txn_id: the transaction ID for the payment transaction from buyer to the smart contract.
     """
 
-    algod_client = get_client()
+    algod_client = client
     buyer_info = algod_client.account_info(buyer.getAddress())
     buyer_balance = buyer_info.get('amount')
 
-    application_global_state = get_app_global_state(algod_client, application_ID)
+    application_global_state = get_app_global_state(algod_client, application_ID, state_cache)
     NFT_ID = application_global_state[b"nft_id"]
     print(f"NFT to transfer: {NFT_ID}")
 
@@ -61,7 +67,7 @@ def buy_and_transfer_NFT(application_ID: int, buyer: Account):
     print(f"Buyer balance: {buyer_balance} microAlgos.")
 
     print("Depositing 1 Algo into Escrow Contract...")
-    signed_pay_txn_id = pay_contract(algod_client, application_ID, buyer)
+    signed_pay_txn_id = pay_contract(algod_client, application_ID, buyer, state_cache=state_cache)
     print(f"Matched 1 Algo with NFT ID: {NFT_ID}...")
     print("Automatic Execution: Transfer 1 Algo from Escrow Contract to seller, transfer NFT to buyer")
  
@@ -72,9 +78,11 @@ def buy_and_transfer_NFT(application_ID: int, buyer: Account):
 # print("=======================================================================================")
 # Get the client to communicate with Algorand and the required account details.
 client = get_client()
-creator = get_account("creator")
-seller = get_account("seller")
-buyer = get_account("buyer")
+state_cache = GlobalStateCache(client)
+keyring = get_keyring()
+creator = keyring["creator"]
+seller = keyring["seller"]
+buyer = keyring["buyer"]
 
 # Create and fund contract from creator account.
 application_ID, application_address = create_and_fund(creator) 
@@ -86,7 +94,7 @@ print("=========================================================================
 
 # Create the NFT in the seller account.
 print("Creating NFT in seller account...")
-NFT_ID = create_NFT(seller)
+NFT_ID = create_NFT(seller, client)
 print(f"NFT ID: {NFT_ID} stored at seller address: {seller.getAddress()}")
 print("\n")
 print("https://testnet.algoexplorer.io/address/" + f"{seller.getAddress()}") 
@@ -96,7 +104,7 @@ print("=========================================================================
 # Deposit the NFT from seller to smart contract.
 print("Seller depositing NFT into Escrow Account...")
 print(f"NFT {NFT_ID} deposited in contract {application_address}.")
-signed_deposit_NFT_txn_id = deposit_NFT(client, seller, application_ID, NFT_ID)
+signed_deposit_NFT_txn_id = deposit_NFT(client, seller, application_ID, NFT_ID, state_cache=state_cache)
 print("\n")
 print("https://testnet.algoexplorer.io/tx/" + f"{signed_deposit_NFT_txn_id}")
 input("\n" + "...")
@@ -0,0 +1,397 @@
+# Python imports
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Union
+
+# Algorand library imports.
+import msgpack
+from algosdk import encoding
+from algosdk.v2client.algod import AlgodClient
+
+# Import utility functions.
+from utils import get_client
+
+# A block follower for the escrow contracts. It reads blocks round by round, picks out the successful 'deposit', 'buy'
+# and (multi-listing) 'cancel' app calls, and turns them into typed events: the seller, NFT and price of a deposit come
+# from its app args, and the seller, price and NFT of a purchase from the inner payment and asset close of `on_buy`.
+# The events are applied to a local SQLite index of open listings and completed sales, queryable by seller, NFT ID and
+# price, along with a checkpoint of the last processed round, so a restarted follower resumes where it stopped.
+#
+#   python follower.py escrow.db --from-round 1 --follow
+#
+# Catching up from a backlog, blocks are fetched ahead by a pool of threads and decoded there, while the events are
+# applied in round order and committed every COMMIT_EVERY rounds together with the checkpoint.
+
+PREFETCH = 32
+COMMIT_EVERY = 500
+
+# Events
+# =============================================================================================
+
+class Deposit(NamedTuple):
+    """An NFT deposited (listed) in an escrow contract."""
+
+    round: int
+    intra: int
+    app_id: int
+    seller: str
+    nft_id: int
+    price: int
+
+class Sale(NamedTuple):
+    """An NFT bought from an escrow contract."""
+
+    round: int
+    intra: int
+    app_id: int
+    seller: str
+    buyer: str
+    nft_id: int
+    price: int
+
+class Cancel(NamedTuple):
+    """A listing of a multi-listing contract cancelled by its seller."""
+
+    round: int
+    intra: int
+    app_id: int
+    seller: str
+    nft_id: int
+
+Event = Union[Deposit, Sale, Cancel]
+
+def _address(raw: Optional[bytes]) -> str:
+    return encoding.encode_address(raw) if raw else ""
+
+def decode_block(block: Dict[str, Any], app_ids: Optional[Set[int]] = None) -> List[Event]:
+    """Extract the escrow events of a block, decoded from msgpack.
+
+    Args:
+        block: The "block" of the algod msgpack block response.
+        app_ids: The apps to follow, every escrow-like app call if not given.
+
+    Returns:
+        The events of the block, in transaction order.
+    """
+    round = block.get("rnd", 0)
+    events: List[Event] = []
+
+    for intra, signed_txn in enumerate(block.get("txns") or []):
+        txn = signed_txn.get("txn", {})
+        app_ID = txn.get("apid", 0)
+        # only NoOp calls of existing apps; creations carry no app ID in the transaction.
+        if txn.get("type") != "appl" or not app_ID or txn.get("apan", 0) != 0:
+            continue
+        if app_ids is not None and app_ID not in app_ids:
+            continue
+
+        args = txn.get("apaa") or []
+        method = args[0] if args else b""
+        sender = _address(txn.get("snd"))
+        assets = txn.get("apas") or []
+
+        if method == b"deposit" and len(args) == 4:
+            # escrow: seller, NFT ID and price as app args.
+            events.append(Deposit(
+                round, intra, app_ID, _address(args[1]), int.from_bytes(args[2], "big"), int.from_bytes(args[3], "big")
+            ))
+        elif method == b"deposit" and len(args) == 2 and assets:
+            # multi-listing: the price as app arg, the NFT as foreign asset, listed by the sender.
+            events.append(Deposit(round, intra, app_ID, sender, assets[0], int.from_bytes(args[1], "big")))
+        elif method == b"buy":
+            inner_txns = [inner.get("txn", {}) for inner in (signed_txn.get("dt") or {}).get("itx") or []]
+            payment = next((inner for inner in inner_txns if inner.get("type") == "pay"), None)
+            transfer = next((inner for inner in inner_txns if inner.get("type") == "axfer"), None)
+            if payment is None or transfer is None:
+                continue
+            events.append(Sale(
+                round,
+                intra,
+                app_ID,
+                _address(payment.get("rcv")),
+                _address(transfer.get("aclose") or transfer.get("arcv")) or sender,
+                transfer.get("xaid", 0),
+                payment.get("amt", 0),
+            ))
+        elif method == b"cancel" and assets:
+            events.append(Cancel(round, intra, app_ID, sender, assets[0]))
+
+    return events
+
+# Listing index
+# =============================================================================================
+
+class IndexedListing(NamedTuple):
+    """An open listing of the index."""
+
+    app_id: int
+    nft_id: int
+    seller: str
+    price: int
+    round: int
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    app_id INTEGER NOT NULL,
+    nft_id INTEGER NOT NULL,
+    seller TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    round INTEGER NOT NULL,
+    PRIMARY KEY (app_id, nft_id)
+);
+CREATE INDEX IF NOT EXISTS listings_seller ON listings (seller);
+CREATE INDEX IF NOT EXISTS listings_nft_id ON listings (nft_id);
+CREATE INDEX IF NOT EXISTS listings_price ON listings (price);
+
+CREATE TABLE IF NOT EXISTS sales (
+    round INTEGER NOT NULL,
+    intra INTEGER NOT NULL,
+    app_id INTEGER NOT NULL,
+    seller TEXT NOT NULL,
+    buyer TEXT NOT NULL,
+    nft_id INTEGER NOT NULL,
+    price INTEGER NOT NULL,
+    PRIMARY KEY (round, intra)
+);
+CREATE INDEX IF NOT EXISTS sales_seller ON sales (seller);
+CREATE INDEX IF NOT EXISTS sales_buyer ON sales (buyer);
+CREATE INDEX IF NOT EXISTS sales_nft_id ON sales (nft_id);
+CREATE INDEX IF NOT EXISTS sales_price ON sales (price);
+
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    round INTEGER NOT NULL
+);
+"""
+
+class ListingIndex:
+    """A SQLite index of the open listings and completed sales of the escrow contracts.
+
+    Args:
+        path: The database file, ":memory:" for an index living in memory only.
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self.path = path
+        # the follower writes from its thread while queries may come from any other.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            self.connection.executescript(SCHEMA)
+
+    def checkpoint(self) -> Optional[int]:
+        """ The last round processed, None if the index is new."""
+        with self.lock:
+            row = self.connection.execute("SELECT round FROM checkpoint WHERE id = 0").fetchone()
+        return None if row is None else row[0]
+
+    def apply(self, events: Iterable[Event], round: int) -> None:
+        """ Apply events to the index and checkpoint `round` as processed, in a single transaction."""
+        with self.lock, self.connection:
+            for event in events:
+                if isinstance(event, Deposit):
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?)",
+                        (event.app_id, event.nft_id, event.seller, event.price, event.round),
+                    )
+                elif isinstance(event, Sale):
+                    self.connection.execute(
+                        "DELETE FROM listings WHERE app_id = ? AND nft_id = ?", (event.app_id, event.nft_id)
+                    )
+                    self.connection.execute("INSERT OR IGNORE INTO sales VALUES (?, ?, ?, ?, ?, ?, ?)", tuple(event))
+                else:
+                    self.connection.execute(
+                        "DELETE FROM listings WHERE app_id = ? AND nft_id = ?", (event.app_id, event.nft_id)
+                    )
+            self.connection.execute("INSERT OR REPLACE INTO checkpoint VALUES (0, ?)", (round,))
+
+    def _query(self, table: str, filters: Dict[str, Any], min_price: Optional[int], max_price: Optional[int],
+               order: str, limit: Optional[int]) -> List[Any]:
+        conditions = [f"{column} = ?" for column, value in filters.items() if value is not None]
+        values = [value for value in filters.values() if value is not None]
+        if min_price is not None:
+            conditions.append("price >= ?")
+            values.append(min_price)
+        if max_price is not None:
+            conditions.append("price <= ?")
+            values.append(max_price)
+
+        query = f"SELECT * FROM {table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {order}"
+        if limit is not None:
+            query += " LIMIT ?"
+            values.append(limit)
+
+        with self.lock:
+            return self.connection.execute(query, values).fetchall()
+
+    def listings(
+        self,
+        seller: Optional[str] = None,
+        nft_id: Optional[int] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[IndexedListing]:
+        """ The open listings matching every given filter, cheapest first."""
+        rows = self._query(
+            "listings", {"seller": seller, "nft_id": nft_id}, min_price, max_price, "price, app_id, nft_id", limit
+        )
+        return [IndexedListing(*row) for row in rows]
+
+    def sales(
+        self,
+        seller: Optional[str] = None,
+        buyer: Optional[str] = None,
+        nft_id: Optional[int] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Sale]:
+        """ The completed sales matching every given filter, most recent first."""
+        rows = self._query(
+            "sales", {"seller": seller, "buyer": buyer, "nft_id": nft_id}, min_price, max_price,
+            "round DESC, intra DESC", limit,
+        )
+        return [Sale(*row) for row in rows]
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+# Block follower
+# =============================================================================================
+
+class BlockFollower:
+    """Follows the chain block by block, applying the escrow events to a listing index and to the listeners.
+
+    Args:
+        client: An algod client.
+        index: The listing index to maintain.
+        app_ids: The apps to follow, every escrow-like app call if not given.
+        start_round: The first round to process when the index has no checkpoint, the current round if not given.
+        prefetch: The number of blocks fetched ahead while catching up.
+        commit_every: The number of rounds applied per index transaction while catching up.
+    """
+
+    def __init__(
+        self,
+        client: AlgodClient,
+        index: ListingIndex,
+        app_ids: Optional[Iterable[int]] = None,
+        start_round: Optional[int] = None,
+        prefetch: int = PREFETCH,
+        commit_every: int = COMMIT_EVERY,
+    ) -> None:
+        self.client = client
+        self.index = index
+        self.app_ids = None if app_ids is None else set(app_ids)
+        self.start_round = start_round
+        self.prefetch = prefetch
+        self.commit_every = commit_every
+        self.listeners: List[Callable[[Event], None]] = []
+
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def subscribe(self, listener: Callable[[Event], None]) -> None:
+        """ Call `listener` with every event, in chain order, once it is in the index."""
+        self.listeners.append(listener)
+
+    def next_round(self) -> int:
+        checkpoint = self.index.checkpoint()
+        if checkpoint is not None:
+            return checkpoint + 1
+        if self.start_round is not None:
+            return self.start_round
+        return self.client.status()["last-round"]
+
+    def fetch(self, round: int) -> List[Event]:
+        """ Fetch a block and decode its escrow events."""
+        response = self.client.block_info(round, response_format="msgpack")
+        # state delta keys are raw bytes, which are not always valid UTF-8.
+        block = msgpack.unpackb(response, raw=False, strict_map_key=False, unicode_errors="surrogateescape")
+        return decode_block(block["block"], self.app_ids)
+
+    def _emit(self, events: List[Event], round: int) -> None:
+        self.index.apply(events, round)
+        for event in events:
+            for listener in self.listeners:
+                listener(event)
+
+    def catch_up(self, last_round: Optional[int] = None) -> int:
+        """Process every round from the checkpoint up to `last_round`, the latest round if not given.
+
+        Returns:
+            The number of rounds processed.
+        """
+        first_round = self.next_round()
+        last_round = self.client.status()["last-round"] if last_round is None else last_round
+        if last_round < first_round:
+            return 0
+
+        with ThreadPoolExecutor(self.prefetch) as executor:
+            for start in range(first_round, last_round + 1, self.commit_every):
+                rounds = range(start, min(start + self.commit_every, last_round + 1))
+                # map keeps the order of the rounds while fetching them in parallel.
+                events = [event for block_events in executor.map(self.fetch, rounds) for event in block_events]
+                self._emit(events, rounds[-1])
+                if self.stopping.is_set():
+                    return rounds[-1] - first_round + 1
+
+        return last_round - first_round + 1
+
+    def follow(self) -> None:
+        """ Catch up, then process every new round as soon as it is produced, until stopped."""
+        while not self.stopping.is_set():
+            self.catch_up()
+            round = self.next_round()
+            # wait for the next block to be produced, then for the rounds after it one at a time.
+            self.client.status_after_block(round - 1)
+            if not self.stopping.is_set():
+                self._emit(self.fetch(round), round)
+
+    def start(self) -> "BlockFollower":
+        self.thread = threading.Thread(target=self.follow, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the escrow listings and sales by following the chain.")
+    parser.add_argument("database", help="the SQLite index file")
+    parser.add_argument("--from-round", type=int, default=None, help="the first round of a new index")
+    parser.add_argument("--app-id", type=int, action="append", help="an app to follow (repeatable), all if not given")
+    parser.add_argument("--follow", action="store_true", help="keep following new rounds once caught up")
+    arguments = parser.parse_args()
+
+    index = ListingIndex(arguments.database)
+    follower = BlockFollower(get_client(), index, arguments.app_id, arguments.from_round)
+    follower.subscribe(print)
+
+    started = time.perf_counter()
+    processed = follower.catch_up()
+    elapsed = time.perf_counter() - started
+    print(
+        f"Caught up {processed} rounds in {elapsed:.2f}s ({processed / elapsed * 60 if elapsed > 0 else 0:.0f} rounds/min), "
+        f"checkpoint {index.checkpoint()}",
+        file=sys.stderr,
+    )
+    if arguments.follow:
+        try:
+            follower.follow()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,352 @@
+# Python imports
+import os
+import time
+import inspect
+import functools
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Pluggable instrumentation of the hot paths: spans (timed, nested, tagged), counters and observations. The default
+# instrumentation does nothing, and the instrumented functions check a single flag before doing anything else, so it
+# costs next to nothing until `set_instrumentation` installs an `Aggregator`.
+#
+#   aggregator = Aggregator()
+#   set_instrumentation(aggregator)
+#   client = InstrumentedClient(get_client())        # every algod call becomes an "algod" span, tagged by endpoint
+#   ...
+#   PrometheusExporter(aggregator, "metrics.prom").write()
+#
+# Operations are spanned as "operation", tagged by operation name, app ID and the number of rounds spent waiting for
+# confirmation. Within them, "stage" spans split the time between PyTeal compile, algod compile, suggested params,
+# signing, submission and confirmation. Aggregated metrics are only labelled with the low cardinality tags (LABEL_TAGS);
+# the app ID and round count are kept on the recent span records.
+
+LABEL_TAGS = ("operation", "endpoint", "stage")
+MAX_SPAN_RECORDS = 10_000
+METRIC_PREFIX = "escrow_"
+
+# Useful Classes
+# =============================================================================================
+
+class _NullSpan:
+    """A span doing nothing, shared by every disabled call."""
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+    def tag(self, **tags: Any) -> None:
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Instrumentation:
+    """The no-op instrumentation, and the interface of the others."""
+
+    enabled = False
+
+    def span(self, name: str, **tags: Any) -> Any:
+        """ A context manager timing a block of code."""
+        return _NULL_SPAN
+
+    def count(self, name: str, value: float = 1, **tags: Any) -> None:
+        """ Add to a counter."""
+
+    def observe(self, name: str, value: float, **tags: Any) -> None:
+        """ Record a measurement, e.g. a duration in seconds."""
+
+class Span:
+    """A timed block of code, nested in the span open in the same thread when it started."""
+
+    def __init__(self, aggregator: "Aggregator", name: str, tags: Dict[str, Any]) -> None:
+        self.aggregator = aggregator
+        self.name = name
+        self.tags = tags
+        self.parent: Optional[Span] = None
+        self.started = 0.0
+        self.duration = 0.0
+
+    def tag(self, **tags: Any) -> None:
+        self.tags.update(tags)
+
+    def __enter__(self) -> "Span":
+        stack = self.aggregator._stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        self.duration = time.perf_counter() - self.started
+        self.aggregator._stack().pop()
+        if exc_type is not None:
+            self.tags["error"] = exc_type.__name__
+        # the rounds waited add up in the enclosing spans, e.g. the operation.
+        rounds = self.tags.get("rounds")
+        if rounds is not None and self.parent is not None:
+            self.parent.tags["rounds"] = self.parent.tags.get("rounds", 0) + rounds
+        self.aggregator._finish(self)
+
+class Metric:
+    """The count, sum, minimum and maximum of the observations of a metric."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def to_json(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+        }
+
+Labels = Tuple[Tuple[str, Any], ...]
+
+class Aggregator(Instrumentation):
+    """An in-memory instrumentation aggregating counters and observations, and keeping the most recent spans.
+
+    Args:
+        label_tags: The tags kept as labels of the aggregated metrics.
+        max_span_records: The number of most recent finished spans kept.
+    """
+
+    enabled = True
+
+    def __init__(self, label_tags: Tuple[str, ...] = LABEL_TAGS, max_span_records: int = MAX_SPAN_RECORDS) -> None:
+        self.label_tags = label_tags
+        self.max_span_records = max_span_records
+        self.counters: Dict[Tuple[str, Labels], float] = dict()
+        self.metrics: Dict[Tuple[str, Labels], Metric] = dict()
+        self.spans: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def _labels(self, tags: Dict[str, Any]) -> Labels:
+        return tuple((tag, tags[tag]) for tag in self.label_tags if tags.get(tag) is not None)
+
+    def span(self, name: str, **tags: Any) -> Span:
+        return Span(self, name, tags)
+
+    def count(self, name: str, value: float = 1, **tags: Any) -> None:
+        key = (name, self._labels(tags))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **tags: Any) -> None:
+        key = (name, self._labels(tags))
+        with self.lock:
+            metric = self.metrics.get(key)
+            if metric is None:
+                metric = self.metrics[key] = Metric()
+            metric.add(value)
+
+    def _finish(self, span: Span) -> None:
+        self.observe(f"{span.name}_seconds", span.duration, **span.tags)
+        if "rounds" in span.tags:
+            self.observe(f"{span.name}_rounds", span.tags["rounds"], **span.tags)
+        if "error" in span.tags:
+            self.count(f"{span.name}_errors", **span.tags)
+
+        record = {"name": span.name, "duration": span.duration, "parent": span.parent.name if span.parent else None}
+        record.update(span.tags)
+        with self.lock:
+            self.spans.append(record)
+            if len(self.spans) > self.max_span_records:
+                del self.spans[:len(self.spans) - self.max_span_records]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """ The aggregated counters and metrics, as JSON-ready dictionaries."""
+        with self.lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items(), key=_sort_key)
+                ],
+                "metrics": [
+                    dict(metric.to_json(), name=name, labels=dict(labels))
+                    for (name, labels), metric in sorted(self.metrics.items(), key=_sort_key)
+                ],
+            }
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters.clear()
+            self.metrics.clear()
+            self.spans.clear()
+
+def _sort_key(item: Tuple[Tuple[str, Labels], Any]) -> Tuple[str, str]:
+    (name, labels), _ = item
+    return name, repr(labels)
+
+# The current instrumentation
+# =============================================================================================
+
+_current: Instrumentation = Instrumentation()
+
+def get_instrumentation() -> Instrumentation:
+    return _current
+
+def set_instrumentation(instrumentation: Optional[Instrumentation]) -> Instrumentation:
+    """ Install an instrumentation for the whole process, or the no-op one if None. Returns the previous one."""
+    global _current
+    previous = _current
+    _current = Instrumentation() if instrumentation is None else instrumentation
+    return previous
+
+def span(name: str, **tags: Any) -> Any:
+    """ A span of the current instrumentation."""
+    return _current.span(name, **tags)
+
+def count(name: str, value: float = 1, **tags: Any) -> None:
+    if _current.enabled:
+        _current.count(name, value, **tags)
+
+def instrumented(function: Optional[Callable[..., Any]] = None, *, result_tag: Optional[str] = None) -> Any:
+    """Span every call of an operation as "operation", tagged by its name and the app ID it works on.
+
+    The app ID is read from the `application_ID` argument. Operations creating an app (or an asset) tag their result
+    instead, with `@instrumented(result_tag="app_id")`.
+    """
+    if function is None:
+        return functools.partial(instrumented, result_tag=result_tag)
+
+    name = function.__name__
+    parameters = list(inspect.signature(function).parameters)
+    app_position = parameters.index("application_ID") if "application_ID" in parameters else None
+
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not _current.enabled:
+            return function(*args, **kwargs)
+
+        app_ID = kwargs.get("application_ID")
+        if app_ID is None and app_position is not None and app_position < len(args):
+            app_ID = args[app_position]
+        with _current.span("operation", operation=name, app_id=app_ID) as operation_span:
+            result = function(*args, **kwargs)
+            if result_tag is not None:
+                operation_span.tag(**{result_tag: result})
+            return result
+
+    return wrapper
+
+class InstrumentedClient:
+    """Wraps an algod client (or a simulated one), spanning each of its method calls as "algod", tagged by endpoint."""
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.client, name)
+        if not callable(attribute) or name.startswith("_"):
+            return attribute
+
+        @functools.wraps(attribute)
+        def method(*args: Any, **kwargs: Any) -> Any:
+            if not _current.enabled:
+                return attribute(*args, **kwargs)
+            _current.count("algod_requests", endpoint=name)
+            with _current.span("algod", endpoint=name):
+                return attribute(*args, **kwargs)
+
+        # cache the wrapper, so the lookup only happens once per method.
+        setattr(self, name, method)
+        return method
+
+# Exporters
+# =============================================================================================
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+def prometheus_text(aggregator: Aggregator, prefix: str = METRIC_PREFIX) -> str:
+    """ The metrics of an aggregator in the Prometheus text exposition format."""
+    snapshot = aggregator.snapshot()
+    # the samples of each family, which must be contiguous: name -> (type, samples), in order of first appearance.
+    families: Dict[str, Tuple[str, List[str]]] = dict()
+
+    def sample(family: str, type: str, line: str) -> None:
+        families.setdefault(family, (type, []))[1].append(line)
+
+    for counter in snapshot["counters"]:
+        name = f"{prefix}{counter['name']}_total"
+        sample(name, "counter", f"{name}{_format_labels(counter['labels'])} {counter['value']}")
+
+    # every summary family first, then the gauge family of the maximum of each.
+    for metric in snapshot["metrics"]:
+        name = f"{prefix}{metric['name']}"
+        labels = _format_labels(metric["labels"])
+        sample(name, "summary", f"{name}_count{labels} {metric['count']}")
+        sample(name, "summary", f"{name}_sum{labels} {metric['sum']}")
+    for metric in snapshot["metrics"]:
+        name = f"{prefix}{metric['name']}_max"
+        sample(name, "gauge", f"{name}{_format_labels(metric['labels'])} {metric['max']}")
+
+    lines: List[str] = []
+    for name, (type, samples) in families.items():
+        lines.append(f"# TYPE {name} {type}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+class PrometheusExporter:
+    """Writes the metrics of an aggregator to a Prometheus text file, e.g. for the node exporter textfile collector.
+
+    Args:
+        aggregator: The aggregator to export.
+        path: The file to write.
+        interval: The number of seconds between writes once started.
+    """
+
+    def __init__(self, aggregator: Aggregator, path: str, interval: float = 10.0) -> None:
+        self.aggregator = aggregator
+        self.path = path
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def write(self) -> None:
+        # write to a temporary file first so the collector never reads a half written file.
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            file.write(prometheus_text(self.aggregator))
+        os.replace(temporary_path, self.path)
+
+    def start(self) -> "PrometheusExporter":
+        def run() -> None:
+            while not self.stopping.wait(self.interval):
+                self.write()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.write()
@@ -0,0 +1,228 @@
+# Python imports
+import os
+import json
+import hashlib
+from concurrent.futures import Future
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+# Algorand library imports.
+import msgpack
+from algosdk import encoding
+from algosdk.v2client.algod import AlgodClient
+from algosdk.future import transaction
+
+# Import the shared confirmation tracker and suggested params provider.
+from tracker import ConfirmationTracker
+from params import SuggestedParamsProvider
+
+# Import the atomic group size limit.
+from operations import MAX_GROUP_SIZE
+
+# Import utility classes and functions.
+from utils import Account, carbon_credit_txn, get_suggested_params
+
+# Bulk tokenisation of a carbon credit registry batch. Records are streamed from the input iterable, minted as groups
+# of up to 16 AssetConfigTxns, and many groups are kept in flight across rounds. With a checkpoint file, an interrupted
+# run picks up where it left off instead of minting the credits again: every group is recorded in the file before it
+# is sent (the keys of its credits and its validity window), and every confirmed credit once it is minted. On resume,
+# groups sent but never recorded as confirmed are looked up in the blocks of their validity window, by the `cc:<key>`
+# note of their transactions, before anything is minted again. Mint transactions are valid for MINT_VALIDITY_ROUNDS
+# rounds, which bounds that lookup (and the wait for a window to close when resuming right after an interruption).
+
+NOTE_PREFIX = b"cc:"
+MINT_VALIDITY_ROUNDS = 50
+
+class CreditMetadata(NamedTuple):
+    """The metadata of a single carbon credit NFT.
+
+    `serial` identifies the credit in the registry batch; credits without one are identified by their input position.
+    """
+
+    unit_name: str = "CC"
+    asset_name: str = "Carbon Credit: 1 Ton"
+    url: Optional[str] = None
+    metadata_hash: Optional[bytes] = None
+    serial: Optional[str] = None
+
+    def key(self, seller_address: str, position: int) -> str:
+        """ A stable identifier of a seller's credit, used in the checkpoint file and the transaction note."""
+        digest = hashlib.sha256()
+        serial = self.serial if self.serial is not None else f"#{position}"
+        for field in (seller_address, serial, self.unit_name, self.asset_name, self.url or ""):
+            digest.update(field.encode() + b"\x00")
+        digest.update(self.metadata_hash or b"")
+        return digest.hexdigest()
+
+class SentGroup(NamedTuple):
+    """A group of mint transactions recorded in the checkpoint file before being sent."""
+
+    keys: List[str]
+    first_valid: int
+    last_valid: int
+
+def load_checkpoint(checkpoint_path: Optional[str]) -> Tuple[Dict[str, int], List[SentGroup]]:
+    """ The asset IDs of the credits already minted by a previous run, by key, and the groups it sent."""
+    minted: Dict[str, int] = dict()
+    sent: List[SentGroup] = []
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return minted, sent
+
+    with open(checkpoint_path) as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # the last line may be cut short if the previous run was killed while writing it.
+                continue
+            if "sent" in entry:
+                sent.append(SentGroup(entry["sent"], entry["first_valid"], entry["last_valid"]))
+            else:
+                minted[entry["key"]] = entry["asset_id"]
+    return minted, sent
+
+def find_minted(client: AlgodClient, seller: Account, sent: List[SentGroup], minted: Dict[str, int]) -> Dict[str, int]:
+    """Look up the credits sent by a previous run but not recorded as minted, in the blocks their groups were valid for.
+
+    Waits for the validity window of the groups to close if it is still open, so a group still in a transaction pool
+    is either found or can no longer be confirmed.
+
+    Returns:
+        The asset IDs of the credits found, by key.
+    """
+    outstanding = {key for group in sent for key in group.keys if key not in minted}
+    groups = [group for group in sent if outstanding.intersection(group.keys)]
+    if not groups:
+        return dict()
+
+    seller_address = encoding.decode_address(seller.getAddress())
+    last_round = client.status()["last-round"]
+    found: Dict[str, int] = dict()
+    for round in range(min(group.first_valid for group in groups), max(group.last_valid for group in groups) + 1):
+        if not outstanding:
+            break
+        if round > last_round:
+            last_round = client.status_after_block(round - 1)["last-round"]
+        response = client.block_info(round, response_format="msgpack")
+        block = msgpack.unpackb(response, raw=False, strict_map_key=False, unicode_errors="surrogateescape")["block"]
+        for signed_txn in block.get("txns") or []:
+            txn = signed_txn.get("txn", {})
+            note = txn.get("note") or b""
+            if txn.get("type") != "acfg" or txn.get("snd") != seller_address or not note.startswith(NOTE_PREFIX):
+                continue
+            key = note[len(NOTE_PREFIX):].decode(errors="replace")
+            if key in outstanding:
+                # the created asset ID is part of the apply data of the transaction in the block.
+                found[key] = signed_txn["caid"]
+                outstanding.discard(key)
+    return found
+
+def mint_NFTs(
+    client: AlgodClient,
+    seller: Account,
+    records: Iterable[CreditMetadata],
+    checkpoint_path: Optional[str] = None,
+    max_in_flight: int = 16,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+) -> List[int]:
+    """Mint a carbon credit NFT in the seller account for every record, in atomic groups of up to 16.
+
+    Args:
+        client: An algod client.
+        seller: The account creating (and managing) the NFTs.
+        records: The metadata of the credits to mint, consumed lazily. Every record is a credit of its own, identical
+            metadata or not; serials, when given, must be unique.
+        checkpoint_path: A file recording the minted credits, read on start to resume an interrupted run.
+        max_in_flight: The maximum number of groups waiting for confirmation at once.
+        tracker: A confirmation tracker to wait on, a new one if not given.
+        params: A suggested params provider to build the transactions with, if any.
+
+    Returns:
+        The asset ID of the NFT of each record, in input order.
+    """
+    tracker = ConfirmationTracker(client) if tracker is None else tracker
+    minted, sent = load_checkpoint(checkpoint_path)
+    checkpoint = open(checkpoint_path, "a") if checkpoint_path is not None else None
+
+    def record_minted(key: str, asset_ID: int) -> None:
+        minted[key] = asset_ID
+        if checkpoint is not None:
+            checkpoint.write(json.dumps({"key": key, "asset_id": asset_ID}) + "\n")
+
+    results: List[Optional[int]] = []
+    # records still to be minted, with their position in the input.
+    seen: Set[str] = set()
+
+    def pending_records() -> Iterator[Tuple[int, str, CreditMetadata]]:
+        for position, record in enumerate(records):
+            key = record.key(seller.getAddress(), position)
+            if key in seen:
+                raise Exception(f"Credit serial {record.serial!r} appears twice in the records")
+            seen.add(key)
+            results.append(minted.get(key))
+            if key not in minted:
+                yield position, key, record
+
+    in_flight: Dict[Future, Tuple[List[Tuple[int, str, CreditMetadata]], List[Future]]] = dict()
+    exhausted = False
+
+    try:
+        # groups of an interrupted run may have been confirmed after its last checkpoint line.
+        for key, asset_ID in find_minted(client, seller, sent, minted).items():
+            record_minted(key, asset_ID)
+
+        stream = pending_records()
+        while not exhausted or in_flight:
+            while not exhausted and len(in_flight) < max_in_flight:
+                batch = list(islice(stream, MAX_GROUP_SIZE))
+                if not batch:
+                    exhausted = True
+                    break
+
+                suggested_params = get_suggested_params(client, params)
+                txns = [
+                    carbon_credit_txn(
+                        seller,
+                        suggested_params,
+                        unit_name=record.unit_name,
+                        asset_name=record.asset_name,
+                        url=record.url,
+                        metadata_hash=record.metadata_hash,
+                        note=NOTE_PREFIX + key.encode(),
+                    )
+                    for _, key, record in batch
+                ]
+                for txn in txns:
+                    txn.last_valid_round = min(txn.last_valid_round, txn.first_valid_round + MINT_VALIDITY_ROUNDS)
+                if len(txns) > 1:
+                    transaction.assign_group_id(txns)
+                signed_txns = [txn.sign(seller.getPrivateKey()) for txn in txns]
+
+                # the group is recorded before it is sent, so a resumed run looks for it before minting again.
+                if checkpoint is not None:
+                    checkpoint.write(json.dumps({
+                        "sent": [key for _, key, _ in batch],
+                        "first_valid": txns[0].first_valid_round,
+                        "last_valid": txns[0].last_valid_round,
+                    }) + "\n")
+                    checkpoint.flush()
+                    os.fsync(checkpoint.fileno())
+                client.send_transactions(signed_txns)
+
+                futures = tracker.track(signed_txns)
+                in_flight[futures[-1]] = (batch, futures)
+
+            for done in tracker.wait_any(in_flight):
+                batch, futures = in_flight.pop(done)
+                for (position, key, _), future in zip(batch, futures):
+                    asset_ID = future.result().assetIndex
+                    record_minted(key, asset_ID)
+                    results[position] = asset_ID
+                if checkpoint is not None:
+                    checkpoint.flush()
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+    return results
@@ -1,5 +1,8 @@
 # Python imports
-from typing import Tuple
+import os
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, List, Optional, Tuple, Union
 
 # Algorand library 
 from algosdk import encoding
@@ -9,14 +12,187 @@ from algosdk.logic import get_application_address
 from algosdk.future.transaction import AssetTransferTxn
 
 # Import the contract programs.
-from contract import approval_program, clear_state_program
+from contract import approval_program, clear_state_program, multi_listing_approval_program, MAX_LISTINGS
+
+# Import the compiled program artifact cache.
+from artifacts import compile_program
+
+# Import the shared confirmation tracker and suggested params provider.
+from tracker import ConfirmationTracker
+from params import SuggestedParamsProvider
+
+# Import the submission scheduler.
+from scheduler import SubmissionScheduler
+
+# Import the global state cache.
+from state_cache import GlobalStateCache
+
+# Import the instrumentation of the operations.
+from instrumentation import instrumented
 
 # Import utility classes and functions.
-from utils import Account, fully_compile_contract, wait_for_transaction, get_app_global_state, get_account
+from utils import Account, Listing, get_suggested_params, sign_and_send, send_and_wait, get_app_global_state, get_app_global_states, get_listings
+
+# The maximum number of transactions in an atomic group.
+MAX_GROUP_SIZE = 16
+
+# The amount each escrow contract is funded with.
+ESCROW_FUNDING_AMOUNT = (
+    # min account balance
+    100_000
+    # additional min balance to opt into NFT
+    + 100_000
+    # 3 * min txn fee
+    + 3 * 1_000
+)
+
+# The price an NFT is deposited at when none is given, 1 Algo.
+DEFAULT_PRICE = 1_000_000
+
+# Transaction builders, shared by the blocking operations below and their asyncio variants in async_operations.py.
+def create_escrow_txn(
+    creator: Account,
+    approval: bytes,
+    clear: bytes,
+    suggested_params: transaction.SuggestedParams,
+    note: Optional[bytes] = None,
+) -> transaction.ApplicationCreateTxn:
+    """ The transaction creating an escrow contract from the compiled approval and clear programs."""
+    global_schema = transaction.StateSchema(num_uints=3, num_byte_slices=2)
+    local_schema = transaction.StateSchema(num_uints=0, num_byte_slices=0)
+
+    return transaction.ApplicationCreateTxn(
+        sender=creator.getAddress(),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=approval,
+        clear_program=clear,
+        global_schema=global_schema,
+        local_schema=local_schema,
+        sp=suggested_params,
+        note=note,
+    )
+
+def fund_escrow_txn(
+    funder: Account,
+    application_ID: int,
+    suggested_params: transaction.SuggestedParams,
+    amount: int = ESCROW_FUNDING_AMOUNT,
+) -> transaction.PaymentTxn:
+    """ The transaction funding an escrow contract, with ESCROW_FUNDING_AMOUNT unless topping it up."""
+    return transaction.PaymentTxn(
+        sender=funder.getAddress(),
+        receiver=get_application_address(application_ID),
+        amt=amount,
+        sp=suggested_params,
+    )
+
+def deposit_NFT_txns(
+    seller: Account,
+    application_ID: int,
+    NFT_ID: int,
+    suggested_params: transaction.SuggestedParams,
+    price: int = DEFAULT_PRICE,
+) -> List[transaction.Transaction]:
+    """ The grouped 'deposit' app call, setting the price of the NFT, and NFT transfer from the seller to the escrow contract."""
+    application_address = get_application_address(application_ID)
+
+    # set up special 'app_args' for deposit call transaction below.
+    app_args = [
+        b"deposit",
+        encoding.decode_address(seller.getAddress()),
+        NFT_ID.to_bytes(8, "big"),
+        price.to_bytes(8, "big")
+    ]
+
+    # calls the 'on_deposit' method in the contract.
+    on_deposit_txn = transaction.ApplicationCallTxn(
+        sender=seller.getAddress(),
+        index=application_ID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=app_args,
+        foreign_assets=[NFT_ID],
+        sp=suggested_params,
+    )
+
+    # set up the NFT deposit transaction from seller to contract.
+    deposit_NFT_txn = transaction.AssetTransferTxn(
+        sender=seller.getAddress(),
+        receiver=application_address,
+        index=NFT_ID,
+        amt=1,
+        sp=suggested_params,
+    )
+
+    # assign a group of transactions.
+    transaction.assign_group_id([on_deposit_txn, deposit_NFT_txn])
+
+    return [on_deposit_txn, deposit_NFT_txn]
+
+def buyer_opt_in_txn(
+    buyer: Account, NFT_ID: int, suggested_params: transaction.SuggestedParams
+) -> AssetTransferTxn:
+    """ The zero amount asset transfer opting the buyer into the NFT."""
+    return AssetTransferTxn(
+        sender=buyer.getAddress(),
+        sp=suggested_params,
+        receiver=buyer.getAddress(),
+        amt=0,
+        index=NFT_ID,
+    )
+
+def pay_contract_txns(
+    application_ID: int,
+    buyer: Account,
+    application_global_state: Dict[bytes, Union[int, bytes]],
+    suggested_params: transaction.SuggestedParams,
+) -> List[transaction.Transaction]:
+    """ The grouped buyer opt-in to the NFT, payment of the price to the escrow contract and 'buy' app call."""
+    application_address = get_application_address(application_ID)
+    NFT_ID = application_global_state[b"nft_id"]
+
+    accounts = [encoding.encode_address(application_global_state[b"seller"])]
+    accounts.append(buyer.getAddress())
+
+    # opt the buyer into the NFT in the same group, so the contract can close the NFT to them.
+    opt_in_buyer_txn = buyer_opt_in_txn(buyer, NFT_ID, suggested_params)
+
+    # set up the payment transaction, of the price the NFT was deposited at.
+    price = application_global_state[b"price"]
+    pay_txn = transaction.PaymentTxn(
+        sender=buyer.getAddress(),
+        receiver=application_address,
+        amt=price,
+        sp=suggested_params,
+    )
+
+    app_args = [
+        b"buy",
+        encoding.decode_address(buyer.getAddress()),
+        # price.to_bytes(8, "big")
+    ]
+
+    # set up the call on_buy transaction.
+    call_on_buy_txn = transaction.ApplicationCallTxn(
+        sender=buyer.getAddress(),
+        index=application_ID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=app_args,
+        foreign_assets=[NFT_ID],
+        accounts=accounts,
+        sp=suggested_params,
+    )
+
+    # group the opt-in, the pay and the call on_buy transactions.
+    transaction.assign_group_id([opt_in_buyer_txn, pay_txn, call_on_buy_txn])
+
+    return [opt_in_buyer_txn, pay_txn, call_on_buy_txn]
 
 # Operation functions; compiling, creating/funding the contract, depositing an NFT, and paying the contract.
 def get_contracts(client: AlgodClient) -> Tuple[bytes, bytes]:
-    """Get the compiled TEAL contracts for the auction.
+    """Get the compiled TEAL contracts for the escrow.
+
+    The programs are served from the artifact cache, so algod is only asked to compile them the first time a given
+    version of the contract is seen (or never, if the cache was prebuilt with `python artifacts.py`).
 
     Args:
         client: An algod client that has the ability to compile TEAL programs.
@@ -26,90 +202,188 @@ def get_contracts(client: AlgodClient) -> Tuple[bytes, bytes]:
         second is the clear state program.
     """
 
-    APPROVAL_PROGRAM = b""
-    CLEAR_STATE_PROGRAM = b""
-
-    if len(APPROVAL_PROGRAM) == 0:
-        APPROVAL_PROGRAM = fully_compile_contract(client, approval_program())
-        CLEAR_STATE_PROGRAM = fully_compile_contract(client, clear_state_program())
+    APPROVAL_PROGRAM = compile_program(client, approval_program).program
+    CLEAR_STATE_PROGRAM = compile_program(client, clear_state_program).program
 
     return APPROVAL_PROGRAM, CLEAR_STATE_PROGRAM
 
-def create_escrow_contract(client: AlgodClient, creator: Account) -> int:
+@instrumented(result_tag="app_id")
+def create_escrow_contract(
+    client: AlgodClient,
+    creator: Account,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+    state_cache: Optional[GlobalStateCache] = None,
+    scheduler: Optional[SubmissionScheduler] = None,
+) -> int:
     """Create a new escrow contract.
 
     Args:
         client: An algod client.
         sender: The account that will create the escrow contract..
+        tracker: A confirmation tracker to wait on, if any.
+        params: A suggested params provider to build the transactions with, if any.
+        state_cache: A global state cache to seed with the (empty) state of the new contract, if any.
+        scheduler: A submission scheduler to send the transaction through, if any.
 
     Returns:
         The ID of the newly created escrow contract..
     """
     # compile contracts
     approval, clear = get_contracts(client) 
-    global_schema = transaction.StateSchema(num_uints=3, num_byte_slices=2)
-    local_schema = transaction.StateSchema(num_uints=0, num_byte_slices=0)
 
     # send a transaction to create the escrow contract
-    txn = transaction.ApplicationCreateTxn(
-        sender=creator.getAddress(),
-        on_complete=transaction.OnComplete.NoOpOC,
-        approval_program=approval,
-        clear_program=clear,
-        global_schema=global_schema,
-        local_schema=local_schema,
-        sp=client.suggested_params(),
-    )
+    txn = create_escrow_txn(creator, approval, clear, get_suggested_params(client, params))
 
-    # sign the transaction and sent it
-    signed_txn = txn.sign(creator.getPrivateKey())
-    client.send_transaction(signed_txn)
-
-    # check that the app ID of the escrow contract is valid, if so, return it.
-    response = wait_for_transaction(client, signed_txn.get_txid())
+    # sign the transaction and sent it, then check that the app ID of the escrow contract is valid, if so, return it.
+    _, response = send_and_wait(client, [txn], creator, tracker=tracker, scheduler=scheduler)
     assert response.applicationIndex is not None and response.applicationIndex > 0
+
+    # the constructor does not touch the global state, so it is known without fetching it.
+    if state_cache is not None:
+        state_cache.seed(response.applicationIndex, {}, response.confirmedRound)
     return response.applicationIndex
     
-def fund_escrow_contract(client: AlgodClient, funder: Account, application_ID: int):
+@instrumented
+def fund_escrow_contract(
+    client: AlgodClient,
+    funder: Account,
+    application_ID: int,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+    scheduler: Optional[SubmissionScheduler] = None,
+):
     """ A function to fund the escrow contract specified using the application ID using a funder account. 
     
     Args: 
         client: An algod client.
         funder: The account providing the funding for the escrow account.
         application_ID: The application ID of the escrow account.
+        tracker: A confirmation tracker to wait on, if any.
+        params: A suggested params provider to build the transactions with, if any.
+        scheduler: A submission scheduler to send the transaction through, if any.
     
     Returns: 
         signed_fund_txn_id: the transaction ID of the funding transaction.
     """
 
-    suggested_params = client.suggested_params()
-    app_address = get_application_address(application_ID)
+    suggested_params = get_suggested_params(client, params)
+    txn = fund_escrow_txn(funder, application_ID, suggested_params)
 
-    funding_amount = (
-        # min account balance
-        100_000
-        # additional min balance to opt into NFT
-        + 100_000
-        # 3 * min txn fee
-        + 3 * 1_000
-    )
+    (signed_fund_txn,), _ = send_and_wait(client, [txn], funder, tracker=tracker, scheduler=scheduler)
 
-    fund_escrow_txn = transaction.PaymentTxn(
-        sender=funder.getAddress(),
-        receiver=app_address,
-        amt=funding_amount,
-        sp=suggested_params,
-    )
+    return signed_fund_txn.get_txid()
 
-    signed_fund_txn = fund_escrow_txn.sign(funder.getPrivateKey())
-    client.send_transaction(signed_fund_txn)
+@instrumented
+def create_escrow_contracts(
+    client: AlgodClient,
+    creator: Account,
+    count: int,
+    funder: Optional[Account] = None,
+    max_in_flight: int = 16,
+    timeout: int = 10,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+    state_cache: Optional[GlobalStateCache] = None,
+) -> Tuple[List[Optional[Tuple[int, str]]], Dict[int, str]]:
+    """Create and fund many escrow contracts, packing the transactions into atomic groups of up to 16.
 
-    signed_fund_txn_id = signed_fund_txn.get_txid()
-    wait_for_transaction(client, signed_fund_txn_id)
+    Up to `max_in_flight` groups are kept in the transaction pool at once. Every round, the tracker checks the groups
+    for confirmation; the app IDs are read from the confirmed creation groups and a funding group is sent for them straight
+    away, so creating and funding N contracts takes a handful of rounds instead of 2N. A group failing does not stop
+    the others: its error is recorded for each of its escrows.
 
-    return signed_fund_txn_id
+    Args:
+        client: An algod client.
+        creator: The account that will create the escrow contracts.
+        count: The number of escrow contracts to create.
+        funder: The account funding the escrow contracts, the creator if not given.
+        max_in_flight: The maximum number of groups waiting for confirmation at once.
+        timeout: The number of rounds to wait for a group to be confirmed.
+        tracker: A confirmation tracker to wait on, a new one if not given.
+        params: A suggested params provider to build the transactions with, if any.
+        state_cache: A global state cache to seed with the (empty) state of the new contracts, if any.
 
-def deposit_NFT(client: AlgodClient, seller: Account, application_ID: int, NFT_ID: int):
+    Returns:
+        The (application ID, application address) of each escrow contract in creation order, None if it was not
+        created, and the error of each escrow, by its index, whose creation or funding failed. An escrow created but not
+        funded has both, and can still be funded.
+    """
+    funder = creator if funder is None else funder
+    approval, clear = get_contracts(client)
+
+    # otherwise identical creation transactions need a unique note, or they would share a transaction ID.
+    nonce = os.urandom(8)
+    results: List[Optional[Tuple[int, str]]] = [None] * count
+    failed: Dict[int, str] = dict()
+
+    # groups waiting to be sent, as ("create" | "fund", escrow indexes); funding groups go first as they finish escrows.
+    creates = deque(
+        ("create", list(range(start, min(start + MAX_GROUP_SIZE, count))))
+        for start in range(0, count, MAX_GROUP_SIZE)
+    )
+    funds: Deque[Tuple[str, List[int]]] = deque()
+    # groups in the pool, as the future of the group's last transaction -> (kind, escrow indexes, futures).
+    in_flight: Dict[Future, Tuple[str, List[int], List[Future]]] = dict()
+    tracker = ConfirmationTracker(client, timeout) if tracker is None else tracker
+
+    while creates or funds or in_flight:
+        if (creates or funds) and len(in_flight) < max_in_flight:
+            suggested_params = get_suggested_params(client, params)
+
+        while (creates or funds) and len(in_flight) < max_in_flight:
+            kind, indexes = funds.popleft() if funds else creates.popleft()
+
+            if kind == "create":
+                txns = [
+                    create_escrow_txn(creator, approval, clear, suggested_params, note=nonce + index.to_bytes(8, "big"))
+                    for index in indexes
+                ]
+                signer = creator
+            else:
+                txns = [fund_escrow_txn(funder, results[index][0], suggested_params) for index in indexes]
+                signer = funder
+
+            if len(txns) > 1:
+                transaction.assign_group_id(txns)
+            try:
+                signed_txns = sign_and_send(client, txns, signer)
+            except Exception as error:
+                failed.update((index, str(error)) for index in indexes)
+                continue
+            futures = tracker.register_group([signed.get_txid() for signed in signed_txns], timeout=timeout)
+            in_flight[futures[-1]] = (kind, indexes, futures)
+
+        # the tracker checks every group once per round; the app IDs come from the confirmed creation groups.
+        for done in tracker.wait_any(in_flight):
+            kind, indexes, futures = in_flight.pop(done)
+            if done.exception() is not None:
+                failed.update((index, str(done.exception())) for index in indexes)
+                continue
+            if kind == "create":
+                for index, future in zip(indexes, futures):
+                    response = future.result()
+                    application_ID = response.applicationIndex
+                    assert application_ID is not None and application_ID > 0
+                    results[index] = (application_ID, get_application_address(application_ID))
+                    if state_cache is not None:
+                        state_cache.seed(application_ID, {}, response.confirmedRound)
+                funds.append(("fund", indexes))
+
+    return results, failed
+
+@instrumented
+def deposit_NFT(
+    client: AlgodClient,
+    seller: Account,
+    application_ID: int,
+    NFT_ID: int,
+    price: int = DEFAULT_PRICE,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+    state_cache: Optional[GlobalStateCache] = None,
+    scheduler: Optional[SubmissionScheduler] = None,
+):
     """Opt in Contract to receive the required seller NFT (via on_setup method) and deposit NFT from seller.
 
     Args:
@@ -117,130 +391,460 @@ def deposit_NFT(client: AlgodClient, seller: Account, application_ID: int, NFT_I
         seller: An account that possesses a NFT to deposit to the contract.
         appID: The Application ID of the contract.
         nftID: The NFT ID of the contract.
+        price: The price the NFT is sold at, in microAlgos.
+        tracker: A confirmation tracker to wait on, if any.
+        params: A suggested params provider to build the transactions with, if any.
+        state_cache: A global state cache to apply the deposit to, if any.
+        scheduler: A submission scheduler to send the group through, if any.
 
     Returns:
         signed_deposit_NFT_txn_id: the transaction ID of the NFT deposit transaction.
     """
 
-    application_address = get_application_address(application_ID)
-    suggested_params = client.suggested_params()
+    suggested_params = get_suggested_params(client, params)
+    on_deposit_txn, deposit_NFT_txn = deposit_NFT_txns(seller, application_ID, NFT_ID, suggested_params, price)
 
-    # sets the price of the NFT to 1 Algo.
-    price = 1_000_000  
+    # sign both transactions by the seller and send, then wait for NFT to be deposited in contract; the group is
+    # confirmed at once, and the app call carries the state delta.
+    (_, signed_deposit_NFT_txn), response = send_and_wait(
+        client, [on_deposit_txn, deposit_NFT_txn], seller, waited=0, tracker=tracker, scheduler=scheduler
+    )
+    if state_cache is not None:
+        state_cache.apply(application_ID, response)
+    
+    return signed_deposit_NFT_txn.get_txid()
+
+@instrumented
+def pay_contract(
+    client: AlgodClient,
+    application_ID: int,
+    buyer: Account,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+    state_cache: Optional[GlobalStateCache] = None,
+    scheduler: Optional[SubmissionScheduler] = None,
+):
+    """ From the buyer address, buy the NFT deposited in the contract. Also, call the on_buy method in the contract to transfer the NFT asset from the contract to the buyer.
 
-    # set up special 'app_args' for deposit call transaction below.
-    app_args = [
-        b"deposit",
-        encoding.decode_address(get_account("seller").getAddress()),
-        NFT_ID.to_bytes(8, "big"),
-        price.to_bytes(8, "big")
-    ]
+    The buyer opt-in to the NFT, the payment and the app call are sent as a single atomic group, so the purchase
+    completes in one round.
 
-    # calls the 'on_deposit' method in the contract.
+    Args:
+        client: An Algod client.
+        application_ID: The app ID of the auction.
+        buyer: A buyer account.
+        tracker: A confirmation tracker to wait on, if any.
+        params: A suggested params provider to build the transactions with, if any.
+        state_cache: A global state cache to read the contract state from and apply the purchase to, if any.
+        scheduler: A submission scheduler to send the group through, if any.
+
+    Returns: 
+        signed_pay_txn_id: the transaction ID of the payment transaction from the buyer to the smart contract.
+    """
+
+    application_global_state = get_app_global_state(client, application_ID, state_cache)
+
+    txns = pay_contract_txns(application_ID, buyer, application_global_state, get_suggested_params(client, params))
+
+    # sign the transactions (all by the buyer), send them as one group and wait for the call transaction to complete.
+    (_, signed_pay_txn, _), response = send_and_wait(client, txns, buyer, tracker=tracker, scheduler=scheduler)
+    if state_cache is not None:
+        state_cache.apply(application_ID, response)
+
+    return signed_pay_txn.get_txid()
+
+# Basket purchases; buying from many escrow contracts in as few atomic groups as the group size limit allows.
+# =============================================================================================
+
+# The number of escrow purchases fitting in an atomic group, as each takes 3 transactions.
+PURCHASES_PER_GROUP = MAX_GROUP_SIZE // 3
+
+def escrow_for_sale(application_global_state: Dict[bytes, Union[int, bytes]]) -> bool:
+    """ Whether an escrow contract holds an NFT for sale: deposited, and not bought yet."""
+    return (
+        isinstance(application_global_state.get(b"seller"), bytes)
+        and bool(application_global_state.get(b"nft_id"))
+        and b"buyer" not in application_global_state
+    )
+
+def basket_txns(
+    buyer: Account,
+    application_global_states: Dict[int, Dict[bytes, Union[int, bytes]]],
+    suggested_params: transaction.SuggestedParams,
+) -> List[List[transaction.Transaction]]:
+    """ The purchase groups of a basket: the purchases of `pay_contract_txns`, PURCHASES_PER_GROUP per atomic group."""
+    application_IDs = list(application_global_states)
+    groups: List[List[transaction.Transaction]] = []
+
+    for start in range(0, len(application_IDs), PURCHASES_PER_GROUP):
+        txns: List[transaction.Transaction] = []
+        for application_ID in application_IDs[start:start + PURCHASES_PER_GROUP]:
+            txns.extend(pay_contract_txns(
+                application_ID, buyer, application_global_states[application_ID], suggested_params
+            ))
+
+        # the group ID is computed over the transactions without one.
+        for txn in txns:
+            txn.group = None
+        transaction.assign_group_id(txns)
+        groups.append(txns)
+
+    return groups
+
+@instrumented
+def basket_purchase(
+    client: AlgodClient,
+    buyer: Account,
+    application_IDs: List[int],
+    timeout: int = 10,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+    state_cache: Optional[GlobalStateCache] = None,
+) -> Tuple[List[int], Dict[int, str]]:
+    """Buy the NFTs of many escrow contracts, with up to 5 purchases per atomic group.
+
+    The state of every contract is resolved up front (from the cache, the rest fetched concurrently), contracts with
+    nothing for sale are left out, then every group is sent at once, so a basket settles in about a round. Each group
+    goes through entirely or not at all.
+
+    Args:
+        client: An algod client.
+        buyer: A buyer account.
+        application_IDs: The app IDs of the escrow contracts to buy from.
+        timeout: The number of rounds to wait for a group to be confirmed.
+        tracker: A confirmation tracker to wait on, a new one if not given.
+        params: A suggested params provider to build the transactions with, if any.
+        state_cache: A global state cache to read the contract states from and apply the purchases to, if any.
+
+    Returns:
+        The app IDs bought from, in order, and the error of each app ID whose group failed.
+    """
+    application_global_states = get_app_global_states(client, application_IDs, state_cache)
+    failed: Dict[int, str] = {
+        application_ID: "no NFT for sale"
+        for application_ID, state in application_global_states.items()
+        if not escrow_for_sale(state)
+    }
+    for application_ID in failed:
+        del application_global_states[application_ID]
+
+    groups = basket_txns(buyer, application_global_states, get_suggested_params(client, params))
+    tracker = ConfirmationTracker(client, timeout) if tracker is None else tracker
+
+    # groups in the pool, as the future of the group's last transaction -> (app IDs, futures of the app calls).
+    in_flight: Dict[Future, Tuple[List[int], List[Future]]] = dict()
+
+    for txns in groups:
+        group_application_IDs = [txn.index for txn in txns if isinstance(txn, transaction.ApplicationCallTxn)]
+        try:
+            signed_txns = sign_and_send(client, txns, buyer)
+        except Exception as error:
+            failed.update((application_ID, str(error)) for application_ID in group_application_IDs)
+            continue
+
+        futures = tracker.register_group([signed.get_txid() for signed in signed_txns], timeout=timeout)
+        call_futures = [
+            future for future, txn in zip(futures, txns) if isinstance(txn, transaction.ApplicationCallTxn)
+        ]
+        in_flight[futures[-1]] = (group_application_IDs, call_futures)
+
+    bought = set()
+    while in_flight:
+        for done in tracker.wait_any(in_flight):
+            group_application_IDs, call_futures = in_flight.pop(done)
+            if done.exception() is not None:
+                failed.update((application_ID, str(done.exception())) for application_ID in group_application_IDs)
+                continue
+
+            bought.update(group_application_IDs)
+            if state_cache is not None:
+                for application_ID, future in zip(group_application_IDs, call_futures):
+                    state_cache.apply(application_ID, future.result())
+
+    return [application_ID for application_ID in application_IDs if application_ID in bought], failed
+
+# Multi-listing mode; a single contract holding many listings at once, keyed by NFT ID.
+# =============================================================================================
+
+def multi_listing_funding_amount(listings: int = MAX_LISTINGS) -> int:
+    """ The amount a multi-listing contract must be funded with to hold `listings` listings at once."""
+    return (
+        # min account balance
+        100_000
+        # per listing, additional min balance to opt into the NFT and 3 * min txn fee (opt-in, payment, NFT transfer)
+        + listings * (100_000 + 3 * 1_000)
+    )
+
+def get_multi_listing_contracts(client: AlgodClient) -> Tuple[bytes, bytes]:
+    """ Get the compiled approval and clear state programs of the multi-listing contract, see `get_contracts`."""
+    return (
+        compile_program(client, multi_listing_approval_program).program,
+        compile_program(client, clear_state_program).program,
+    )
+
+def create_multi_listing_txn(
+    creator: Account,
+    approval: bytes,
+    clear: bytes,
+    suggested_params: transaction.SuggestedParams,
+    note: Optional[bytes] = None,
+) -> transaction.ApplicationCreateTxn:
+    """ The transaction creating a multi-listing contract, with a global byte slice per listing."""
+    global_schema = transaction.StateSchema(num_uints=0, num_byte_slices=MAX_LISTINGS)
+    local_schema = transaction.StateSchema(num_uints=0, num_byte_slices=0)
+
+    return transaction.ApplicationCreateTxn(
+        sender=creator.getAddress(),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=approval,
+        clear_program=clear,
+        global_schema=global_schema,
+        local_schema=local_schema,
+        sp=suggested_params,
+        note=note,
+    )
+
+def list_NFT_txns(
+    seller: Account, application_ID: int, NFT_ID: int, price: int, suggested_params: transaction.SuggestedParams
+) -> List[transaction.Transaction]:
+    """ The grouped 'deposit' app call listing an NFT at a price, and the NFT transfer to the contract."""
     on_deposit_txn = transaction.ApplicationCallTxn(
         sender=seller.getAddress(),
         index=application_ID,
         on_complete=transaction.OnComplete.NoOpOC,
-        app_args=app_args,
+        app_args=[b"deposit", price.to_bytes(8, "big")],
         foreign_assets=[NFT_ID],
         sp=suggested_params,
     )
 
-    # set up the NFT deposit transaction from seller to contract.
     deposit_NFT_txn = transaction.AssetTransferTxn(
         sender=seller.getAddress(),
-        receiver=application_address,
+        receiver=get_application_address(application_ID),
         index=NFT_ID,
         amt=1,
         sp=suggested_params,
     )
 
-    # assign a group of transactions.
     transaction.assign_group_id([on_deposit_txn, deposit_NFT_txn])
+    return [on_deposit_txn, deposit_NFT_txn]
 
-    # sign both transactions by the seller and send.
-    signed_on_deposit_txn = on_deposit_txn.sign(seller.getPrivateKey())
-    signed_deposit_NFT_txn = deposit_NFT_txn.sign(seller.getPrivateKey())
-    client.send_transactions([signed_on_deposit_txn, signed_deposit_NFT_txn])
-
-    # wait for NFT to be deposited in contract.
-    signed_deposit_NFT_txn_id = signed_deposit_NFT_txn.get_txid()
-    wait_for_transaction(client, signed_deposit_NFT_txn_id)
-    
-    return signed_deposit_NFT_txn_id
-
-def pay_contract(client: AlgodClient, application_ID: int, buyer: Account):
-    """ From the buyer address, buy the NFT deposited in the contract. Also, call the on_buy method in the contract to transfer the NFT asset from the contract to the buyer.
-
-    Args:
-        client: An Algod client.
-        application_ID: The app ID of the auction.
-        buyer: A buyer account.
-
-    Returns: 
-        signed_pay_txn_id: the transaction ID of the payment transaction from the buyer to the smart contract.
-    """
-
-    application_address = get_application_address(application_ID)
-    application_global_state = get_app_global_state(client, application_ID)
-    NFT_ID = application_global_state[b"nft_id"]
-
-    accounts = [encoding.encode_address(application_global_state[b"seller"])]
-    accounts.append(buyer.getAddress())
+def buy_listing_txns(
+    buyer: Account, application_ID: int, listing: Listing, suggested_params: transaction.SuggestedParams
+) -> List[transaction.Transaction]:
+    """ The grouped buyer opt-in to the NFT, payment of the listing price to the contract and 'buy' app call."""
+    opt_in_buyer_txn = buyer_opt_in_txn(buyer, listing.nft_id, suggested_params)
 
-    suggested_params = client.suggested_params()
-
-    # set up the payment transaction.
-    price = 1_000_000  # 1 Algo
     pay_txn = transaction.PaymentTxn(
         sender=buyer.getAddress(),
-        receiver=application_address,
-        amt=price,
+        receiver=get_application_address(application_ID),
+        amt=listing.price,
         sp=suggested_params,
     )
-    
-    opt_in_buyer_txn = AssetTransferTxn(
+
+    # the seller is passed in the accounts array, as the receiver of the inner payment.
+    call_on_buy_txn = transaction.ApplicationCallTxn(
         sender=buyer.getAddress(),
+        index=application_ID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=[b"buy"],
+        foreign_assets=[listing.nft_id],
+        accounts=[listing.seller],
         sp=suggested_params,
-        receiver=buyer.getAddress(),
-        amt=0,
-        index=NFT_ID,
     )
 
-    signed_opt_buyer_txn = opt_in_buyer_txn.sign(buyer.getPrivateKey())
-    opt_buyer_txn_id = client.send_transaction(signed_opt_buyer_txn)
-    wait_for_transaction(client, opt_buyer_txn_id)
-
-    app_args = [
-        b"buy",
-        encoding.decode_address(buyer.getAddress()),
-        # price.to_bytes(8, "big")
-    ]
+    transaction.assign_group_id([opt_in_buyer_txn, pay_txn, call_on_buy_txn])
+    return [opt_in_buyer_txn, pay_txn, call_on_buy_txn]
 
-    creator = get_account("creator")
-    # set up the call on_buy transaction.
-    call_on_buy_txn = transaction.ApplicationCallTxn(
-        sender=creator.getAddress(),
+def cancel_listing_txn(
+    seller: Account, application_ID: int, NFT_ID: int, suggested_params: transaction.SuggestedParams
+) -> transaction.ApplicationCallTxn:
+    """ The 'cancel' app call returning a listed NFT to its seller."""
+    return transaction.ApplicationCallTxn(
+        sender=seller.getAddress(),
         index=application_ID,
         on_complete=transaction.OnComplete.NoOpOC,
-        app_args=app_args,
+        app_args=[b"cancel"],
         foreign_assets=[NFT_ID],
-        accounts=accounts,
         sp=suggested_params,
     )
 
-    # group the pay and the call on_buy transactions.
-    transaction.assign_group_id([pay_txn, call_on_buy_txn])
+def _send_group(
+    client: AlgodClient,
+    txns: List[transaction.Transaction],
+    signer: Account,
+    tracker: Optional[ConfirmationTracker],
+    state_cache: Optional[GlobalStateCache] = None,
+    scheduler: Optional[SubmissionScheduler] = None,
+) -> str:
+    """Sign a group of transactions by a single account, send it and wait for it.
 
-    # sign the transactions and send them.
-    signed_pay_txn = pay_txn.sign(buyer.getPrivateKey())
-    signed_call_txn = call_on_buy_txn.sign(creator.getPrivateKey())
-    client.send_transactions([signed_pay_txn, signed_call_txn])
+    The app call of the group (if any) is the transaction waited on, so its state delta can be applied to the cache.
 
-    # wait for the call transaction to complete.
-    signed_pay_txn_id = signed_pay_txn.get_txid()
-    wait_for_transaction(client, signed_pay_txn_id)
+    Returns:
+        The transaction ID of the app call of the group, or of its last transaction.
+    """
+    app_calls = [index for index, txn in enumerate(txns) if isinstance(txn, transaction.ApplicationCallTxn)]
+    signed_txns, response = send_and_wait(
+        client, txns, signer, waited=app_calls[0] if app_calls else -1, tracker=tracker, scheduler=scheduler
+    )
+    waited_txn = signed_txns[app_calls[0]] if app_calls else signed_txns[-1]
+
+    if state_cache is not None and app_calls:
+        state_cache.apply(waited_txn.transaction.index, response)
+    return waited_txn.get_txid()
+
+@instrumented(result_tag="app_id")
+def create_multi_listing_contract(
+    client: AlgodClient,
+    creator: Account,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+    state_cache: Optional[GlobalStateCache] = None,
+    scheduler: Optional[SubmissionScheduler] = None,
+) -> int:
+    """Create a new multi-listing escrow contract.
 
-    return signed_pay_txn_id
+    Args:
+        client: An algod client.
+        creator: The account that will create the contract.
+        tracker: A confirmation tracker to wait on, if any.
+        params: A suggested params provider to build the transactions with, if any.
+        state_cache: A global state cache to seed with the (empty) state of the new contract, if any.
+        scheduler: A submission scheduler to send the transaction through, if any.
 
+    Returns:
+        The ID of the newly created contract.
+    """
+    approval, clear = get_multi_listing_contracts(client)
+    txn = create_multi_listing_txn(creator, approval, clear, get_suggested_params(client, params))
 
+    _, response = send_and_wait(client, [txn], creator, tracker=tracker, scheduler=scheduler)
+    assert response.applicationIndex is not None and response.applicationIndex > 0
+
+    if state_cache is not None:
+        state_cache.seed(response.applicationIndex, {}, response.confirmedRound)
+    return response.applicationIndex
+
+@instrumented
+def fund_multi_listing_contract(
+    client: AlgodClient,
+    funder: Account,
+    application_ID: int,
+    listings: int = MAX_LISTINGS,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+    scheduler: Optional[SubmissionScheduler] = None,
+):
+    """Fund a multi-listing contract for a number of concurrent listings.
+
+    Args:
+        client: An algod client.
+        funder: The account providing the funding.
+        application_ID: The application ID of the contract.
+        listings: The number of listings to fund the contract for.
+        tracker: A confirmation tracker to wait on, if any.
+        params: A suggested params provider to build the transactions with, if any.
+        scheduler: A submission scheduler to send the transaction through, if any.
+
+    Returns:
+        The transaction ID of the funding transaction.
+    """
+    txn = transaction.PaymentTxn(
+        sender=funder.getAddress(),
+        receiver=get_application_address(application_ID),
+        amt=multi_listing_funding_amount(listings),
+        sp=get_suggested_params(client, params),
+    )
+    return _send_group(client, [txn], funder, tracker, scheduler=scheduler)
+
+@instrumented
+def list_NFT(
+    client: AlgodClient,
+    seller: Account,
+    application_ID: int,
+    NFT_ID: int,
+    price: int,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+    state_cache: Optional[GlobalStateCache] = None,
+    scheduler: Optional[SubmissionScheduler] = None,
+):
+    """List an NFT of the seller in a multi-listing contract.
+
+    Args:
+        client: An algod client.
+        seller: An account that possesses the NFT.
+        application_ID: The application ID of the contract.
+        NFT_ID: The NFT ID.
+        price: The price of the NFT in microAlgos.
+        tracker: A confirmation tracker to wait on, if any.
+        params: A suggested params provider to build the transactions with, if any.
+        state_cache: A global state cache to apply the listing to, if any.
+        scheduler: A submission scheduler to send the group through, if any.
+
+    Returns:
+        The transaction ID of the 'deposit' app call.
+    """
+    txns = list_NFT_txns(seller, application_ID, NFT_ID, price, get_suggested_params(client, params))
+    return _send_group(client, txns, seller, tracker, state_cache, scheduler)
+
+@instrumented
+def buy_listing(
+    client: AlgodClient,
+    buyer: Account,
+    application_ID: int,
+    NFT_ID: int,
+    listing: Optional[Listing] = None,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+    state_cache: Optional[GlobalStateCache] = None,
+    scheduler: Optional[SubmissionScheduler] = None,
+):
+    """Buy a listed NFT from a multi-listing contract, in a single round.
+
+    Args:
+        client: An algod client.
+        buyer: A buyer account.
+        application_ID: The application ID of the contract.
+        NFT_ID: The NFT ID.
+        listing: The listing of the NFT, read from the contract if not given.
+        tracker: A confirmation tracker to wait on, if any.
+        params: A suggested params provider to build the transactions with, if any.
+        state_cache: A global state cache to read the listing from and apply the purchase to, if any.
+        scheduler: A submission scheduler to send the group through, if any.
+
+    Returns:
+        The transaction ID of the 'buy' app call.
+    """
+    listing = get_listings(client, application_ID, state_cache)[NFT_ID] if listing is None else listing
+    txns = buy_listing_txns(buyer, application_ID, listing, get_suggested_params(client, params))
+    return _send_group(client, txns, buyer, tracker, state_cache, scheduler)
+
+@instrumented
+def cancel_listing(
+    client: AlgodClient,
+    seller: Account,
+    application_ID: int,
+    NFT_ID: int,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+    state_cache: Optional[GlobalStateCache] = None,
+    scheduler: Optional[SubmissionScheduler] = None,
+):
+    """Cancel a listing of a multi-listing contract, returning the NFT to the seller.
+
+    Args:
+        client: An algod client.
+        seller: The seller of the listing.
+        application_ID: The application ID of the contract.
+        NFT_ID: The NFT ID.
+        tracker: A confirmation tracker to wait on, if any.
+        params: A suggested params provider to build the transactions with, if any.
+        state_cache: A global state cache to apply the cancellation to, if any.
+        scheduler: A submission scheduler to send the transaction through, if any.
+
+    Returns:
+        The transaction ID of the 'cancel' app call.
+    """
+    txn = cancel_listing_txn(seller, application_ID, NFT_ID, get_suggested_params(client, params))
+    return _send_group(client, [txn], seller, tracker, state_cache, scheduler)
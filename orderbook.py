@@ -0,0 +1,275 @@
+# Python imports
+import sys
+import time
+import random
+import argparse
+import threading
+from bisect import bisect_left, insort
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+# Algorand library imports.
+from algosdk import encoding
+from algosdk.future import transaction
+
+# Import the escrow snapshots, to build the book from the state of many contracts at once.
+from snapshot import EscrowSnapshot, take_snapshot
+
+# Import the purchase group builder.
+from operations import escrow_for_sale, pay_contract_txns
+
+# Import utility classes and functions.
+from utils import Account, get_client
+
+# An in-memory order book of the NFTs listed in escrow contracts, built from their global state (seller, NFT ID and
+# price), and a batch matching engine pairing buy orders with the cheapest listings and emitting the purchase groups
+# (opt-in, payment of the listed price and 'buy' call) ready to be signed by the buyers.
+#
+#   book = OrderBook.from_snapshot(take_snapshot(client, creator_address))
+#   fills = book.match([BuyOrder(buyer, quantity=10, max_price=2_000_000)])
+#   groups = purchase_groups(fills, client.suggested_params())
+#
+# Listings are kept sorted by price, once for the whole book and once per category (asset metadata such as the vintage
+# of the carbon credit, which the caller derives from the asset), so a match is a binary search and a slice.
+# Matched listings leave the book right away; `restore` puts back the fills of groups that could not be sent.
+
+# the sort key of a listing, (-price, -app ID): the lists are sorted in ascending key order, so the cheapest listing
+# (and the oldest contract at equal prices) is last, and matching takes listings off the tail of the lists.
+PriceKey = Tuple[int, int]
+
+# Useful Classes
+# =============================================================================================
+
+class BookListing(NamedTuple):
+    """An NFT for sale in an escrow contract."""
+
+    app_id: int
+    nft_id: int
+    seller: str
+    price: int
+    category: Optional[str] = None
+
+class BuyOrder(NamedTuple):
+    """An order to buy `quantity` NFTs at `max_price` or below each, optionally of a single category."""
+
+    buyer: Account
+    quantity: int = 1
+    max_price: Optional[int] = None
+    category: Optional[str] = None
+
+class Fill(NamedTuple):
+    """A listing matched with a buy order."""
+
+    order: BuyOrder
+    listing: BookListing
+
+class OrderBook:
+    """The listings of many escrow contracts, sorted by price overall and per category."""
+
+    def __init__(self) -> None:
+        self.listings: Dict[int, BookListing] = dict()
+        self.by_price: List[PriceKey] = []
+        self.by_category: Dict[Optional[str], List[PriceKey]] = dict()
+        self.by_nft: Dict[int, int] = dict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.listings)
+
+    def __contains__(self, app_ID: int) -> bool:
+        return app_ID in self.listings
+
+    def get(self, app_ID: int) -> Optional[BookListing]:
+        return self.listings.get(app_ID)
+
+    def get_by_nft(self, NFT_ID: int) -> Optional[BookListing]:
+        app_ID = self.by_nft.get(NFT_ID)
+        return self.listings.get(app_ID) if app_ID is not None else None
+
+    # Adding and removing listings
+    # =============================================================================================
+
+    def add(self, listing: BookListing) -> None:
+        """ Add a listing, replacing the previous listing of the same contract."""
+        with self.lock:
+            self._remove(listing.app_id)
+            key = (-listing.price, -listing.app_id)
+            self.listings[listing.app_id] = listing
+            self.by_nft[listing.nft_id] = listing.app_id
+            insort(self.by_price, key)
+            insort(self.by_category.setdefault(listing.category, []), key)
+
+    def add_all(self, listings: Iterable[BookListing]) -> None:
+        """ Add many listings, sorting once instead of inserting one at a time."""
+        with self.lock:
+            for listing in listings:
+                self._remove(listing.app_id)
+                self.listings[listing.app_id] = listing
+                self.by_nft[listing.nft_id] = listing.app_id
+            self.by_price = sorted((-listing.price, -listing.app_id) for listing in self.listings.values())
+            self.by_category = dict()
+            for key in self.by_price:
+                self.by_category.setdefault(self.listings[-key[1]].category, []).append(key)
+
+    def add_state(self, app_ID: int, state: Dict[bytes, Union[int, bytes]], category: Optional[str] = None) -> bool:
+        """Add the listing of an escrow contract from its decoded global state, e.g. from `get_app_global_state`.
+
+        Returns:
+            Whether the contract holds an NFT for sale; contracts with no deposit, or already bought, are skipped.
+        """
+        if not escrow_for_sale(state):
+            return False
+        self.add(BookListing(app_ID, state[b"nft_id"], encoding.encode_address(state[b"seller"]), state[b"price"], category))
+        return True
+
+    def remove(self, app_ID: int) -> Optional[BookListing]:
+        with self.lock:
+            return self._remove(app_ID)
+
+    def _remove(self, app_ID: int) -> Optional[BookListing]:
+        listing = self.listings.pop(app_ID, None)
+        if listing is None:
+            return None
+        if self.by_nft.get(listing.nft_id) == app_ID:
+            del self.by_nft[listing.nft_id]
+        key = (-listing.price, -app_ID)
+        for keys in (self.by_price, self.by_category[listing.category]):
+            del keys[bisect_left(keys, key)]
+        return listing
+
+    @classmethod
+    def from_snapshot(
+        cls, snapshot: EscrowSnapshot, categories: Optional[Callable[[int], Optional[str]]] = None
+    ) -> "OrderBook":
+        """Build a book from a snapshot of escrow contracts, skipping the ones with nothing for sale.
+
+        Args:
+            snapshot: The snapshot of the escrow contracts.
+            categories: A function giving the category of an NFT ID, if any.
+        """
+        book = cls()
+        book.add_all(
+            BookListing(row.app_id, row.nft_id, row.seller, row.price, categories(row.nft_id) if categories else None)
+            for row in snapshot
+            if row.seller is not None and row.nft_id and not row.sold
+        )
+        return book
+
+    # Matching
+    # =============================================================================================
+
+    def best(self, count: int = 1, max_price: Optional[int] = None, category: Optional[str] = None) -> List[BookListing]:
+        """ The `count` cheapest listings at `max_price` or below, of a category if given, without taking them."""
+        with self.lock:
+            keys = self._candidates(category)
+            taken = min(count, self._affordable(keys, max_price))
+            return [self.listings[-app_ID] for _, app_ID in reversed(keys[len(keys) - taken:])]
+
+    def _candidates(self, category: Optional[str]) -> List[PriceKey]:
+        return self.by_price if category is None else self.by_category.get(category, [])
+
+    @staticmethod
+    def _affordable(keys: List[PriceKey], max_price: Optional[int]) -> int:
+        """ The number of listings of `keys` at `max_price` or below."""
+        if max_price is None:
+            return len(keys)
+        return len(keys) - bisect_left(keys, (-max_price, -sys.maxsize))
+
+    def match(self, orders: Sequence[BuyOrder]) -> List[Fill]:
+        """Match buy orders with the cheapest listings, in order, and take the matched listings out of the book.
+
+        An order is filled with as many listings as it asks for within its maximum price, possibly fewer.
+
+        Args:
+            orders: The buy orders, matched first come first served.
+
+        Returns:
+            The fills, in order.
+        """
+        fills: List[Fill] = []
+        with self.lock:
+            for order in orders:
+                keys = self._candidates(order.category)
+                count = min(order.quantity, self._affordable(keys, order.max_price))
+                if count <= 0:
+                    continue
+
+                # the taken keys are the tail of the candidates; they also leave the other sorted list they are in,
+                # close to its tail as well since they are among the cheapest.
+                taken = keys[len(keys) - count:]
+                del keys[len(keys) - count:]
+                for key in reversed(taken):
+                    listing = self.listings.pop(-key[1])
+                    if self.by_nft.get(listing.nft_id) == listing.app_id:
+                        del self.by_nft[listing.nft_id]
+                    other = self.by_category[listing.category] if order.category is None else self.by_price
+                    del other[bisect_left(other, key)]
+                    fills.append(Fill(order, listing))
+
+        return fills
+
+    def restore(self, fills: Iterable[Fill]) -> None:
+        """ Put the listings of fills back in the book, e.g. when their purchase group was rejected."""
+        for fill in fills:
+            self.add(fill.listing)
+
+# Purchase groups
+# =============================================================================================
+
+def listing_state(listing: BookListing) -> Dict[bytes, Union[int, bytes]]:
+    """ The global state of the escrow contract of a listing, as far as a purchase needs it."""
+    return {
+        b"seller": encoding.decode_address(listing.seller),
+        b"nft_id": listing.nft_id,
+        b"price": listing.price,
+    }
+
+def purchase_groups(
+    fills: Iterable[Fill], suggested_params: transaction.SuggestedParams
+) -> List[List[transaction.Transaction]]:
+    """The purchase group (buyer opt-in, payment of the book price and 'buy' call) of each fill, ready to be signed.
+
+    Args:
+        fills: The fills of a match.
+        suggested_params: The suggested params to build the transactions with.
+
+    Returns:
+        One group of transactions per fill, all to be signed by the buyer of the fill.
+    """
+    return [
+        pay_contract_txns(fill.listing.app_id, fill.order.buyer, listing_state(fill.listing), suggested_params)
+        for fill in fills
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the order book of the escrow contracts of a creator.")
+    parser.add_argument("creator", nargs="?", help="the creator of the escrow contracts, the creator role if not given")
+    parser.add_argument("--depth", type=int, default=10, help="the number of cheapest listings to show")
+    parser.add_argument("--synthetic", type=int, default=0, help="time matching on a synthetic book of this size instead")
+    arguments = parser.parse_args()
+
+    if arguments.synthetic:
+        book = OrderBook()
+        seller = encoding.encode_address(bytes(32))
+        book.add_all(
+            BookListing(app_ID, app_ID, seller, random.randrange(1, 10_000) * 1_000, f"vintage-{app_ID % 10}")
+            for app_ID in range(1, arguments.synthetic + 1)
+        )
+        buyer = Account("", seller)
+        orders = [BuyOrder(buyer, 5, 5_000_000, f"vintage-{index % 10}" if index % 2 else None) for index in range(1000)]
+        started = time.perf_counter()
+        fills = book.match(orders)
+        elapsed = time.perf_counter() - started
+        print(
+            f"Matched {len(orders)} orders ({len(fills)} fills) against {arguments.synthetic} listings in "
+            f"{elapsed * 1000:.2f}ms ({elapsed / len(orders) * 1e6:.1f}us per order)"
+        )
+        sys.exit(0)
+
+    from utils import get_account
+
+    creator_address = arguments.creator or get_account("creator").getAddress()
+    book = OrderBook.from_snapshot(take_snapshot(get_client(), creator_address))
+    for listing in book.best(arguments.depth):
+        print(f"{listing.price:>14} microAlgos  NFT {listing.nft_id} in {listing.app_id} from {listing.seller}")
+    print(f"{len(book)} listings")
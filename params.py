@@ -0,0 +1,117 @@
+# Python imports
+import copy
+import time
+import threading
+from typing import Optional
+
+# Algorand library imports.
+from algosdk.v2client.algod import AlgodClient
+from algosdk.future.transaction import SuggestedParams
+
+# Suggested params only change when the node moves on to a new round (and even then, the fee and genesis fields rarely
+# change), so a single trade has no reason to ask for them several times. The provider below keeps one copy around and
+# refreshes it according to a policy, based on the current round as reported by a confirmation tracker or, failing
+# that, estimated from the time elapsed since the last fetch.
+
+class ParamsPolicy:
+    """When cached suggested params should be refreshed.
+
+    Args:
+        max_rounds: Refresh once the node is this many rounds past the round the params were fetched at.
+        expiry_margin: Refresh once the validity window ends within this many rounds of the current round.
+        validity: The number of rounds the transactions built with the params are valid for.
+        block_time: The expected number of seconds per round, to estimate the round when none is observed.
+    """
+
+    def __init__(
+        self, max_rounds: int = 1, expiry_margin: int = 10, validity: int = 1000, block_time: float = 4.0
+    ) -> None:
+        self.max_rounds = max_rounds
+        self.expiry_margin = expiry_margin
+        self.validity = validity
+        self.block_time = block_time
+
+class SuggestedParamsProvider:
+    """Caches the suggested params of a node and refreshes them according to a policy.
+
+    Concurrent callers needing a refresh share a single `/transactions/params` request.
+    """
+
+    def __init__(self, client: AlgodClient, policy: Optional[ParamsPolicy] = None) -> None:
+        self.client = client
+        self.policy = ParamsPolicy() if policy is None else policy
+
+        self.params: Optional[SuggestedParams] = None
+        self.fetched_at = 0.0
+        self.observed_round: Optional[int] = None
+
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Condition()
+        self.refreshing = False
+
+    def attach(self, tracker) -> "SuggestedParamsProvider":
+        """ Follow the rounds seen by a confirmation tracker instead of estimating them."""
+        tracker.add_round_listener(self.observe_round)
+        return self
+
+    def observe_round(self, round: int) -> None:
+        with self.lock:
+            if self.observed_round is None or round > self.observed_round:
+                self.observed_round = round
+
+    def current_round(self) -> int:
+        """ The latest round known to the provider, observed or estimated from the time since the last fetch."""
+        estimated = self.params.first + int((time.monotonic() - self.fetched_at) / self.policy.block_time)
+        if self.observed_round is None:
+            return estimated
+        return max(self.observed_round, estimated)
+
+    def is_fresh(self) -> bool:
+        if self.params is None:
+            return False
+        current_round = self.current_round()
+        return (
+            current_round - self.params.first < self.policy.max_rounds
+            and self.params.last - current_round > self.policy.expiry_margin
+        )
+
+    def get(self) -> SuggestedParams:
+        """Get suggested params, from the cache if they are still fresh according to the policy.
+
+        Returns:
+            A copy of the cached suggested params, which the caller is free to modify (e.g. to set a flat fee).
+        """
+        with self.lock:
+            while True:
+                if self.is_fresh():
+                    self.hits += 1
+                    return copy.copy(self.params)
+                if not self.refreshing:
+                    break
+                # someone else is already fetching fresh params, wait for theirs.
+                self.lock.wait()
+
+            self.misses += 1
+            self.refreshing = True
+
+        try:
+            params = self.client.suggested_params()
+            params.last = params.first + self.policy.validity
+        except Exception:
+            with self.lock:
+                self.refreshing = False
+                self.lock.notify_all()
+            raise
+
+        with self.lock:
+            self.params = params
+            self.fetched_at = time.monotonic()
+            self.refreshing = False
+            self.lock.notify_all()
+            return copy.copy(params)
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.params = None
@@ -0,0 +1,328 @@
+# Python imports
+import os
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+# Algorand library imports.
+from algosdk.v2client.algod import AlgodClient
+from algosdk import encoding
+from algosdk.future import transaction
+
+# Import the shared confirmation tracker and suggested params provider.
+from tracker import ConfirmationTracker
+from params import SuggestedParamsProvider
+
+# Import the global state cache.
+from state_cache import GlobalStateCache
+
+# Import the carbon credit metadata of the bulk minting.
+from minting import CreditMetadata
+
+# Import the transaction builders of the operations.
+from operations import (
+    DEFAULT_PRICE, MAX_GROUP_SIZE, PURCHASES_PER_GROUP, create_escrow_txn, deposit_NFT_txns, fund_escrow_txn,
+    get_contracts, pay_contract_txns,
+)
+
+# Import utility classes and functions.
+from utils import Account, Pending_txn_response, carbon_credit_txn, get_suggested_params, sign_txns
+
+# A pipelined executor of many trades ("lots"), each going through the lifecycle of example.py: create and fund an
+# escrow contract, mint the NFT, deposit it and buy it. Rather than running the lifecycle of one lot after the other,
+# every stage has a queue of lots ready for it, and the executor keeps up to `max_in_flight` groups in the transaction
+# pool at once, drawn from all the queues. Different lots occupy different stages in the same round:
+#
+#   round 1: create 1-16, mint 1-16
+#   round 2: fund 1-16, create 17-32, mint 17-32
+#   round 3: deposit 1-16, fund 17-32, ...
+#
+# A lot is deposited once its escrow is funded and its NFT is minted, and bought once deposited. The transactions of a
+# stage are packed into atomic groups (16 creations, fundings or mints, 8 deposits or 5 purchases per group), each
+# transaction signed by its own account; a group failing fails the lots in it. Later stages are sent first, so lots
+# settle as early as possible.
+#
+#   pipeline = LotPipeline(client, creator)
+#   settlements = pipeline.run([Lot(seller, buyer, price) for ...])
+#   pipeline.settled_by_round        # {round: lots settled in that round}
+
+STAGES = ("create", "fund", "mint", "deposit", "buy")
+
+# the number of lots whose transactions fit in an atomic group, for each stage.
+LOTS_PER_GROUP = {
+    "create": MAX_GROUP_SIZE,
+    "fund": MAX_GROUP_SIZE,
+    "mint": MAX_GROUP_SIZE,
+    "deposit": MAX_GROUP_SIZE // 2,
+    "buy": PURCHASES_PER_GROUP,
+}
+
+# Useful Classes
+# =============================================================================================
+
+class Lot(NamedTuple):
+    """An NFT to mint by a seller, list at a price and sell to a buyer."""
+
+    seller: Account
+    buyer: Account
+    price: int = DEFAULT_PRICE
+    metadata: CreditMetadata = CreditMetadata()
+
+class Settlement(NamedTuple):
+    """The outcome of a lot: its escrow contract, NFT, the round each stage was confirmed in, or the error stopping it."""
+
+    lot: Lot
+    app_id: Optional[int]
+    nft_id: Optional[int]
+    rounds: Dict[str, int]
+    error: Optional[Exception] = None
+
+class _LotState:
+    """The progress of a lot through the pipeline."""
+
+    def __init__(self, index: int, lot: Lot) -> None:
+        self.index = index
+        self.lot = lot
+        self.app_ID: Optional[int] = None
+        self.NFT_ID: Optional[int] = None
+        self.rounds: Dict[str, int] = dict()
+        self.error: Optional[Exception] = None
+
+    def settlement(self) -> Settlement:
+        return Settlement(self.lot, self.app_ID, self.NFT_ID, self.rounds, self.error)
+
+class LotPipeline:
+    """Runs the lifecycle of many lots as a staged pipeline, overlapping the stages of different lots across rounds.
+
+    Args:
+        client: An algod client.
+        creator: The account creating the escrow contracts.
+        funder: The account funding the escrow contracts, the creator if not given.
+        max_in_flight: The maximum number of groups waiting for confirmation at once.
+        tracker: A confirmation tracker to wait on, a new one if not given.
+        params: A suggested params provider to build the transactions with, if any.
+        state_cache: A global state cache to seed and keep up to date with the deposits and purchases, if any.
+    """
+
+    def __init__(
+        self,
+        client: AlgodClient,
+        creator: Account,
+        funder: Optional[Account] = None,
+        max_in_flight: int = 64,
+        tracker: Optional[ConfirmationTracker] = None,
+        params: Optional[SuggestedParamsProvider] = None,
+        state_cache: Optional[GlobalStateCache] = None,
+    ) -> None:
+        self.client = client
+        self.creator = creator
+        self.funder = creator if funder is None else funder
+        self.max_in_flight = max_in_flight
+        self.tracker = ConfirmationTracker(client) if tracker is None else tracker
+        self.params = params
+        self.state_cache = state_cache
+
+        # the lots ready for each stage, and the groups in the pool as the future of their last transaction.
+        self.queues: Dict[str, Deque[_LotState]] = {stage: deque() for stage in STAGES}
+        self.in_flight: Dict[Future, Tuple[str, List[_LotState], List[Future]]] = dict()
+        self.settled_by_round: Dict[int, int] = dict()
+        self.lock = threading.Lock()
+
+    # Monitoring
+    # =============================================================================================
+
+    def queue_depths(self) -> Dict[str, int]:
+        """ The number of lots waiting for each stage, safe to call from another thread while running."""
+        with self.lock:
+            return {stage: len(queue) for stage, queue in self.queues.items()}
+
+    def in_flight_depths(self) -> Dict[str, int]:
+        """ The number of lots in the transaction pool, by stage."""
+        with self.lock:
+            depths = {stage: 0 for stage in STAGES}
+            for stage, lots, _ in self.in_flight.values():
+                depths[stage] += len(lots)
+            return depths
+
+    # Running
+    # =============================================================================================
+
+    def run(self, lots: List[Lot], on_round: Optional[Callable[[int, Dict[str, int]], None]] = None) -> List[Settlement]:
+        """Run the lifecycle of every lot, until each one is settled or failed.
+
+        Args:
+            lots: The lots to trade.
+            on_round: Called with the current round and the queue depths every time groups were sent, before waiting
+                for the next round.
+
+        Returns:
+            The settlement of every lot, in order.
+        """
+        states = [_LotState(index, lot) for index, lot in enumerate(lots)]
+        approval, clear = get_contracts(self.client)
+        # otherwise identical creations and mints need a unique note, or they would share a transaction ID.
+        nonce = os.urandom(8)
+
+        with self.lock:
+            self.queues["create"].extend(states)
+            self.queues["mint"].extend(states)
+
+        def build(
+            stage: str, state: _LotState, suggested_params: transaction.SuggestedParams
+        ) -> List[transaction.Transaction]:
+            lot = state.lot
+            note = nonce + state.index.to_bytes(8, "big")
+            if stage == "create":
+                return [create_escrow_txn(self.creator, approval, clear, suggested_params, note=note)]
+            if stage == "fund":
+                return [fund_escrow_txn(self.funder, state.app_ID, suggested_params)]
+            if stage == "mint":
+                metadata = lot.metadata
+                return [carbon_credit_txn(
+                    lot.seller, suggested_params, metadata.unit_name, metadata.asset_name, metadata.url,
+                    metadata.metadata_hash, note=note,
+                )]
+            if stage == "deposit":
+                return deposit_NFT_txns(lot.seller, state.app_ID, state.NFT_ID, suggested_params, lot.price)
+            listing = {
+                b"seller": encoding.decode_address(lot.seller.getAddress()), b"nft_id": state.NFT_ID, b"price": lot.price,
+            }
+            return pay_contract_txns(state.app_ID, lot.buyer, listing, suggested_params)
+
+        def signer(stage: str, state: _LotState) -> Account:
+            return {"create": self.creator, "fund": self.funder, "buy": state.lot.buyer}.get(stage, state.lot.seller)
+
+        while any(self.queues.values()) or self.in_flight:
+            if any(self.queues.values()) and len(self.in_flight) < self.max_in_flight:
+                suggested_params = get_suggested_params(self.client, self.params)
+
+            # later stages first, so the lots already in the pipeline settle before new ones start.
+            for stage in reversed(STAGES):
+                queue = self.queues[stage]
+                while queue and len(self.in_flight) < self.max_in_flight:
+                    with self.lock:
+                        group = [queue.popleft() for _ in range(min(LOTS_PER_GROUP[stage], len(queue)))]
+
+                    txns: List[transaction.Transaction] = []
+                    signers: List[Account] = []
+                    for state in group:
+                        lot_txns = build(stage, state, suggested_params)
+                        txns.extend(lot_txns)
+                        signers.extend([signer(stage, state)] * len(lot_txns))
+                    for txn in txns:
+                        txn.group = None
+                    if len(txns) > 1:
+                        transaction.assign_group_id(txns)
+
+                    signed_txns = [sign_txns([txn], account)[0] for txn, account in zip(txns, signers)]
+                    try:
+                        self.client.send_transactions(signed_txns)
+                    except Exception as error:
+                        self._fail(group, error)
+                        continue
+                    futures = self.tracker.track(signed_txns)
+                    with self.lock:
+                        self.in_flight[futures[-1]] = (stage, group, futures)
+
+            if on_round is not None:
+                on_round(self.tracker.current_round(), self.queue_depths())
+
+            for done in self.tracker.wait_any(self.in_flight):
+                with self.lock:
+                    stage, group, futures = self.in_flight.pop(done)
+                error = done.exception()
+                if error is not None:
+                    self._fail(group, error)
+                else:
+                    self._advance(stage, group, [future.result() for future in futures])
+
+        return [state.settlement() for state in states]
+
+    def _fail(self, group: List[_LotState], error: Exception) -> None:
+        for state in group:
+            state.error = error
+        # a lot failing at create or mint is still queued for the other one; it goes no further.
+        with self.lock:
+            for queue in self.queues.values():
+                for state in group:
+                    if state in queue:
+                        queue.remove(state)
+
+    def _advance(self, stage: str, group: List[_LotState], responses: List[Pending_txn_response]) -> None:
+        """ Record a confirmed group of a stage, and queue its lots for the stages they are now ready for."""
+        per_lot = len(responses) // len(group)
+        ready: Dict[str, List[_LotState]] = {stage: [] for stage in STAGES}
+
+        for position, state in enumerate(group):
+            lot_responses = responses[position * per_lot:(position + 1) * per_lot]
+            state.rounds[stage] = lot_responses[0].confirmedRound
+            if state.error is not None:
+                continue
+
+            if stage == "create":
+                state.app_ID = lot_responses[0].applicationIndex
+                if self.state_cache is not None:
+                    self.state_cache.seed(state.app_ID, {}, lot_responses[0].confirmedRound)
+                ready["fund"].append(state)
+            elif stage == "mint":
+                state.NFT_ID = lot_responses[0].assetIndex
+            elif stage == "deposit":
+                if self.state_cache is not None:
+                    self.state_cache.apply(state.app_ID, lot_responses[0])
+                ready["buy"].append(state)
+            elif stage == "buy":
+                if self.state_cache is not None:
+                    self.state_cache.apply(state.app_ID, lot_responses[2])
+                round = lot_responses[0].confirmedRound
+                self.settled_by_round[round] = self.settled_by_round.get(round, 0) + 1
+
+            # the deposit waits for both the funding of the escrow and the NFT.
+            if stage in ("fund", "mint") and "fund" in state.rounds and "mint" in state.rounds:
+                ready["deposit"].append(state)
+
+        with self.lock:
+            for next_stage, states in ready.items():
+                self.queues[next_stage].extend(states)
+
+
+if __name__ == "__main__":
+    from simulator import SimulatedAlgod
+    from accounts import Keyring
+
+    parser = argparse.ArgumentParser(description="Run lots through the pipeline on the simulated ledger.")
+    parser.add_argument("lots", type=int, nargs="?", default=100, help="the number of lots to trade")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="the maximum number of groups in the pool")
+    parser.add_argument("--sellers", type=int, default=10, help="the number of seller (and buyer) accounts")
+    arguments = parser.parse_args()
+
+    client = SimulatedAlgod(default_balance=10 ** 12)
+    keyring = Keyring()
+    creator = keyring.generate("creator")
+    sellers = [keyring.generate(f"seller-{index}") for index in range(arguments.sellers)]
+    buyers = [keyring.generate(f"buyer-{index}") for index in range(arguments.sellers)]
+    lots = [
+        Lot(sellers[index % len(sellers)], buyers[index % len(buyers)], 1_000_000 + index)
+        for index in range(arguments.lots)
+    ]
+
+    pipeline = LotPipeline(client, creator, max_in_flight=arguments.max_in_flight)
+    start_round = client.status()["last-round"]
+    started = time.perf_counter()
+
+    def report(round: int, depths: Dict[str, int]) -> None:
+        in_flight = pipeline.in_flight_depths()
+        stages = "  ".join(f"{stage} {depths[stage]:>4}/{in_flight[stage]:<4}" for stage in STAGES)
+        print(f"round {round - start_round:>4}  queued/in flight: {stages}")
+
+    settlements = pipeline.run(lots, on_round=report)
+    elapsed = time.perf_counter() - started
+
+    for round, count in sorted(pipeline.settled_by_round.items()):
+        print(f"round {round - start_round:>4}  settled {count}")
+
+    settled = sum(settlement.error is None for settlement in settlements)
+    rounds = client.status()["last-round"] - start_round
+    print(f"Settled {settled}/{len(lots)} lots in {rounds} rounds ({elapsed:.2f}s)")
@@ -0,0 +1,375 @@
+# Python imports
+import os
+import sys
+import json
+import argparse
+from os.path import join, dirname
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Pyteal imports.
+from pyteal import Expr
+
+# Import the compiled program artifact cache.
+from artifacts import TEAL_VERSION, default_cache, generate_teal, known_programs
+
+# An offline profiler for the escrow contracts. It compiles a program with compileTeal, follows the control flow of the
+# TEAL and walks the worst-case (most expensive) path through each method branch of the `Cond` dispatch, reporting
+# its opcode cost, instruction count, state reads and writes, and inner transactions. The program size is taken from
+# the artifact cache when the program was compiled before, and estimated from the TEAL otherwise.
+#
+#   python profiler.py                   print the profile of every program.
+#   python profiler.py --check           fail if a branch got more expensive than in profile_baseline.json.
+#   python profiler.py --update-baseline store the current profile as the baseline.
+
+BASELINE_PATH = join(dirname(__file__), "profile_baseline.json")
+
+# AVM limits for a single application call, without extra program pages.
+COST_BUDGET = 700
+MAX_PROGRAM_SIZE = 2048
+
+# the opcodes that do not cost 1 in TEAL v5.
+OPCODE_COSTS = {
+    "sha256": 35,
+    "keccak256": 130,
+    "sha512_256": 45,
+    "ed25519verify": 1900,
+    "ecdsa_verify": 1700,
+    "ecdsa_pk_decompress": 650,
+    "ecdsa_pk_recover": 2000,
+}
+
+STATE_READS = {
+    "app_global_get", "app_global_get_ex", "app_local_get", "app_local_get_ex",
+    "asset_holding_get", "asset_params_get", "app_params_get", "balance", "min_balance",
+}
+STATE_WRITES = {"app_global_put", "app_global_del", "app_local_put", "app_local_del"}
+
+# the size in bytes of opcodes with immediate arguments, when not 1.
+OPCODE_SIZES = {
+    "bnz": 3, "bz": 3, "b": 3, "callsub": 3,
+    "txn": 2, "global": 2, "gtxns": 2, "itxn_field": 2, "itxn": 2, "load": 2, "store": 2, "arg": 2,
+    "asset_holding_get": 2, "asset_params_get": 2, "app_params_get": 2, "gload": 3, "gloads": 2, "gaid": 2,
+    "txna": 3, "gtxn": 3, "gtxnsa": 3, "itxna": 3, "extract": 3, "substring": 3, "gtxna": 4,
+}
+
+# named integer constants understood by the assembler.
+NAMED_INTS = {
+    "NoOp": 0, "OptIn": 1, "CloseOut": 2, "ClearState": 3, "UpdateApplication": 4, "DeleteApplication": 5,
+    "unknown": 0, "pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6,
+}
+
+TERMINATORS = {"return", "err", "retsub"}
+
+# Useful Classes
+# =============================================================================================
+
+class Instruction:
+    """Represents a single TEAL instruction."""
+
+    def __init__(self, op: str, args: List[str]) -> None:
+        self.op = op
+        self.args = args
+
+    def __repr__(self) -> str:
+        return " ".join([self.op] + self.args)
+
+class Profile:
+    """The cost of executing a path through a program."""
+
+    def __init__(self, cost: int = 0, instructions: int = 0, reads: int = 0, writes: int = 0, inner_txns: int = 0):
+        self.cost = cost
+        self.instructions = instructions
+        self.reads = reads
+        self.writes = writes
+        self.inner_txns = inner_txns
+
+    @classmethod
+    def of(cls, instruction: Instruction) -> "Profile":
+        return cls(
+            cost=OPCODE_COSTS.get(instruction.op, 1),
+            instructions=1,
+            reads=int(instruction.op in STATE_READS),
+            writes=int(instruction.op in STATE_WRITES),
+            inner_txns=int(instruction.op == "itxn_submit"),
+        )
+
+    def __add__(self, other: "Profile") -> "Profile":
+        return Profile(
+            self.cost + other.cost,
+            self.instructions + other.instructions,
+            self.reads + other.reads,
+            self.writes + other.writes,
+            self.inner_txns + other.inner_txns,
+        )
+
+    def to_json(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+# TEAL parsing
+# =============================================================================================
+
+def strip_comment(line: str) -> str:
+    """ Remove a trailing `//` comment, leaving byte string literals alone."""
+    in_string = False
+    for index, character in enumerate(line):
+        if character == '"' and (index == 0 or line[index - 1] != "\\"):
+            in_string = not in_string
+        elif not in_string and line.startswith("//", index):
+            return line[:index]
+    return line
+
+def parse_teal(teal: str) -> Tuple[List[Instruction], Dict[str, int], Dict[str, str]]:
+    """Parse TEAL source code.
+
+    Returns:
+        The instructions, the index of the instruction following each label, and the names of the subroutine labels
+        taken from their comments (e.g. "sub0: // close_nft_to").
+    """
+    instructions: List[Instruction] = []
+    labels: Dict[str, int] = dict()
+    subroutine_names: Dict[str, str] = dict()
+
+    for raw_line in teal.splitlines():
+        line = strip_comment(raw_line).strip()
+        if not line or line.startswith("#pragma"):
+            continue
+        if line.endswith(":"):
+            label = line[:-1]
+            labels[label] = len(instructions)
+            if "//" in raw_line:
+                subroutine_names[label] = raw_line.split("//", 1)[1].strip()
+            continue
+        op, _, rest = line.partition(" ")
+        # byte string literals may contain spaces.
+        args = [rest.strip()] if rest.strip().startswith('"') else rest.split()
+        instructions.append(Instruction(op, args))
+
+    return instructions, labels, subroutine_names
+
+def program_size(instructions: List[Instruction]) -> int:
+    """ Estimate the assembled size of a program, with int and byte constants moved to intcblock and bytecblock."""
+    ints: Dict[int, int] = dict()
+    byte_strings: Dict[bytes, int] = dict()
+    size = 1  # version
+
+    for instruction in instructions:
+        if instruction.op == "int":
+            value = NAMED_INTS.get(instruction.args[0])
+            value = int(instruction.args[0], 0) if value is None else value
+            ints[value] = ints.get(value, 0) + 1
+        elif instruction.op == "byte":
+            literal = instruction.args[0]
+            if literal.startswith('"'):
+                value = literal[1:-1].encode()
+            elif literal.startswith("0x"):
+                value = bytes.fromhex(literal[2:])
+            else:
+                value = literal.encode()
+            byte_strings[value] = byte_strings.get(value, 0) + 1
+        else:
+            size += OPCODE_SIZES.get(instruction.op, 1)
+
+    def varint_size(value: int) -> int:
+        return max(1, (value.bit_length() + 6) // 7)
+
+    # constants are indexed by frequency; the 4 most used get a 1 byte reference, the others 2 bytes.
+    for constants, encoded_size in (
+        (ints, lambda value: varint_size(value)),
+        (byte_strings, lambda value: varint_size(len(value)) + len(value)),
+    ):
+        if not constants:
+            continue
+        size += 1 + varint_size(len(constants)) + sum(encoded_size(value) for value in constants)
+        for rank, uses in enumerate(sorted(constants.values(), reverse=True)):
+            size += uses * (1 if rank < 4 else 2)
+
+    return size
+
+# Control flow analysis
+# =============================================================================================
+
+class ProgramProfiler:
+    """Computes worst-case path profiles through the control flow of a TEAL program."""
+
+    def __init__(self, teal: str) -> None:
+        self.instructions, self.labels, self.subroutine_names = parse_teal(teal)
+        self.subroutines = {
+            instruction.args[0] for instruction in self.instructions if instruction.op == "callsub"
+        }
+        self.suffix_memo: Dict[int, Optional[Profile]] = dict()
+
+    def successors(self, index: int) -> List[int]:
+        instruction = self.instructions[index]
+        if instruction.op in TERMINATORS:
+            return []
+        if instruction.op == "b":
+            return [self.labels[instruction.args[0]]]
+        if instruction.op in ("bnz", "bz"):
+            return [self.labels[instruction.args[0]], index + 1]
+        return [index + 1]
+
+    def step(self, index: int) -> Profile:
+        """ The profile of a single instruction, including the whole subroutine for a callsub."""
+        instruction = self.instructions[index]
+        profile = Profile.of(instruction)
+        if instruction.op == "callsub":
+            profile = profile + (self.suffix(self.labels[instruction.args[0]]) or Profile())
+        return profile
+
+    def suffix(self, index: int) -> Optional[Profile]:
+        """The most expensive path from an instruction to a successful `return` (or `retsub`), None if every path fails.
+
+        Programs without loops form a DAG, so the memoised recursion terminates; a back edge is treated as failing.
+        """
+        if index in self.suffix_memo:
+            return self.suffix_memo[index]
+        self.suffix_memo[index] = None
+        if index >= len(self.instructions):
+            return None
+
+        instruction = self.instructions[index]
+        if instruction.op == "err":
+            return None
+
+        best: Optional[Profile] = Profile() if instruction.op in ("return", "retsub") else None
+        for successor in self.successors(index):
+            profile = self.suffix(successor)
+            if profile is not None and (best is None or profile.cost > best.cost):
+                best = profile
+
+        result = None if best is None else self.step(index) + best
+        self.suffix_memo[index] = result
+        return result
+
+    def prefix(self, target: int) -> Optional[Profile]:
+        """ The most expensive path from the start of the program to an instruction, None if it cannot be reached."""
+        best: Dict[int, Profile] = {0: Profile()}
+        # instructions only branch forwards, so a single pass in program order settles every index.
+        for index in range(len(self.instructions)):
+            if index == target:
+                return best.get(index)
+            if index not in best:
+                continue
+            profile = best[index] + self.step(index)
+            for successor in self.successors(index):
+                if successor <= index:
+                    continue
+                if successor not in best or profile.cost > best[successor].cost:
+                    best[successor] = profile
+        return best.get(target)
+
+    def branches(self) -> Dict[str, int]:
+        """The Cond branches of the program, as method name -> index of their first instruction.
+
+        The creation branch is recognised by `txn ApplicationID; int 0; ==` and method branches by
+        `txna ApplicationArgs 0; byte "<method>"; ==`.
+        """
+        branches: Dict[str, int] = dict()
+        for index, instruction in enumerate(self.instructions):
+            if instruction.op != "bnz" or index < 3:
+                continue
+            condition = [repr(previous) for previous in self.instructions[index - 3:index]]
+            if condition == ["txn ApplicationID", "int 0", "=="]:
+                branches["create"] = self.labels[instruction.args[0]]
+            elif condition[0] == "txna ApplicationArgs 0" and condition[1].startswith("byte \"") and condition[2] == "==":
+                branches[condition[1][len("byte \""):-1]] = self.labels[instruction.args[0]]
+        return branches
+
+    def profile(self) -> Dict[str, Profile]:
+        """ The worst-case profile of every method branch (dispatch included) and every subroutine (on its own)."""
+        profiles: Dict[str, Profile] = dict()
+        for name, index in self.branches().items():
+            prefix, suffix = self.prefix(index), self.suffix(index)
+            if prefix is not None and suffix is not None:
+                profiles[name] = prefix + suffix
+        for label in sorted(self.subroutines):
+            suffix = self.suffix(self.labels[label])
+            if suffix is not None:
+                profiles["subroutine " + self.subroutine_names.get(label, label)] = suffix
+        return profiles
+
+# Reporting
+# =============================================================================================
+
+def profile_program(program: Callable[[], Expr]) -> Dict[str, object]:
+    """Profile a PyTeal program builder.
+
+    Returns:
+        A JSON-able report with the program size and the profile of each branch.
+    """
+    teal = generate_teal(program)
+    profiler = ProgramProfiler(teal)
+
+    compiled = default_cache.get(teal, TEAL_VERSION)
+    size = len(compiled.program) if compiled is not None else program_size(profiler.instructions)
+
+    return {
+        "size": size,
+        "size_exact": compiled is not None,
+        "branches": {name: profile.to_json() for name, profile in profiler.profile().items()},
+    }
+
+def profile_programs() -> Dict[str, Dict[str, object]]:
+    return {
+        name: profile_program(program)
+        for name, program in known_programs().items()
+        if name != "clear_state_program"
+    }
+
+def print_report(report: Dict[str, Dict[str, object]]) -> None:
+    columns = ("cost", "instructions", "reads", "writes", "inner_txns")
+    for name, program in report.items():
+        exactness = "" if program["size_exact"] else " (estimated)"
+        print(f"{name}: {program['size']}/{MAX_PROGRAM_SIZE} bytes{exactness}")
+        print(f"    {'branch':<32}" + "".join(f"{column:>14}" for column in columns))
+        for branch, profile in program["branches"].items():
+            print(f"    {branch:<32}" + "".join(f"{profile[column]:>14}" for column in columns))
+            if profile["cost"] > COST_BUDGET:
+                print(f"    WARNING: {branch} exceeds the cost budget of {COST_BUDGET}")
+        print()
+
+def check_against_baseline(report: Dict[str, Dict[str, object]], baseline: Dict[str, Dict[str, object]]) -> List[str]:
+    """ The regressions of a report against a baseline: any branch costing more, or a bigger program."""
+    regressions = []
+    for name, program in report.items():
+        if name not in baseline:
+            continue
+        # an exact size is only comparable to an exact size, and an estimate to an estimate.
+        same_kind = program["size_exact"] == baseline[name].get("size_exact", False)
+        if same_kind and program["size"] > baseline[name]["size"]:
+            regressions.append(f"{name}: size grew from {baseline[name]['size']} to {program['size']} bytes")
+        for branch, profile in program["branches"].items():
+            previous = baseline[name]["branches"].get(branch)
+            if previous is not None and profile["cost"] > previous["cost"]:
+                regressions.append(f"{name} {branch}: cost grew from {previous['cost']} to {profile['cost']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Static opcode cost and program size profiler for the contracts.")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--check", action="store_true", help="fail if a branch costs more than in the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="store the report as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="the baseline file")
+    arguments = parser.parse_args()
+
+    report = profile_programs()
+    if arguments.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if arguments.update_baseline:
+        with open(arguments.baseline, "w") as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+            file.write("\n")
+        print(f"Baseline written to {arguments.baseline}")
+
+    if arguments.check:
+        if not os.path.exists(arguments.baseline):
+            sys.exit(f"No baseline at {arguments.baseline}, run with --update-baseline first.")
+        with open(arguments.baseline) as file:
+            regressions = check_against_baseline(report, json.load(file))
+        for regression in regressions:
+            print("REGRESSION: " + regression)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,216 @@
+# Python imports
+import os
+import time
+import argparse
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# Algorand library imports.
+from algosdk.v2client.algod import AlgodClient
+from algosdk.future import transaction
+from algosdk import encoding
+from nacl.signing import SigningKey
+
+# Import the shared confirmation tracker and suggested params provider.
+from tracker import ConfirmationTracker
+from params import SuggestedParamsProvider
+
+# Import the keyring and keystore files.
+from accounts import KEY_LENGTH, Keyring, get_keyring, open_keystore, write_records
+
+# Import the atomic group size limit.
+from operations import MAX_GROUP_SIZE
+
+# Import utility classes and functions.
+from utils import Account, get_client, get_suggested_params, sign_and_send
+
+# Mass provisioning of test accounts, for load tests with realistic buyer and seller populations. Keys are generated in
+# chunks by a pool of processes (one per CPU core by default) and streamed to a keystore file as the chunks come back,
+# then the accounts are funded by a dispenser account with groups of 16 payments, many groups in flight at once.
+#
+#   python provision.py 10000 --keystore keystore.bin --fund 1000000 --dispenser creator
+#
+# Accounts are named <prefix><number>. Running again with a larger count only generates the missing ones; funding goes
+# by balance, not by keystore, so accounts holding less than the funding amount (new ones, or ones whose funding failed
+# in an earlier run) are funded and the others are left alone.
+
+DEFAULT_KEYSTORE = os.environ.get("ESCROW_KEYSTORE", "keystore.bin")
+CHUNK_SIZE = 500
+
+# Generating accounts
+# =============================================================================================
+
+def _generate_keys(count: int) -> bytes:
+    """ Generate `count` raw 64 byte secret keys (seed followed by public key), in a worker process."""
+    keys = bytearray()
+    for _ in range(count):
+        signing_key = SigningKey.generate()
+        keys += bytes(signing_key) + bytes(signing_key.verify_key)
+    return bytes(keys)
+
+def generate_accounts(
+    keystore_path: str,
+    count: int,
+    prefix: str = "account-",
+    start: int = 0,
+    processes: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> List[str]:
+    """Generate accounts in parallel and append them to a keystore file as they are generated.
+
+    Args:
+        keystore_path: The keystore file, created if it does not exist.
+        count: The number of accounts to generate.
+        prefix: The prefix of the account names.
+        start: The number of the first account name.
+        processes: The number of worker processes, the number of CPU cores if not given.
+        chunk_size: The number of accounts generated by a worker at a time.
+
+    Returns:
+        The addresses of the generated accounts, in name order.
+    """
+    chunks = [min(chunk_size, count - offset) for offset in range(0, count, chunk_size)]
+    addresses: List[str] = []
+
+    with open_keystore(keystore_path) as keystore, Pool(processes) as pool:
+        # the chunks come back in order, so names follow the order the accounts are written in.
+        for keys in pool.imap(_generate_keys, chunks):
+            records = [
+                (f"{prefix}{start + len(addresses) + index}", keys[offset:offset + KEY_LENGTH])
+                for index, offset in enumerate(range(0, len(keys), KEY_LENGTH))
+            ]
+            write_records(keystore, records)
+            keystore.flush()
+            addresses.extend(encoding.encode_address(raw_key[32:]) for _, raw_key in records)
+
+    return addresses
+
+# Funding accounts
+# =============================================================================================
+
+def fund_accounts(
+    client: AlgodClient,
+    dispenser: Account,
+    addresses: Sequence[str],
+    amount: int,
+    max_in_flight: int = 64,
+    timeout: int = 10,
+    tracker: Optional[ConfirmationTracker] = None,
+    params: Optional[SuggestedParamsProvider] = None,
+) -> int:
+    """Fund many accounts from a dispenser account, with atomic groups of up to 16 payments.
+
+    Args:
+        client: An algod client.
+        dispenser: The account paying for the funding (and the fees).
+        addresses: The addresses of the accounts to fund.
+        amount: The amount to send to every account, in microAlgos.
+        max_in_flight: The maximum number of groups waiting for confirmation at once.
+        timeout: The number of rounds to wait for a group to be confirmed.
+        tracker: A confirmation tracker to wait on, a new one if not given.
+        params: A suggested params provider to build the transactions with, if any.
+
+    Returns:
+        The number of accounts funded.
+    """
+    tracker = ConfirmationTracker(client, timeout) if tracker is None else tracker
+    batches: Iterator[Sequence[str]] = (
+        addresses[start:start + MAX_GROUP_SIZE] for start in range(0, len(addresses), MAX_GROUP_SIZE)
+    )
+    # groups in the pool, as the future of the group's last transaction -> number of accounts funded by the group.
+    in_flight: Dict[Future, int] = dict()
+    exhausted = False
+    funded = 0
+
+    while not exhausted or in_flight:
+        if not exhausted and len(in_flight) < max_in_flight:
+            suggested_params = get_suggested_params(client, params)
+
+        while not exhausted and len(in_flight) < max_in_flight:
+            batch = next(batches, None)
+            if batch is None:
+                exhausted = True
+                break
+
+            txns = [
+                transaction.PaymentTxn(
+                    sender=dispenser.getAddress(),
+                    receiver=address,
+                    amt=amount,
+                    sp=suggested_params,
+                )
+                for address in batch
+            ]
+            if len(txns) > 1:
+                transaction.assign_group_id(txns)
+            signed_txns = sign_and_send(client, txns, dispenser)
+            futures = tracker.register_group([signed.get_txid() for signed in signed_txns], timeout=timeout)
+            in_flight[futures[-1]] = len(batch)
+
+        for done in tracker.wait_any(in_flight):
+            funded += in_flight.pop(done)
+            done.result()
+
+    return funded
+
+def unfunded_accounts(client: AlgodClient, addresses: Sequence[str], amount: int, max_workers: int = 16) -> List[str]:
+    """ The addresses holding less than `amount` microAlgos, in order, with their balances looked up concurrently."""
+    with ThreadPoolExecutor(max_workers) as executor:
+        balances = list(executor.map(lambda address: client.account_info(address)["amount"], addresses))
+    return [address for address, balance in zip(addresses, balances) if balance < amount]
+
+# Provisioning command
+# =============================================================================================
+
+def existing_accounts(keystore_path: str, prefix: str) -> int:
+    """ The number of accounts named <prefix><number> already in a keystore file."""
+    if not os.path.exists(keystore_path):
+        return 0
+    return sum(1 for name in Keyring.from_file(keystore_path) if name.startswith(prefix))
+
+def keystore_addresses(keystore_path: str, prefix: str, count: int) -> List[str]:
+    """ The addresses of the accounts named <prefix>0 to <prefix><count - 1> in a keystore file, in name order."""
+    raw_keys = dict(Keyring.from_file(keystore_path).items())
+    return [encoding.encode_address(raw_keys[f"{prefix}{number}"][32:]) for number in range(count)]
+
+def rate(count: int, seconds: float) -> str:
+    return f"{count} accounts in {seconds:.2f}s ({count / seconds if seconds > 0 else 0:.0f} accounts/s)"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and fund many test accounts.")
+    parser.add_argument("count", type=int, help="the number of accounts the keystore should hold")
+    parser.add_argument("--keystore", default=DEFAULT_KEYSTORE, help="the keystore file")
+    parser.add_argument("--prefix", default="account-", help="the prefix of the account names")
+    parser.add_argument("--processes", type=int, default=None, help="the number of generating processes")
+    parser.add_argument("--fund", type=int, default=0, help="the amount to fund each account holding less with, in microAlgos")
+    parser.add_argument("--dispenser", default="creator", help="the keyring name of the funding account")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="the maximum number of funding groups in flight")
+    arguments = parser.parse_args()
+
+    start = existing_accounts(arguments.keystore, arguments.prefix)
+    missing = max(arguments.count - start, 0)
+    if missing == 0:
+        print(f"{arguments.keystore} already holds {start} accounts named {arguments.prefix}<number>.")
+    else:
+        started = time.perf_counter()
+        generated = generate_accounts(arguments.keystore, missing, arguments.prefix, start, arguments.processes)
+        print(f"Generated {rate(len(generated), time.perf_counter() - started)}, written to {arguments.keystore}")
+
+    if arguments.fund > 0:
+        client = get_client()
+        dispenser = get_keyring()[arguments.dispenser]
+        provider = SuggestedParamsProvider(client)
+        tracker = ConfirmationTracker(client)
+        provider.attach(tracker)
+
+        # every account up to the count is checked, including those of earlier runs whose funding failed.
+        addresses = unfunded_accounts(
+            client, keystore_addresses(arguments.keystore, arguments.prefix, arguments.count), arguments.fund
+        )
+        started = time.perf_counter()
+        funded = fund_accounts(
+            client, dispenser, addresses, arguments.fund, arguments.max_in_flight, tracker=tracker, params=provider
+        )
+        print(f"Funded {rate(funded, time.perf_counter() - started)} with {arguments.fund} microAlgos each")
@@ -0,0 +1,255 @@
+# Python imports
+import copy
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+# Algorand library imports.
+from algosdk.v2client.algod import AlgodClient
+from algosdk.future import transaction
+from algosdk.future.transaction import SignedTransaction
+
+# Import the shared confirmation tracker and suggested params provider.
+from tracker import ConfirmationTracker, TransactionExpired
+from params import SuggestedParamsProvider
+
+# Import the instrumentation counters.
+from instrumentation import count
+
+# Import utility classes and functions.
+from utils import Account, Pending_txn_response, get_suggested_params, sign_txns
+
+# A submission scheduler sitting between the operations and the node. Transactions (single ones or groups) are given
+# unsigned along with their signer, so the scheduler can:
+#
+# - bound the number of groups in flight, per sender and for the whole node, blocking `submit` until a slot frees up;
+# - back off when the node rejects a submission because its pool is full, holding every submission for that long;
+# - re-sign a group with a fresh validity window (and optionally a higher fee) when it expires unconfirmed;
+# - deduplicate submissions by the ID of their first transaction as submitted, handing out the future of the group
+#   still in flight, however many times it was re-signed.
+#
+#   scheduler = SubmissionScheduler(client, tracker, params)
+#   result = scheduler.submit(txns, signer).result()
+#
+# The future of a submission resolves to the signed transactions that finally made it (their IDs change when they are
+# re-signed) and their confirmed responses, or to the error that stopped it.
+
+# the errors of a busy node: the submission is retried as is after a pause.
+BUSY_ERRORS = ("transaction pool is full", "too many requests")
+BUSY_STATUS_CODES = (429, 503)
+
+# Useful Classes
+# =============================================================================================
+
+class SubmissionResult(NamedTuple):
+    """The signed transactions of a confirmed submission, and their responses."""
+
+    signed_txns: List[SignedTransaction]
+    responses: List[Pending_txn_response]
+
+class _Submission:
+    """A group of transactions going through the scheduler."""
+
+    def __init__(self, txns: List[transaction.Transaction], signer: Account, key: str) -> None:
+        # a copy, as re-signing changes the transactions: the caller's keep signing to `key`, so a retry is a duplicate.
+        self.txns = copy.deepcopy(txns)
+        self.signer = signer
+        self.key = key
+        self.attempts = 1
+        self.future: Future = Future()
+
+def is_busy(error: Exception) -> bool:
+    """ Whether a submission error means the node is busy, rather than the transactions being invalid."""
+    message = str(error).lower()
+    return getattr(error, "code", None) in BUSY_STATUS_CODES or any(busy in message for busy in BUSY_ERRORS)
+
+class SubmissionScheduler:
+    """Submits groups of transactions with in-flight limits, backpressure, resubmission and deduplication.
+
+    Args:
+        client: An algod client.
+        tracker: A confirmation tracker to wait on, a new one if not given.
+        params: A suggested params provider to re-sign expired transactions with, if any.
+        max_in_flight: The maximum number of groups waiting for confirmation at once.
+        max_in_flight_per_sender: The maximum number of groups of a single signer waiting for confirmation at once.
+        max_attempts: The number of times a group is signed with a fresh validity window before giving up.
+        fee_increment: The fee added to each transaction (in microAlgos) every time a group is re-signed.
+        backoff: The first pause after the node rejected a submission as busy, in seconds. It doubles every time.
+        max_backoff: The longest pause, in seconds.
+    """
+
+    def __init__(
+        self,
+        client: AlgodClient,
+        tracker: Optional[ConfirmationTracker] = None,
+        params: Optional[SuggestedParamsProvider] = None,
+        max_in_flight: int = 256,
+        max_in_flight_per_sender: int = 16,
+        max_attempts: int = 3,
+        fee_increment: int = 0,
+        backoff: float = 0.1,
+        max_backoff: float = 5.0,
+    ) -> None:
+        self.client = client
+        # the futures handed out are only resolved as the tracker polls, so it polls in the background.
+        self.tracker = (ConfirmationTracker(client) if tracker is None else tracker).start()
+        self.params = params
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_sender = max_in_flight_per_sender
+        self.max_attempts = max_attempts
+        self.fee_increment = fee_increment
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.in_flight = 0
+        self.in_flight_by_sender: Dict[str, int] = dict()
+        # the submissions in flight, by the ID of their first transaction as first submitted.
+        self.submissions: Dict[str, _Submission] = dict()
+        self.paused_until = 0.0
+        self.pause = backoff
+        self.condition = threading.Condition()
+
+        # expired groups are re-signed and sent from here, rather than from the thread polling the tracker.
+        self.executor = ThreadPoolExecutor(4, thread_name_prefix="resubmit")
+
+    def submit(self, txns: List[transaction.Transaction], signer: Account) -> Future:
+        """Sign and send a group of transactions (or a single one), once there is room for it.
+
+        Blocks while the sender, or the node, has as many groups in flight as allowed.
+
+        Args:
+            txns: The transactions, grouped already if there are several.
+            signer: The account signing every transaction of the group.
+
+        Returns:
+            A future resolving to the SubmissionResult of the group.
+        """
+        signed_txns = sign_txns(txns, signer)
+        key = signed_txns[0].get_txid()
+        sender = signer.getAddress()
+
+        with self.condition:
+            existing = self.submissions.get(key)
+            if existing is not None:
+                count("scheduler_duplicates")
+                return existing.future
+
+            while (
+                self.in_flight >= self.max_in_flight
+                or self.in_flight_by_sender.get(sender, 0) >= self.max_in_flight_per_sender
+            ):
+                self.condition.wait()
+
+            submission = _Submission(txns, signer, key)
+            self.submissions[key] = submission
+            self.in_flight += 1
+            self.in_flight_by_sender[sender] = self.in_flight_by_sender.get(sender, 0) + 1
+
+        self._send(submission, signed_txns)
+        return submission.future
+
+    def _send(self, submission: _Submission, signed_txns: List[SignedTransaction]) -> None:
+        last_valid = min(signed_txn.transaction.last_valid_round for signed_txn in signed_txns)
+
+        while True:
+            self._wait_for_pause()
+            try:
+                self.client.send_transactions(signed_txns)
+            except Exception as error:
+                if "already in ledger" in str(error):
+                    # sent before (e.g. a retry after a lost response): follow it like any other.
+                    break
+                if "txn dead" in str(error):
+                    # the validity window passed before the node took it.
+                    return self._resubmit(submission)
+                if not is_busy(error):
+                    return self._finish(submission, error=error)
+                if self.tracker.current_round() >= last_valid:
+                    return self._resubmit(submission)
+                count("scheduler_busy")
+                self._back_off()
+                continue
+            self._sent()
+            break
+
+        futures = self.tracker.track(signed_txns)
+        futures[-1].add_done_callback(lambda _: self._on_done(submission, signed_txns, futures))
+
+    def _on_done(self, submission: _Submission, signed_txns: List[SignedTransaction], futures: List[Future]) -> None:
+        error = futures[-1].exception()
+        if error is None:
+            self._finish(submission, result=SubmissionResult(signed_txns, [future.result() for future in futures]))
+        elif isinstance(error, TransactionExpired):
+            self.executor.submit(self._resubmit, submission)
+        else:
+            self._finish(submission, error=error)
+
+    def _resubmit(self, submission: _Submission) -> None:
+        """ Re-sign an expired group with a fresh validity window (and a higher fee, if configured), and send it."""
+        if submission.attempts >= self.max_attempts:
+            return self._finish(
+                submission, error=TransactionExpired(f"Transaction {submission.key} expired {submission.attempts} times")
+            )
+        submission.attempts += 1
+        count("scheduler_resubmissions")
+
+        try:
+            suggested_params = get_suggested_params(self.client, self.params)
+            for txn in submission.txns:
+                txn.first_valid_round = suggested_params.first
+                txn.last_valid_round = suggested_params.last
+                txn.fee += self.fee_increment
+                txn.group = None
+            if len(submission.txns) > 1:
+                transaction.assign_group_id(submission.txns)
+            signed_txns = sign_txns(submission.txns, submission.signer)
+            self._send(submission, signed_txns)
+        except Exception as error:
+            self._finish(submission, error=error)
+
+    # Backpressure
+    # =============================================================================================
+
+    def _wait_for_pause(self) -> None:
+        while True:
+            with self.condition:
+                remaining = self.paused_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def _back_off(self) -> None:
+        """ Hold every submission for a while, doubling the pause every time the node is still busy."""
+        with self.condition:
+            now = time.monotonic()
+            if self.paused_until <= now:
+                self.paused_until = now + self.pause
+                self.pause = min(self.pause * 2, self.max_backoff)
+
+    def _sent(self) -> None:
+        with self.condition:
+            if self.paused_until <= time.monotonic():
+                self.pause = self.backoff
+
+    def _finish(
+        self, submission: _Submission, result: Optional[SubmissionResult] = None, error: Optional[Exception] = None
+    ) -> None:
+        with self.condition:
+            if self.submissions.pop(submission.key, None) is None:
+                return
+            sender = submission.signer.getAddress()
+            self.in_flight -= 1
+            self.in_flight_by_sender[sender] -= 1
+            if self.in_flight_by_sender[sender] == 0:
+                del self.in_flight_by_sender[sender]
+            self.condition.notify_all()
+
+        if error is not None:
+            submission.future.set_exception(error)
+        else:
+            submission.future.set_result(result)
+
+    def close(self) -> None:
+        """ Stop resubmitting; the tracker keeps polling until stopped by its owner."""
+        self.executor.shutdown(wait=True)
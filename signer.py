@@ -0,0 +1,198 @@
+# Python imports
+import time
+import base64
+import argparse
+from multiprocessing import Pool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Algorand library imports.
+from nacl.signing import SigningKey
+from algosdk import constants, encoding
+from algosdk.v2client.algod import AlgodClient
+from algosdk.future.transaction import SignedTransaction, Transaction
+
+# Import the instrumentation counters.
+from instrumentation import count
+
+# Import utility classes and functions.
+from utils import Account, signing_key
+
+# Batch signing of many transactions over a pool of processes (one per CPU core by default), for the thousands of
+# deposit and buy groups of a settlement window. The transactions are encoded once in the calling process, the
+# messages are signed by the workers in chunks (each worker decoding the signing key of an account once), and the
+# signatures come back in input order:
+#
+#   with SigningEngine() as engine:
+#       blobs = engine.sign([(txn, account), ...])                # msgpack signed transactions, in input order
+#       send_blobs(client, blobs[start:end])                      # a group, as `send_transactions` would send it
+#       engine.throughput()                                       # signatures per second
+#
+# Batches smaller than `inline_below` are signed in the calling process, where shipping them to the workers would cost
+# more than signing them. The signing keys of the calling process are shared with `sign_txns` and the templates.
+
+CHUNK_SIZE = 512
+INLINE_BELOW = 64
+
+# the signed transaction map around the signature and transaction: {"sgnr": ..., "sig": ..., "txn": ...}.
+AUTHORIZER = b"\xa4sgnr\xc4\x20"
+SIGNATURE = b"\xa3sig\xc4\x40"
+TXN = b"\xa3txn"
+
+# Signing in the worker processes
+# =============================================================================================
+
+# the signing keys of a worker process, by seed.
+_worker_keys: Dict[bytes, SigningKey] = dict()
+
+def _sign_chunk(chunk: Tuple[List[bytes], List[Tuple[int, bytes]]]) -> bytes:
+    """ The signatures of a chunk of (seed index, message), concatenated, in a worker process."""
+    seeds, messages = chunk
+    keys = []
+    for seed in seeds:
+        key = _worker_keys.get(seed)
+        if key is None:
+            key = _worker_keys[seed] = SigningKey(seed)
+        keys.append(key)
+    return b"".join(keys[index].sign(message).signature for index, message in messages)
+
+# Useful Classes
+# =============================================================================================
+
+class SigningEngine:
+    """Signs batches of transactions by many accounts over a pool of processes.
+
+    Args:
+        processes: The number of worker processes, the number of CPU cores if not given, none to sign in the calling
+            process only.
+        chunk_size: The number of transactions signed by a worker at a time.
+        inline_below: The number of transactions under which a batch is signed in the calling process.
+    """
+
+    def __init__(
+        self, processes: Optional[int] = None, chunk_size: int = CHUNK_SIZE, inline_below: int = INLINE_BELOW
+    ) -> None:
+        self.pool = None if processes == 0 else Pool(processes)
+        self.chunk_size = chunk_size
+        self.inline_below = inline_below
+        self.signatures = 0
+        self.seconds = 0.0
+
+    def __enter__(self) -> "SigningEngine":
+        return self
+
+    def __exit__(self, *exception: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def throughput(self) -> float:
+        """ The signatures per second of every batch signed so far."""
+        return self.signatures / self.seconds if self.seconds else 0.0
+
+    def _sign(self, messages: List[bytes], signers: List[Account]) -> List[bytes]:
+        """ The signatures of messages, in order."""
+        if self.pool is None or len(messages) < self.inline_below:
+            return [signing_key(signer).sign(message).signature for message, signer in zip(messages, signers)]
+
+        chunks = []
+        for start in range(0, len(messages), self.chunk_size):
+            # every chunk carries the seeds of its signers once, the messages refer to them by index.
+            indexes: Dict[str, int] = dict()
+            seeds: List[bytes] = []
+            chunk_messages: List[Tuple[int, bytes]] = []
+            for message, signer in zip(messages[start:start + self.chunk_size], signers[start:start + self.chunk_size]):
+                index = indexes.get(signer.getAddress())
+                if index is None:
+                    index = indexes[signer.getAddress()] = len(seeds)
+                    seeds.append(bytes(signing_key(signer)))
+                chunk_messages.append((index, message))
+            chunks.append((seeds, chunk_messages))
+
+        signatures = b"".join(self.pool.map(_sign_chunk, chunks))
+        return [signatures[offset:offset + 64] for offset in range(0, len(signatures), 64)]
+
+    def _signed(self, batch: Sequence[Tuple[Transaction, Account]]) -> Tuple[List[bytes], List[bytes]]:
+        """ The encoded transactions of a batch and their signatures, timed and counted."""
+        started = time.perf_counter()
+        encoded = [base64.b64decode(encoding.msgpack_encode(txn)) for txn, _ in batch]
+        signatures = self._sign([constants.txid_prefix + txn for txn in encoded], [signer for _, signer in batch])
+        self.seconds += time.perf_counter() - started
+        self.signatures += len(batch)
+        count("signatures", len(batch))
+        return encoded, signatures
+
+    def sign(self, batch: Sequence[Tuple[Transaction, Account]]) -> List[bytes]:
+        """Sign a batch of transactions, each by its account.
+
+        Args:
+            batch: The transactions (grouped already) and the account signing each of them.
+
+        Returns:
+            The msgpack encoded signed transactions, in the order of the batch.
+        """
+        encoded, signatures = self._signed(batch)
+        blobs = []
+        for (txn, signer), body, signature in zip(batch, encoded, signatures):
+            if txn.sender == signer.getAddress():
+                blobs.append(b"\x82" + SIGNATURE + signature + TXN + body)
+            else:
+                # a rekeyed sender is signed for by another account.
+                authorizer = AUTHORIZER + encoding.decode_address(signer.getAddress())
+                blobs.append(b"\x83" + authorizer + SIGNATURE + signature + TXN + body)
+        return blobs
+
+    def sign_txns(self, batch: Sequence[Tuple[Transaction, Account]]) -> List[SignedTransaction]:
+        """ Sign a batch of transactions, each by its account, as SignedTransactions for `send_transactions`."""
+        _, signatures = self._signed(batch)
+        return [
+            SignedTransaction(
+                txn,
+                base64.b64encode(signature).decode(),
+                None if txn.sender == signer.getAddress() else signer.getAddress(),
+            )
+            for (txn, signer), signature in zip(batch, signatures)
+        ]
+
+def send_blobs(client: AlgodClient, blobs: Sequence[bytes]) -> str:
+    """ Send signed transactions (a single one, or a group) signed by the engine, returning the ID of the first one."""
+    return client.send_raw_transaction(base64.b64encode(b"".join(blobs)))
+
+
+if __name__ == "__main__":
+    from algosdk import account
+    from algosdk.future import transaction
+
+    parser = argparse.ArgumentParser(description="Compare batch signing with signing transactions one at a time.")
+    parser.add_argument("--transactions", type=int, default=20000, help="the number of transactions to sign")
+    parser.add_argument("--accounts", type=int, default=100, help="the number of accounts signing them")
+    parser.add_argument("--processes", type=int, default=None, help="the number of worker processes")
+    arguments = parser.parse_args()
+
+    suggested_params = transaction.SuggestedParams(
+        0, 20_000_000, 20_001_000, "SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=", "testnet-v1.0", False, None, 1000
+    )
+    accounts = [Account(account.generate_account()[0]) for _ in range(arguments.accounts)]
+    batch = [
+        (
+            transaction.PaymentTxn(
+                accounts[index % len(accounts)].getAddress(), suggested_params,
+                accounts[(index + 1) % len(accounts)].getAddress(), 1_000 + index,
+            ),
+            accounts[index % len(accounts)],
+        )
+        for index in range(arguments.transactions)
+    ]
+
+    started = time.perf_counter()
+    expected = [base64.b64decode(encoding.msgpack_encode(txn.sign(signer.getPrivateKey()))) for txn, signer in batch]
+    serial = len(batch) / (time.perf_counter() - started)
+
+    with SigningEngine(arguments.processes) as engine:
+        blobs = engine.sign(batch)
+        assert blobs == expected, "signed transactions differ from the SDK"
+        print(f"txn.sign one at a time: {serial:,.0f} signatures/s")
+        print(f"signing engine:         {engine.throughput():,.0f} signatures/s")
@@ -0,0 +1,756 @@
+# Python imports
+import threading
+from base64 import b64decode, b64encode
+from typing import Any, Dict, List, Optional, Tuple
+
+# Algorand library imports.
+import msgpack
+from algosdk import encoding
+from algosdk.error import AlgodHTTPError
+from algosdk.future.transaction import SignedTransaction, SuggestedParams
+from algosdk.logic import get_application_address
+from algosdk.v2client.algod import AlgodClient
+
+# Import the stub algod ledger, extended here, and its encoding helpers.
+from stub_algod import GENESIS_HASH, GENESIS_ID, StubLedger, encode_delta, encode_state, encode_txn
+
+# An in-process simulated ledger, for running the operations quickly and without a sandbox. Unlike the stub ledger, which
+# accepts any transaction as it is, the simulator models rounds, Algo balances (with fees and minimum balances), ASA
+# holdings, and apps with their global state, and executes the escrow and multi-listing contracts, inner transactions
+# included. Groups are evaluated atomically when they are sent, against the state including the transactions already in
+# the pool, and rejected at once the way algod does; they are evaluated again, in the same order, when the next block
+# is produced.
+#
+# The contracts are not interpreted from TEAL: the methods of each contract (told apart by their TEAL source) are
+# mirrored in Python below and must be kept in step with contract.py. Signatures are not verified.
+#
+# `SimulatedAlgod` is a drop-in replacement for AlgodClient in the same process; `StubAlgodServer(SimulatedLedger())`
+# serves the same simulation over HTTP.
+
+MIN_BALANCE = 100_000
+ASSET_MIN_BALANCE = 100_000
+APP_MIN_BALANCE = 100_000
+SCHEMA_UINT_MIN_BALANCE = 25_000 + 3_500
+SCHEMA_BYTES_MIN_BALANCE = 25_000 + 25_000
+MIN_FEE = 1_000
+MAX_GROUP_SIZE = 16
+
+_MISSING = object()
+
+class Rejected(Exception):
+    """A transaction group rejected by the simulated ledger."""
+
+# Ledger state
+# =============================================================================================
+
+class LedgerState:
+    """Balances, holdings, assets and apps, with a journal to roll back a group that fails part way.
+
+    Args:
+        default_balance: The balance of accounts never seen before, to skip funding every test account.
+    """
+
+    def __init__(self, default_balance: int = 0) -> None:
+        self.default_balance = default_balance
+        self.balances: Dict[str, int] = dict()
+        # extra minimum balance of each account, for its asset holdings and created apps.
+        self.min_balances: Dict[str, int] = dict()
+        self.holdings: Dict[str, Dict[int, int]] = dict()
+        self.assets: Dict[int, Dict[str, Any]] = dict()
+        self.apps: Dict[int, Dict[str, Any]] = dict()
+        self.counters: Dict[str, int] = {"next_index": 1000}
+        self.journal: List[Tuple[Dict[Any, Any], Any, Any]] = []
+
+    def copy(self) -> "LedgerState":
+        state = LedgerState(self.default_balance)
+        state.balances = dict(self.balances)
+        state.min_balances = dict(self.min_balances)
+        state.holdings = {address: dict(holding) for address, holding in self.holdings.items()}
+        state.assets = dict(self.assets)
+        state.apps = {app_ID: dict(app, state=dict(app["state"])) for app_ID, app in self.apps.items()}
+        state.counters = dict(self.counters)
+        return state
+
+    # Journaled writes
+    # =============================================================================================
+
+    def set(self, container: Dict[Any, Any], key: Any, value: Any) -> None:
+        self.journal.append((container, key, container.get(key, _MISSING)))
+        container[key] = value
+
+    def delete(self, container: Dict[Any, Any], key: Any) -> None:
+        self.journal.append((container, key, container.get(key, _MISSING)))
+        container.pop(key, None)
+
+    def rollback(self) -> None:
+        for container, key, previous in reversed(self.journal):
+            if previous is _MISSING:
+                container.pop(key, None)
+            else:
+                container[key] = previous
+        self.journal.clear()
+
+    def commit(self) -> None:
+        self.journal.clear()
+
+    def allocate_index(self) -> int:
+        index = self.counters["next_index"] + 1
+        self.set(self.counters, "next_index", index)
+        return index
+
+    # Accounts
+    # =============================================================================================
+
+    def balance(self, address: str) -> int:
+        return self.balances.get(address, self.default_balance)
+
+    def min_balance(self, address: str) -> int:
+        return MIN_BALANCE + self.min_balances.get(address, 0)
+
+    def add_min_balance(self, address: str, amount: int) -> None:
+        self.set(self.min_balances, address, self.min_balances.get(address, 0) + amount)
+
+    def transfer(self, sender: str, receiver: Optional[str], amount: int, fee: int = 0) -> None:
+        balance = self.balance(sender)
+        if balance < amount + fee:
+            raise Rejected(f"overspend: account {sender} balance {balance} below {amount + fee}")
+        self.set(self.balances, sender, balance - amount - fee)
+        if receiver is not None and amount > 0:
+            self.set(self.balances, receiver, self.balance(receiver) + amount)
+
+    def check_min_balance(self, address: str) -> None:
+        balance = self.balance(address)
+        # an empty account, e.g. one closed out, has no minimum balance.
+        if balance == 0 and not self.min_balances.get(address) and not self.holdings.get(address):
+            return
+        if balance < self.min_balance(address):
+            raise Rejected(f"account {address} balance {balance} below min {self.min_balance(address)}")
+
+    def holding(self, address: str, asset_ID: int) -> Optional[int]:
+        return self.holdings.get(address, {}).get(asset_ID)
+
+    def set_holding(self, address: str, asset_ID: int, amount: int) -> None:
+        holdings = self.holdings.get(address)
+        if holdings is None:
+            holdings = dict()
+            self.set(self.holdings, address, holdings)
+        if asset_ID not in holdings:
+            self.add_min_balance(address, ASSET_MIN_BALANCE)
+        self.set(holdings, asset_ID, amount)
+
+    def remove_holding(self, address: str, asset_ID: int) -> None:
+        self.delete(self.holdings[address], asset_ID)
+        self.add_min_balance(address, -ASSET_MIN_BALANCE)
+
+    def transfer_asset(
+        self, sender: str, receiver: str, asset_ID: int, amount: int, close_to: Optional[str] = None
+    ) -> None:
+        if asset_ID not in self.assets:
+            raise Rejected(f"asset {asset_ID} does not exist")
+
+        # a zero amount transfer to oneself is an opt-in.
+        if sender == receiver and amount == 0 and close_to is None:
+            if self.holding(sender, asset_ID) is None:
+                self.set_holding(sender, asset_ID, 0)
+            return
+
+        held = self.holding(sender, asset_ID)
+        if held is None:
+            raise Rejected(f"asset {asset_ID} missing from {sender}")
+        if held < amount:
+            raise Rejected(f"underflow on asset {asset_ID}: {sender} holds {held}, sending {amount}")
+        for address in (receiver,) if close_to is None else (receiver, close_to):
+            if self.holding(address, asset_ID) is None:
+                raise Rejected(f"asset {asset_ID} missing from {address}")
+
+        self.set(self.holdings[sender], asset_ID, held - amount)
+        self.set(self.holdings[receiver], asset_ID, self.holding(receiver, asset_ID) + amount)
+        if close_to is not None:
+            self.set(self.holdings[close_to], asset_ID, self.holding(close_to, asset_ID) + held - amount)
+            self.remove_holding(sender, asset_ID)
+
+    # Apps
+    # =============================================================================================
+
+    def global_put(self, app_ID: int, key: bytes, value: Any, delta: Dict[bytes, Any]) -> None:
+        app = self.apps[app_ID]
+        state = app["state"]
+        if key not in state or type(state[key]) != type(value):
+            # a new key (or a key changing type) must fit in the schema of the app.
+            uints, byte_slices = app["schema"]
+            others = [old for old_key, old in state.items() if old_key != key]
+            if isinstance(value, int) and sum(isinstance(old, int) for old in others) + 1 > uints:
+                raise Rejected(f"store integer count exceeds schema integer count {uints}")
+            if isinstance(value, bytes) and sum(isinstance(old, bytes) for old in others) + 1 > byte_slices:
+                raise Rejected(f"store bytes count exceeds schema bytes count {byte_slices}")
+        self.set(state, key, value)
+        delta[key] = value
+
+    def global_del(self, app_ID: int, key: bytes, delta: Dict[bytes, Any]) -> None:
+        self.delete(self.apps[app_ID]["state"], key)
+        delta[key] = None
+
+# Simulated ledger
+# =============================================================================================
+
+class SimulatedLedger(StubLedger):
+    """A stub ledger evaluating transactions against simulated balances, holdings and contracts.
+
+    Args:
+        block_time: The block time in seconds, 0 to produce blocks on demand when a client waits for one.
+        start_round: The round the ledger starts at.
+        default_balance: The balance of accounts never seen before, in microAlgos.
+        pool_size: The number of transactions the pool holds before rejecting new ones, unlimited if not given.
+    """
+
+    def __init__(
+        self, block_time: float = 0, start_round: int = 1, default_balance: int = 0, pool_size: Optional[int] = None
+    ) -> None:
+        self.pool_size = pool_size
+        # the confirmed state, and the state including the transactions in the pool.
+        self.state = LedgerState(default_balance)
+        self.pool_state = LedgerState(default_balance)
+        self.pending_groups: List[Tuple[List[str], List[SignedTransaction]]] = []
+        # the transactions confirmed in each round, with their IDs.
+        self.blocks: Dict[int, List[Tuple[str, SignedTransaction]]] = dict()
+        super().__init__(block_time, start_round)
+
+    def fund(self, address: str, amount: int) -> None:
+        """ Credit an account outside of any transaction, e.g. a dispenser."""
+        with self.lock:
+            for state in (self.state, self.pool_state):
+                state.balances[address] = state.balance(address) + amount
+
+    # Submitting and confirming transactions
+    # =============================================================================================
+
+    def submit(self, raw: bytes) -> str:
+        return self.submit_transactions(self._decode(raw))
+
+    def submit_transactions(self, signed_txns: List[SignedTransaction]) -> str:
+        """Check and evaluate a group of signed transactions, and add it to the pool.
+
+        Returns:
+            The transaction ID of the first transaction.
+        """
+        txids = [signed_txn.get_txid() for signed_txn in signed_txns]
+        with self.lock:
+            if self.pool_size is not None and len(self.pending) + len(signed_txns) > self.pool_size:
+                raise Rejected("TransactionPool.Remember: transaction pool is full")
+            self._check_group(signed_txns, txids)
+            self._evaluate_group(self.pool_state, signed_txns, self.round + 1)
+            for txid, signed_txn in zip(txids, signed_txns):
+                self.pending[txid] = signed_txn
+            self.pending_groups.append((txids, signed_txns))
+        return txids[0]
+
+    def _check_group(self, signed_txns: List[SignedTransaction], txids: List[str]) -> None:
+        if not signed_txns or len(signed_txns) > MAX_GROUP_SIZE:
+            raise Rejected(f"group size {len(signed_txns)} is not between 1 and {MAX_GROUP_SIZE}")
+
+        groups = {signed_txn.transaction.group for signed_txn in signed_txns}
+        if len(signed_txns) > 1 and (len(groups) != 1 or None in groups):
+            raise Rejected("transactions sent together are not an atomic group")
+
+        next_round = self.round + 1
+        for txid, signed_txn in zip(txids, signed_txns):
+            txn = signed_txn.transaction
+            if txid in self.pending or txid in self.confirmed:
+                raise Rejected(f"transaction already in ledger: {txid}")
+            if not txn.first_valid_round <= next_round <= txn.last_valid_round:
+                raise Rejected(f"txn dead: round {next_round} outside of {txn.first_valid_round}--{txn.last_valid_round}")
+            if txn.genesis_hash != GENESIS_HASH:
+                raise Rejected("txn genesis hash does not match the ledger")
+
+        # fees are pooled across the group.
+        if sum(signed_txn.transaction.fee for signed_txn in signed_txns) < MIN_FEE * len(signed_txns):
+            raise Rejected(f"transaction group fees below the minimum of {MIN_FEE} per transaction")
+
+    def produce_block(self) -> None:
+        with self.lock:
+            self.round += 1
+            block: List[Tuple[str, SignedTransaction]] = []
+            resync = False
+
+            for group_txids, signed_txns in self.pending_groups:
+                try:
+                    if any(signed_txn.transaction.last_valid_round < self.round for signed_txn in signed_txns):
+                        raise Rejected(f"txn dead: round {self.round} after the last valid round")
+                    infos = self._evaluate_group(self.state, signed_txns, self.round)
+                except Rejected as error:
+                    # the pool state assumed the group would go through.
+                    resync = True
+                    infos = [{"pool-error": str(error), "txn": encode_txn(signed_txn)} for signed_txn in signed_txns]
+                else:
+                    block.extend(zip(group_txids, signed_txns))
+                for txid, info in zip(group_txids, infos):
+                    self.confirmed[txid] = info
+
+            self.blocks[self.round] = block
+            self.pending_groups.clear()
+            self.pending.clear()
+            if resync:
+                self.pool_state = self.state.copy()
+            self.lock.notify_all()
+
+    # Evaluating transactions
+    # =============================================================================================
+
+    def _evaluate_group(self, state: LedgerState, signed_txns: List[SignedTransaction], round: int) -> List[Dict[str, Any]]:
+        txns = [signed_txn.transaction for signed_txn in signed_txns]
+        try:
+            infos = []
+            for index, signed_txn in enumerate(signed_txns):
+                info = {"pool-error": "", "txn": encode_txn(signed_txn), "confirmed-round": round}
+                info.update(self._evaluate(state, txns, index))
+                infos.append(info)
+        except Rejected as error:
+            state.rollback()
+            raise Rejected(f"transaction {signed_txns[index].get_txid()} rejected: {error}") from None
+        except Exception:
+            state.rollback()
+            raise
+        state.commit()
+        return infos
+
+    def _evaluate(self, state: LedgerState, txns: List[Any], index: int) -> Dict[str, Any]:
+        txn = txns[index]
+        state.transfer(txn.sender, None, 0, txn.fee)
+        info: Dict[str, Any] = dict()
+
+        if txn.type == "pay":
+            state.transfer(txn.sender, txn.receiver, txn.amt or 0)
+            if txn.close_remainder_to is not None:
+                if state.holdings.get(txn.sender) or state.min_balances.get(txn.sender):
+                    raise Rejected(f"cannot close account {txn.sender} with assets or apps")
+                state.transfer(txn.sender, txn.close_remainder_to, state.balance(txn.sender))
+                info["closing-amount"] = state.balance(txn.close_remainder_to)
+            state.check_min_balance(txn.receiver)
+        elif txn.type == "axfer":
+            receiver = txn.receiver if txn.receiver is not None else txn.sender
+            state.transfer_asset(txn.sender, receiver, txn.index, txn.amount or 0, txn.close_assets_to)
+        elif txn.type == "acfg" and not txn.index:
+            asset_ID = state.allocate_index()
+            state.set(state.assets, asset_ID, {
+                "creator": txn.sender,
+                "total": txn.total,
+                "decimals": txn.decimals,
+                "default-frozen": bool(txn.default_frozen),
+                "unit-name": txn.unit_name,
+                "name": txn.asset_name,
+                "url": txn.url,
+                "manager": txn.manager,
+            })
+            state.set_holding(txn.sender, asset_ID, txn.total)
+            info["asset-index"] = asset_ID
+        elif txn.type == "appl" and not txn.index:
+            info.update(self._create_app(state, txn))
+        elif txn.type == "appl":
+            info.update(self._call_app(state, txns, index))
+        else:
+            raise Rejected(f"{txn.type} transactions of this kind are not simulated")
+
+        state.check_min_balance(txn.sender)
+        return info
+
+    def _create_app(self, state: LedgerState, txn: Any) -> Dict[str, Any]:
+        if txn.approval_program not in self.programs:
+            # compiled by another ledger, and served from the artifact cache since.
+            self._compile_known_programs()
+        teal = self.programs.get(txn.approval_program, b"")
+        if b'byte "cancel"' in teal:
+            kind = "multi-listing"
+        elif b'byte "buy"' in teal:
+            kind = "escrow"
+        else:
+            raise Rejected("unknown approval program")
+
+        app_ID = state.allocate_index()
+        global_schema = txn.global_schema
+        schema = (global_schema.num_uints or 0, global_schema.num_byte_slices or 0) if global_schema else (0, 0)
+        # the app account starts empty, whatever the default balance of other accounts.
+        state.set(state.balances, get_application_address(app_ID), 0)
+        state.set(state.apps, app_ID, {
+            "creator": txn.sender,
+            "address": get_application_address(app_ID),
+            "kind": kind,
+            "approval-program": txn.approval_program,
+            "clear-state-program": txn.clear_program,
+            "schema": schema,
+            "state": dict(),
+        })
+        state.add_min_balance(
+            txn.sender, APP_MIN_BALANCE + schema[0] * SCHEMA_UINT_MIN_BALANCE + schema[1] * SCHEMA_BYTES_MIN_BALANCE
+        )
+        return {"application-index": app_ID}
+
+    def _compile_known_programs(self) -> None:
+        """ Compile the programs deployed by the operations, which compile to the same bytes on every stub ledger."""
+        from artifacts import generate_teal, known_programs
+
+        for program in known_programs().values():
+            self.compile(generate_teal(program).encode())
+
+    def _call_app(self, state: LedgerState, txns: List[Any], index: int) -> Dict[str, Any]:
+        txn = txns[index]
+        app = state.apps.get(txn.index)
+        if app is None:
+            raise Rejected(f"application {txn.index} does not exist")
+        # both contracts only approve NoOp calls with a method name.
+        if (txn.on_complete or 0) != 0 or not txn.app_args:
+            raise Rejected("logic eval error: rejected by the approval program")
+
+        call = _AppCall(state, app, txn.index, txns, index)
+        if app["kind"] == "escrow":
+            call.escrow()
+        else:
+            call.multi_listing()
+
+        info: Dict[str, Any] = {"inner-txns": call.inner_txns}
+        if call.delta:
+            info["global-state-delta"] = encode_delta(call.delta)
+        return info
+
+    # Endpoints
+    # =============================================================================================
+
+    def application_info(self, app_ID: int) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            app = self.state.apps.get(app_ID)
+            if app is None:
+                return None
+            return {"id": app_ID, "params": encode_app_params(app)}
+
+    def block(self, round: int) -> Optional[Dict[str, Any]]:
+        """ A confirmed block the way algod encodes it in msgpack: the signed transactions with their apply data."""
+        with self.lock:
+            if round > self.round:
+                return None
+            # the rounds before the ledger started are empty.
+            confirmed = self.blocks.get(round, [])
+
+            txns = []
+            for txid, signed_txn in confirmed:
+                info = self.confirmed[txid]
+                entry = signed_txn.dictify()
+                # the apply data is inlined in the transaction entry, the inner transactions in its eval delta.
+                if info.get("application-index") and not signed_txn.transaction.index:
+                    entry["apid"] = info["application-index"]
+                if info.get("asset-index"):
+                    entry["caid"] = info["asset-index"]
+                if info.get("inner-txns"):
+                    inner_txns = [{"txn": encode_inner_txn(inner["txn"]["txn"])} for inner in info["inner-txns"]]
+                    entry["dt"] = {"itx": inner_txns}
+                txns.append(entry)
+
+            return {"block": {"rnd": round, "gen": GENESIS_ID, "gh": b64decode(GENESIS_HASH), "txns": txns}}
+
+    def account_info(self, address: str) -> Dict[str, Any]:
+        with self.lock:
+            state = self.state
+            return {
+                "address": address,
+                "amount": state.balance(address),
+                "min-balance": state.min_balance(address),
+                "round": self.round,
+                "assets": [
+                    {"asset-id": asset_ID, "amount": amount, "is-frozen": False}
+                    for asset_ID, amount in state.holdings.get(address, {}).items()
+                ],
+                "created-apps": [
+                    {"id": app_ID, "params": encode_app_params(app)}
+                    for app_ID, app in state.apps.items() if app["creator"] == address
+                ],
+                "created-assets": [
+                    {"index": asset_ID, "params": params}
+                    for asset_ID, params in state.assets.items() if params["creator"] == address
+                ],
+            }
+
+class _AppCall:
+    """The evaluation of a call of one of the contracts, mirroring the methods of contract.py."""
+
+    def __init__(self, state: LedgerState, app: Dict[str, Any], app_ID: int, txns: List[Any], index: int) -> None:
+        self.state = state
+        self.app = app
+        self.app_ID = app_ID
+        self.address = app["address"]
+        self.txns = txns
+        self.index = index
+        self.txn = txns[index]
+        self.args = [bytes(arg) for arg in self.txn.app_args]
+        self.delta: Dict[bytes, Any] = dict()
+        self.inner_txns: List[Dict[str, Any]] = []
+
+    def require(self, condition: bool, message: str) -> None:
+        if not condition:
+            raise Rejected(f"logic eval error: assert failed: {message}")
+
+    def btoi(self, value: bytes) -> int:
+        self.require(len(value) <= 8, "btoi arg too long")
+        return int.from_bytes(value, "big")
+
+    def available_account(self, address: str) -> None:
+        """ Inner transactions may only send to the sender, the app, or the accounts of the app call."""
+        self.require(
+            address in (self.txn.sender, self.address) or address in (self.txn.accounts or []),
+            f"invalid Account reference {address}",
+        )
+
+    def available_asset(self, asset_ID: int) -> None:
+        self.require(asset_ID in (self.txn.foreign_assets or []), f"invalid Asset reference {asset_ID}")
+
+    # Inner transactions
+    # =============================================================================================
+
+    def inner_payment(self, receiver: str, amount: int) -> None:
+        self.available_account(receiver)
+        self.state.transfer(self.address, receiver, amount, MIN_FEE)
+        self.state.check_min_balance(self.address)
+        self.state.check_min_balance(receiver)
+        self.inner_txns.append({"txn": {"txn": {
+            "type": "pay", "snd": self.address, "rcv": receiver, "amt": amount, "fee": MIN_FEE,
+        }}})
+
+    def inner_asset_transfer(self, asset_ID: int, receiver: str, amount: int = 0, close_to: Optional[str] = None) -> None:
+        self.available_asset(asset_ID)
+        self.available_account(receiver)
+        if close_to is not None:
+            self.available_account(close_to)
+        self.state.transfer(self.address, None, 0, MIN_FEE)
+        self.state.transfer_asset(self.address, receiver, asset_ID, amount, close_to)
+        self.state.check_min_balance(self.address)
+        txn = {"type": "axfer", "snd": self.address, "arcv": receiver, "xaid": asset_ID, "fee": MIN_FEE}
+        if amount:
+            txn["aamt"] = amount
+        if close_to is not None:
+            txn["aclose"] = close_to
+        self.inner_txns.append({"txn": {"txn": txn}})
+
+    def close_nft_to(self, asset_ID: int, account: str) -> None:
+        # with no receiver set, the transfer is to the zero address; closing the holding sends it all to `account`.
+        self.available_asset(asset_ID)
+        self.available_account(account)
+        held = self.state.holding(self.address, asset_ID)
+        if held is None:
+            return
+        if self.state.holding(account, asset_ID) is None:
+            raise Rejected(f"asset {asset_ID} missing from {account}")
+        self.state.transfer(self.address, None, 0, MIN_FEE)
+        self.state.set(self.state.holdings[account], asset_ID, self.state.holding(account, asset_ID) + held)
+        self.state.remove_holding(self.address, asset_ID)
+        self.inner_txns.append({"txn": {"txn": {
+            "type": "axfer", "snd": self.address, "xaid": asset_ID, "aclose": account, "fee": MIN_FEE,
+        }}})
+
+    # The escrow contract
+    # =============================================================================================
+
+    def escrow(self) -> None:
+        state, args = self.app["state"], self.args
+        if args[0] == b"deposit":
+            self.require(len(args) >= 4, "deposit arguments")
+            nft_ID = self.btoi(args[2])
+            deposit = self.txns[self.index + 1] if self.index + 1 < len(self.txns) else None
+            self.require(b"nft_id" not in state or b"buyer" in state, "empty or sold")
+            self.require(
+                args[1] == encoding.decode_address(self.txn.sender)
+                and deposit is not None
+                and deposit.type == "axfer"
+                and deposit.index == nft_ID
+                and deposit.amount == 1
+                and deposit.receiver == self.address
+                and deposit.sender == self.txn.sender,
+                "NFT deposit",
+            )
+            self.state.global_put(self.app_ID, b"seller", args[1], self.delta)
+            self.state.global_put(self.app_ID, b"nft_id", nft_ID, self.delta)
+            self.state.global_put(self.app_ID, b"price", self.btoi(args[3]), self.delta)
+            if b"buyer" in state:
+                self.state.global_del(self.app_ID, b"buyer", self.delta)
+            self.inner_asset_transfer(nft_ID, self.address)
+        elif args[0] == b"buy":
+            self.require(len(args) >= 2, "buy arguments")
+            payment = self.txns[self.index - 1] if self.index > 0 else None
+            self.require(
+                b"buyer" not in state
+                and payment is not None
+                and args[1] == encoding.decode_address(self.txn.sender)
+                and payment.type == "pay"
+                and payment.sender == self.txn.sender
+                and payment.receiver == self.address
+                and (payment.amt or 0) == state.get(b"price", 0),
+                "buy payment",
+            )
+            self.state.global_put(self.app_ID, b"buyer", args[1], self.delta)
+            self.inner_payment(encoding.encode_address(state.get(b"seller", bytes(32))), state.get(b"price", 0))
+            self.close_nft_to(state.get(b"nft_id", 0), encoding.encode_address(state[b"buyer"]))
+        else:
+            raise Rejected("logic eval error: err opcode executed")
+
+    # The multi-listing contract
+    # =============================================================================================
+
+    def multi_listing(self) -> None:
+        args = self.args
+        self.require(bool(self.txn.foreign_assets), "invalid Asset reference 0")
+        nft_ID = self.txn.foreign_assets[0]
+        key = nft_ID.to_bytes(8, "big")
+        listing = self.app["state"].get(key)
+
+        if args[0] == b"deposit":
+            deposit = self.txns[self.index + 1] if self.index + 1 < len(self.txns) else None
+            self.require(listing is None, "not listed")
+            self.require(len(args) >= 2 and len(args[1]) == 8, "price length")
+            self.require(
+                deposit is not None
+                and deposit.type == "axfer"
+                and deposit.index == nft_ID
+                and deposit.amount == 1
+                and deposit.receiver == self.address
+                and deposit.sender == self.txn.sender,
+                "NFT deposit",
+            )
+            self.state.global_put(self.app_ID, key, encoding.decode_address(self.txn.sender) + args[1], self.delta)
+            if self.state.holding(self.address, nft_ID) is None:
+                self.inner_asset_transfer(nft_ID, self.address)
+        elif args[0] == b"buy":
+            self.require(listing is not None, "listed")
+            seller, price = encoding.encode_address(listing[:32]), int.from_bytes(listing[32:], "big")
+            payment = self.txns[self.index - 1] if self.index > 0 else None
+            self.require(
+                payment is not None
+                and payment.type == "pay"
+                and payment.sender == self.txn.sender
+                and payment.receiver == self.address
+                and (payment.amt or 0) == price,
+                "buy payment",
+            )
+            self.inner_payment(seller, price)
+            self.close_nft_to(nft_ID, self.txn.sender)
+            self.state.global_del(self.app_ID, key, self.delta)
+        elif args[0] == b"cancel":
+            self.require(listing is not None, "listed")
+            self.require(encoding.encode_address(listing[:32]) == self.txn.sender, "seller")
+            self.close_nft_to(nft_ID, self.txn.sender)
+            self.state.global_del(self.app_ID, key, self.delta)
+        else:
+            raise Rejected("logic eval error: err opcode executed")
+
+# the fields of an inner transaction holding an address.
+ADDRESS_FIELDS = ("snd", "rcv", "close", "arcv", "aclose")
+
+def encode_inner_txn(txn: Dict[str, Any]) -> Dict[str, Any]:
+    """ Encode an inner transaction the way algod does in msgpack blocks, with raw 32 byte addresses."""
+    return {
+        field: encoding.decode_address(value) if field in ADDRESS_FIELDS else value for field, value in txn.items()
+    }
+
+def encode_app_params(app: Dict[str, Any]) -> Dict[str, Any]:
+    """ Encode the params of an app the way algod returns them."""
+    uints, byte_slices = app["schema"]
+    return {
+        "creator": app["creator"],
+        "approval-program": b64encode(app["approval-program"]).decode(),
+        "clear-state-program": b64encode(app["clear-state-program"]).decode(),
+        "global-state-schema": {"num-uint": uints, "num-byte-slice": byte_slices},
+        "global-state": encode_state(app["state"]),
+    }
+
+# In-process client
+# =============================================================================================
+
+class SimulatedAlgod(AlgodClient):
+    """An algod client running against a simulated ledger in the same process, without any HTTP.
+
+    Args:
+        ledger: The simulated ledger, a new one if not given.
+        block_time: The block time of a new ledger in seconds, 0 to produce blocks on demand.
+        default_balance: The balance of accounts never seen before by a new ledger, in microAlgos.
+    """
+
+    def __init__(
+        self, ledger: Optional[SimulatedLedger] = None, block_time: float = 0, default_balance: int = 0
+    ) -> None:
+        super().__init__("", "simulated")
+        self.ledger = SimulatedLedger(block_time, default_balance=default_balance) if ledger is None else ledger
+        self.count_lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self.count_lock:
+            self.ledger.request_counts[name] = self.ledger.request_counts.get(name, 0) + 1
+
+    def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format="json"):
+        raise AlgodHTTPError(f"{method} {requrl} is not simulated", 404)
+
+    def status(self, **kwargs) -> Dict[str, Any]:
+        self._count("status")
+        return self.ledger.status()
+
+    def status_after_block(self, block_num=None, round_num=None, **kwargs) -> Dict[str, Any]:
+        self._count("wait_for_block_after")
+        self.ledger.wait_for_block_after(block_num if block_num is not None else round_num)
+        return self.ledger.status()
+
+    def suggested_params(self, **kwargs) -> SuggestedParams:
+        self._count("params")
+        params = self.ledger.params()
+        return SuggestedParams(
+            params["fee"],
+            params["last-round"],
+            params["last-round"] + 1000,
+            params["genesis-hash"],
+            params["genesis-id"],
+            False,
+            params["consensus-version"],
+            params["min-fee"],
+        )
+
+    def compile(self, source: str, **kwargs) -> Dict[str, Any]:
+        self._count("compile")
+        return self.ledger.compile(source.encode())
+
+    def send_raw_transaction(self, txn, **kwargs) -> str:
+        self._count("submit")
+        return self._submit(self.ledger._decode(b64decode(txn)))
+
+    def send_transaction(self, txn: SignedTransaction, **kwargs) -> str:
+        self._count("submit")
+        return self._submit([txn])
+
+    def send_transactions(self, txns: List[SignedTransaction], **kwargs) -> str:
+        self._count("submit")
+        return self._submit(list(txns))
+
+    def _submit(self, signed_txns: List[SignedTransaction]) -> str:
+        try:
+            return self.ledger.submit_transactions(signed_txns)
+        except Rejected as error:
+            raise AlgodHTTPError(str(error), 400) from None
+
+    def pending_transaction_info(self, transaction_id: str, **kwargs) -> Dict[str, Any]:
+        self._count("pending_info")
+        info = self.ledger.pending_info(transaction_id)
+        if info is None:
+            raise AlgodHTTPError("txn does not exist", 404)
+        return info
+
+    def application_info(self, application_id: int, **kwargs) -> Dict[str, Any]:
+        self._count("application_info")
+        info = self.ledger.application_info(application_id)
+        if info is None:
+            raise AlgodHTTPError("application does not exist", 404)
+        return info
+
+    def block_info(self, block=None, response_format="json", round_num=None, **kwargs):
+        self._count("block")
+        if response_format != "msgpack":
+            raise AlgodHTTPError("only msgpack blocks are simulated", 400)
+        info = self.ledger.block(block if block is not None else round_num)
+        if info is None:
+            raise AlgodHTTPError("failed to retrieve information from the ledger", 404)
+        return msgpack.packb(info, use_bin_type=True)
+
+    def account_info(self, address: str, **kwargs) -> Dict[str, Any]:
+        self._count("account_info")
+        return self.ledger.account_info(address)
@@ -0,0 +1,207 @@
+# Python imports
+import sys
+from array import array
+from base64 import b64decode, b64encode
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+# Algorand library imports.
+from algosdk.v2client.algod import AlgodClient
+from algosdk import encoding
+
+# A snapshot of the state of every escrow contract created by an account, taken with a single `account_info` call
+# (which lists the global state of each created app) instead of one `application_info` call per app. The state is
+# decoded straight into columns: app IDs, NFT IDs and prices in `array('Q')`, and sellers as raw 32 byte public keys
+# packed in one bytearray. Apps created by the same account that are not escrow contracts (multi-listing contracts)
+# are left out, by their global state schema and keys. Addresses are only encoded when a row is read.
+
+SELLER_KEY = b64encode(b"seller").decode()
+NFT_ID_KEY = b64encode(b"nft_id").decode()
+PRICE_KEY = b64encode(b"price").decode()
+BUYER_KEY = b64encode(b"buyer").decode()
+
+# the global state schema of the escrow contract, see `operations.create_escrow_txn`.
+ESCROW_SCHEMA = (3, 2)
+
+ADDRESS_LENGTH = 32
+NO_SELLER = bytes(ADDRESS_LENGTH)
+
+# Useful Classes
+# =============================================================================================
+
+class EscrowRow(NamedTuple):
+    """The state of a single escrow contract. The seller is None (and the NFT ID and price 0) when no NFT is deposited,
+    and `sold` is set once the NFT was bought."""
+
+    app_id: int
+    seller: Optional[str]
+    nft_id: int
+    price: int
+    sold: bool = False
+
+class SnapshotDiff(NamedTuple):
+    """The app IDs added, removed and changed between two snapshots."""
+
+    added: List[int]
+    removed: List[int]
+    changed: List[int]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+class EscrowSnapshot:
+    """A columnar snapshot of the state of many escrow contracts, at a round.
+
+    Args:
+        round: The round the snapshot was taken at.
+    """
+
+    def __init__(self, round: int = 0) -> None:
+        self.round = round
+        self.app_ids = array("Q")
+        self.nft_ids = array("Q")
+        self.prices = array("Q")
+        self.sellers = bytearray()
+        # 1 for the contracts whose NFT was bought, 0 otherwise.
+        self.sold = bytearray()
+
+        # the row of each app ID.
+        self.index: Dict[int, int] = dict()
+
+    def __len__(self) -> int:
+        return len(self.app_ids)
+
+    def __contains__(self, app_ID: int) -> bool:
+        return app_ID in self.index
+
+    def __iter__(self) -> Iterator[EscrowRow]:
+        for row in range(len(self.app_ids)):
+            yield self.row(row)
+
+    def append(self, app_ID: int, seller: bytes, nft_ID: int, price: int, sold: bool = False) -> None:
+        """ Add the state of an app, with the seller as a raw 32 byte public key (all zeros for none)."""
+        self.index[app_ID] = len(self.app_ids)
+        self.app_ids.append(app_ID)
+        self.nft_ids.append(nft_ID)
+        self.prices.append(price)
+        self.sellers += seller
+        self.sold.append(1 if sold else 0)
+
+    def seller_key(self, row: int) -> bytes:
+        """ The raw public key of the seller of a row, all zeros when there is none."""
+        return bytes(self.sellers[row * ADDRESS_LENGTH:(row + 1) * ADDRESS_LENGTH])
+
+    def row(self, row: int) -> EscrowRow:
+        seller = self.seller_key(row)
+        return EscrowRow(
+            self.app_ids[row],
+            encoding.encode_address(seller) if seller != NO_SELLER else None,
+            self.nft_ids[row],
+            self.prices[row],
+            bool(self.sold[row]),
+        )
+
+    def get(self, app_ID: int) -> Optional[EscrowRow]:
+        row = self.index.get(app_ID)
+        return self.row(row) if row is not None else None
+
+    def diff(self, newer: "EscrowSnapshot") -> SnapshotDiff:
+        """Compare this snapshot with a newer one, column by column.
+
+        Args:
+            newer: The newer snapshot.
+
+        Returns:
+            The apps only in the newer snapshot, the apps only in this one, and the apps whose state changed.
+        """
+        added = [app_ID for app_ID in newer.app_ids if app_ID not in self.index]
+        removed = [app_ID for app_ID in self.app_ids if app_ID not in newer.index]
+
+        changed: List[int] = []
+        old_sellers, new_sellers = memoryview(self.sellers), memoryview(newer.sellers)
+        for old_row, app_ID in enumerate(self.app_ids):
+            new_row = newer.index.get(app_ID)
+            if new_row is None:
+                continue
+            if (
+                self.nft_ids[old_row] != newer.nft_ids[new_row]
+                or self.prices[old_row] != newer.prices[new_row]
+                or self.sold[old_row] != newer.sold[new_row]
+                or old_sellers[old_row * ADDRESS_LENGTH:(old_row + 1) * ADDRESS_LENGTH]
+                != new_sellers[new_row * ADDRESS_LENGTH:(new_row + 1) * ADDRESS_LENGTH]
+            ):
+                changed.append(app_ID)
+
+        return SnapshotDiff(added, removed, changed)
+
+# Snapshot functions
+# =============================================================================================
+
+def decode_created_apps(created_apps: List[Any], round: int = 0) -> EscrowSnapshot:
+    """Decode the `created-apps` of an `account_info` response into a snapshot, skipping apps that are not escrows.
+
+    Args:
+        created_apps: The created apps, as returned by algod.
+        round: The round of the response.
+
+    Returns:
+        The snapshot of the escrow contracts.
+    """
+    snapshot = EscrowSnapshot(round)
+
+    for app in created_apps:
+        schema = app["params"].get("global-state-schema")
+        if schema is not None and (schema.get("num-uint", 0), schema.get("num-byte-slice", 0)) != ESCROW_SCHEMA:
+            continue
+
+        seller = NO_SELLER
+        nft_ID = 0
+        price = 0
+        sold = False
+
+        for pair in app["params"].get("global-state", ()):
+            # compare the keys still base64 encoded, so the keys of other entries are never decoded.
+            key = pair["key"]
+            if key == SELLER_KEY:
+                seller = b64decode(pair["value"].get("bytes", ""))
+                if len(seller) != ADDRESS_LENGTH:
+                    seller = NO_SELLER
+            elif key == NFT_ID_KEY:
+                nft_ID = pair["value"].get("uint", 0)
+            elif key == PRICE_KEY:
+                price = pair["value"].get("uint", 0)
+            elif key == BUYER_KEY:
+                sold = True
+            else:
+                # a key the escrow contract does not have: another kind of app.
+                break
+        else:
+            snapshot.append(app["id"], seller, nft_ID, price, sold)
+
+    return snapshot
+
+def take_snapshot(client: AlgodClient, creator_address: str) -> EscrowSnapshot:
+    """Snapshot the state of every escrow contract created by an account, with a single request.
+
+    Args:
+        client: An algod client.
+        creator_address: The address of the account that created the escrow contracts.
+
+    Returns:
+        The snapshot of the escrow contracts.
+    """
+    account_info = client.account_info(creator_address)
+    return decode_created_apps(account_info.get("created-apps", []), account_info.get("round", 0))
+
+
+if __name__ == "__main__":
+    from utils import get_client, get_account
+
+    address = sys.argv[1] if len(sys.argv) > 1 else get_account("creator").getAddress()
+    snapshot = take_snapshot(get_client(), address)
+    for row in snapshot:
+        if row.seller is None:
+            print(f"{row.app_id}: empty")
+        else:
+            status = "sold" if row.sold else "listed"
+            print(f"{row.app_id}: NFT {row.nft_id} {status} at {row.price} microAlgos by {row.seller}")
+    print(f"{len(snapshot)} escrow contracts at round {snapshot.round}")
@@ -0,0 +1,144 @@
+# Python imports
+import threading
+from typing import Dict, Union
+
+# Algorand library imports.
+from algosdk.v2client.algod import AlgodClient
+
+# Import utility classes and functions.
+from utils import Pending_txn_response, applyStateDelta, decodeState
+
+# A per-app cache of global state. Each app is fetched once with `application_info`; after that, the state is kept up
+# to date by applying the global state deltas of the confirmed app calls made by the operations, so steady-state
+# trading never fetches it again, however many rounds pass between two calls.
+#
+# Other clients may call the same apps. The cache cannot tell from the passing rounds, only from the calls themselves:
+# `follow` subscribes it to a `BlockFollower`, which sees every deposit, buy and cancel on chain. A call observed after
+# the fetched state that is not one of the calls whose delta the cache applied is a change the cache missed, and the
+# state is fetched again on the next read. Without a follower, the cache only sees the calls of the operations.
+#
+# Deltas carry absolute values, so applying one twice is harmless, but applying an old one over a newer state is not. A
+# fetched state is stamped with the round the node reports around the fetch and the deltas up to it are skipped; a
+# delta older than one already applied drops the cached state instead.
+
+# the number of times a fetch is retried when a round passes while fetching, leaving the round of the state unknown.
+FETCH_ATTEMPTS = 3
+
+State = Dict[bytes, Union[int, bytes]]
+
+class GlobalStateCache:
+    """Caches the global state of apps by app ID, along with the rounds it is known to be valid at.
+
+    Args:
+        client: An algod client to fetch the state of apps not in the cache.
+    """
+
+    def __init__(self, client: AlgodClient) -> None:
+        self.client = client
+
+        self.states: Dict[int, State] = dict()
+        # the round the state of each app was fetched (or seeded) at, and the round of the last delta applied to it.
+        self.fetched_rounds: Dict[int, int] = dict()
+        self.rounds: Dict[int, int] = dict()
+        # with a follower, the calls of each app after its fetched round by round: the calls observed on chain minus
+        # the calls applied by the cache. A positive count is a call the cache missed.
+        self.calls: Dict[int, Dict[int, int]] = dict()
+        self.following = False
+
+        self.hits = 0
+        self.fetches = 0
+        self.deltas_applied = 0
+        self.lock = threading.Lock()
+
+    def follow(self, follower) -> "GlobalStateCache":
+        """ Observe every call of the apps seen on chain by a block follower, to notice the calls of other clients."""
+        self.following = True
+        follower.subscribe(lambda event: self.observe_call(event.app_id, event.round))
+        return self
+
+    def observe_call(self, app_ID: int, round: int) -> None:
+        """ Record a call of an app confirmed at a round, made by the operations or by anyone else."""
+        with self.lock:
+            if app_ID in self.states and round > self.fetched_rounds[app_ID]:
+                self._count_call(app_ID, round, 1)
+
+    def _count_call(self, app_ID: int, round: int, change: int) -> None:
+        calls = self.calls.setdefault(app_ID, dict())
+        calls[round] = calls.get(round, 0) + change
+        if calls[round] == 0:
+            del calls[round]
+
+    def _store(self, app_ID: int, state: State, round: int) -> None:
+        self.states[app_ID] = state
+        self.fetched_rounds[app_ID] = round
+        self.rounds[app_ID] = round
+        self.calls.pop(app_ID, None)
+
+    def seed(self, app_ID: int, state: State, round: int) -> None:
+        """ Put the state of an app known to be valid at a round, e.g. the empty state of a newly created app."""
+        with self.lock:
+            self._store(app_ID, dict(state), round)
+
+    def fetch(self, app_ID: int) -> State:
+        """ Fetch the state of an app from the node, replacing the cached state."""
+        # the node does not tell the round of the state: it is known when the node is at the same round before and
+        # after the fetch, otherwise the earlier round is taken and the calls after it may be missed ones.
+        for _ in range(FETCH_ATTEMPTS):
+            round = self.client.status()["last-round"]
+            app_info = self.client.application_info(app_ID)
+            if self.client.status()["last-round"] == round:
+                break
+        state = decodeState(app_info["params"].get("global-state", []))
+
+        with self.lock:
+            self.fetches += 1
+            self._store(app_ID, state, round)
+            return dict(state)
+
+    def get(self, app_ID: int) -> State:
+        """ The global state of an app, from the cache if it is there and no call of it was missed."""
+        with self.lock:
+            state = self.states.get(app_ID)
+            if state is not None and not self._missed_call(app_ID):
+                self.hits += 1
+                return dict(state)
+        return self.fetch(app_ID)
+
+    def _missed_call(self, app_ID: int) -> bool:
+        """ Whether a call of an app by another client was observed after its cached state."""
+        return any(count > 0 for count in self.calls.get(app_ID, {}).values())
+
+    def apply(self, app_ID: int, response: Pending_txn_response) -> None:
+        """Apply the global state delta of a confirmed call of an app.
+
+        Args:
+            app_ID: The app called.
+            response: The confirmed response of the app call transaction.
+        """
+        round = response.confirmedRound
+
+        with self.lock:
+            if app_ID not in self.states or round <= self.fetched_rounds[app_ID]:
+                # not cached, or the fetched state already includes this call.
+                return
+            if round < self.rounds[app_ID]:
+                # a newer delta was applied already: drop the cached state rather than applying an old value over it.
+                self._drop(app_ID)
+                return
+
+            applyStateDelta(self.states[app_ID], response.globalStateDelta or [])
+            self.rounds[app_ID] = round
+            self.deltas_applied += 1
+            if self.following:
+                # the call is matched with its observation by the follower, before or after it.
+                self._count_call(app_ID, round, -1)
+
+    def _drop(self, app_ID: int) -> None:
+        self.states.pop(app_ID, None)
+        self.fetched_rounds.pop(app_ID, None)
+        self.rounds.pop(app_ID, None)
+        self.calls.pop(app_ID, None)
+
+    def invalidate(self, app_ID: int) -> None:
+        with self.lock:
+            self._drop(app_ID)
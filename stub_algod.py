@@ -0,0 +1,380 @@
+# Python imports
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+from base64 import b64encode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+# Algorand library imports.
+import msgpack
+from algosdk import encoding
+from algosdk.future.transaction import SignedTransaction
+
+# A stand-in for an algod node, serving the handful of REST endpoints the project calls over real HTTP (with
+# keep-alive), so the clients can be exercised without a sandbox. Transactions are accepted as they are, confirmed in
+# the next block, and the escrow 'deposit', 'buy' (and multi-listing 'cancel') calls update the app global state the way
+# the contracts do. Blocks are produced every `block_time` seconds, or on demand when a client waits for one if
+# `block_time` is 0.
+
+GENESIS_HASH = b64encode(hashlib.sha256(b"stub-algod").digest()).decode()
+GENESIS_ID = "stub-v1"
+
+class StubLedger:
+    """The in-memory chain state behind the stub algod server."""
+
+    def __init__(self, block_time: float = 0, start_round: int = 1) -> None:
+        self.block_time = block_time
+        self.round = start_round
+        self.next_index = 1000
+
+        self.pending: Dict[str, SignedTransaction] = dict()
+        self.confirmed: Dict[str, Dict[str, Any]] = dict()
+        self.apps: Dict[int, Dict[str, Any]] = dict()
+        self.programs: Dict[bytes, bytes] = dict()
+        self.request_counts: Dict[str, int] = dict()
+
+        self.lock = threading.Condition()
+        self.stopping = threading.Event()
+        if block_time > 0:
+            threading.Thread(target=self._produce_blocks, daemon=True).start()
+
+    def _produce_blocks(self) -> None:
+        while not self.stopping.wait(self.block_time):
+            self.produce_block()
+
+    # Block production
+    # =============================================================================================
+
+    def produce_block(self) -> None:
+        with self.lock:
+            self.round += 1
+            for txid, signed_txn in self.pending.items():
+                self.confirmed[txid] = self._apply(signed_txn)
+            self.pending.clear()
+            self.lock.notify_all()
+
+    def _apply(self, signed_txn: SignedTransaction) -> Dict[str, Any]:
+        txn = signed_txn.transaction
+        info = {"pool-error": "", "txn": encode_txn(signed_txn), "confirmed-round": self.round}
+
+        if txn.type == "acfg" and not txn.index:
+            info["asset-index"] = self._allocate_index()
+        elif txn.type == "appl" and not txn.index:
+            app_ID = self._allocate_index()
+            teal = self.programs.get(txn.approval_program, b"")
+            schema = txn.global_schema
+            self.apps[app_ID] = {
+                "creator": txn.sender,
+                "global-state": dict(),
+                "global-state-schema": {
+                    "num-uint": (schema.num_uints or 0) if schema else 0,
+                    "num-byte-slice": (schema.num_byte_slices or 0) if schema else 0,
+                },
+                "multi-listing": b'byte "cancel"' in teal,
+            }
+            info["application-index"] = app_ID
+        elif txn.type == "appl" and txn.index in self.apps and txn.app_args:
+            app = self.apps[txn.index]
+            if app["multi-listing"]:
+                delta = self._call_multi_listing(app["global-state"], txn)
+            else:
+                delta = self._call_escrow(app["global-state"], txn.app_args)
+            if delta:
+                info["global-state-delta"] = delta
+        return info
+
+    def _allocate_index(self) -> int:
+        self.next_index += 1
+        return self.next_index
+
+    def _call_escrow(self, state: Dict[bytes, Any], app_args: List[bytes]) -> List[Dict[str, Any]]:
+        if app_args[0] == b"deposit" and (b"nft_id" not in state or b"buyer" in state):
+            # only an empty escrow, or one whose NFT was sold, takes a new deposit.
+            updates = {
+                b"seller": app_args[1],
+                b"nft_id": int.from_bytes(app_args[2], "big"),
+                b"price": int.from_bytes(app_args[3], "big"),
+            }
+            # the buyer of the previous sale is cleared, so a reused escrow is for sale again.
+            if b"buyer" in state:
+                updates[b"buyer"] = None
+        elif app_args[0] == b"buy" and b"buyer" not in state:
+            # an NFT already sold cannot be bought again.
+            updates = {b"buyer": app_args[1]}
+        else:
+            return []
+
+        for key, value in updates.items():
+            if value is None:
+                del state[key]
+            else:
+                state[key] = value
+        return encode_delta(updates)
+
+    def _call_multi_listing(self, state: Dict[bytes, Any], txn: Any) -> List[Dict[str, Any]]:
+        key = txn.foreign_assets[0].to_bytes(8, "big")
+        if txn.app_args[0] == b"deposit":
+            updates = {key: encoding.decode_address(txn.sender) + txn.app_args[1]}
+            state.update(updates)
+            return encode_delta(updates)
+        if txn.app_args[0] in (b"buy", b"cancel") and key in state:
+            del state[key]
+            return encode_delta({key: None})
+        return []
+
+    def wait_for_block_after(self, round: int, timeout: float = 30) -> None:
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while self.round <= round:
+                if self.block_time == 0:
+                    self.produce_block()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                self.lock.wait(remaining)
+
+    # Endpoints
+    # =============================================================================================
+
+    def status(self) -> Dict[str, Any]:
+        return {"last-round": self.round, "time-since-last-round": 0, "catchup-time": 0}
+
+    def params(self) -> Dict[str, Any]:
+        return {
+            "fee": 0,
+            "min-fee": 1000,
+            "last-round": self.round,
+            "genesis-hash": GENESIS_HASH,
+            "genesis-id": GENESIS_ID,
+            "consensus-version": "future",
+        }
+
+    def compile(self, teal: bytes) -> Dict[str, Any]:
+        program = b"\x05" + hashlib.sha256(teal).digest()
+        self.programs[program] = teal
+        return {"hash": encoding.encode_address(hashlib.sha512(b"Program" + program).digest()[:32]),
+                "result": b64encode(program).decode()}
+
+    def submit(self, raw: bytes) -> str:
+        signed_txns = self._decode(raw)
+        with self.lock:
+            for signed_txn in signed_txns:
+                self.pending[signed_txn.get_txid()] = signed_txn
+        return signed_txns[0].get_txid()
+
+    def _decode(self, raw: bytes) -> List[SignedTransaction]:
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(raw)
+        return [SignedTransaction.undictify(txn) for txn in unpacker]
+
+    def pending_info(self, txid: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            if txid in self.confirmed:
+                return self.confirmed[txid]
+            if txid in self.pending:
+                return {"pool-error": "", "txn": encode_txn(self.pending[txid])}
+        return None
+
+    def application_info(self, app_ID: int) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            app = self.apps.get(app_ID)
+            if app is None:
+                return None
+            return {"id": app_ID, "params": encode_app_params(app)}
+
+    def block(self, round: int) -> Optional[Dict[str, Any]]:
+        """ A confirmed block in the msgpack layout of algod, None if not available (the stub does not keep blocks)."""
+        return None
+
+    def account_info(self, address: str) -> Dict[str, Any]:
+        with self.lock:
+            created_apps = [
+                {"id": app_ID, "params": encode_app_params(app)}
+                for app_ID, app in self.apps.items() if app["creator"] == address
+            ]
+        return {"address": address, "amount": 10 ** 15, "round": self.round, "created-apps": created_apps}
+
+def encode_app_params(app: Dict[str, Any]) -> Dict[str, Any]:
+    """ Encode the params of an app the way algod returns them."""
+    return {
+        "creator": app["creator"],
+        "global-state-schema": app["global-state-schema"],
+        "global-state": encode_state(app["global-state"]),
+    }
+
+def encode_txn(signed_txn: SignedTransaction) -> Dict[str, Any]:
+    """ Encode a signed transaction the way algod returns it in JSON, with byte fields in base64."""
+    def encode(value: Any) -> Any:
+        if isinstance(value, bytes):
+            return b64encode(value).decode()
+        if isinstance(value, dict):
+            return {key: encode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [encode(item) for item in value]
+        return value
+
+    return encode(signed_txn.dictify())
+
+def encode_delta(updates: Dict[bytes, Any]) -> List[Dict[str, Any]]:
+    """ Encode updates to a global state as an algod state delta, None values being deletions."""
+    delta = []
+    for key, value in updates.items():
+        if value is None:
+            delta.append({"key": b64encode(key).decode(), "value": {"action": 3}})
+        elif isinstance(value, int):
+            delta.append({"key": b64encode(key).decode(), "value": {"action": 2, "uint": value}})
+        else:
+            delta.append({"key": b64encode(key).decode(), "value": {"action": 1, "bytes": b64encode(value).decode()}})
+    return delta
+
+def encode_state(state: Dict[bytes, Any]) -> List[Dict[str, Any]]:
+    """ Encode a global state the way algod returns it, the inverse of `utils.decodeState`."""
+    encoded = []
+    for key, value in state.items():
+        if isinstance(value, int):
+            encoded.append({"key": b64encode(key).decode(), "value": {"type": 2, "uint": value, "bytes": ""}})
+        else:
+            encoded.append({"key": b64encode(key).decode(), "value": {"type": 1, "uint": 0, "bytes": b64encode(value).decode()}})
+    return encoded
+
+# HTTP server
+# =============================================================================================
+
+class StubAlgodHandler(BaseHTTPRequestHandler):
+    """Routes algod v2 REST requests to the stub ledger."""
+
+    protocol_version = "HTTP/1.1"
+
+    routes: List[Tuple[str, "re.Pattern[str]", str]] = [
+        ("GET", re.compile(r"^/health$"), "health"),
+        ("GET", re.compile(r"^/v2/status$"), "status"),
+        ("GET", re.compile(r"^/v2/status/wait-for-block-after/(\d+)$"), "wait_for_block_after"),
+        ("GET", re.compile(r"^/v2/transactions/params$"), "params"),
+        ("GET", re.compile(r"^/v2/transactions/pending/([A-Z2-7]+)$"), "pending_info"),
+        ("POST", re.compile(r"^/v2/transactions$"), "submit"),
+        ("POST", re.compile(r"^/v2/teal/compile$"), "compile"),
+        ("GET", re.compile(r"^/v2/applications/(\d+)$"), "application_info"),
+        ("GET", re.compile(r"^/v2/accounts/([A-Z2-7]+)$"), "account_info"),
+        ("GET", re.compile(r"^/v2/blocks/(\d+)$"), "block"),
+    ]
+
+    def do_GET(self) -> None:
+        self._route("GET")
+
+    def do_POST(self) -> None:
+        self._route("POST")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _route(self, method: str) -> None:
+        path = urlparse(self.path).path
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        ledger: StubLedger = self.server.ledger
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        for route_method, pattern, name in self.routes:
+            match = pattern.match(path)
+            if route_method == method and match:
+                ledger.request_counts[name] = ledger.request_counts.get(name, 0) + 1
+                try:
+                    status, response = getattr(self, "_" + name)(ledger, body, *match.groups())
+                except Exception as error:
+                    status, response = 400, {"message": str(error)}
+                return self._respond(status, response)
+
+        self._respond(404, {"message": f"unknown route {method} {path}"})
+
+    def _respond(self, status: int, response: Union[Dict[str, Any], bytes]) -> None:
+        # msgpack responses (blocks) come already encoded.
+        msgpack_encoded = isinstance(response, bytes)
+        payload = response if msgpack_encoded else json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/msgpack" if msgpack_encoded else "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _health(self, ledger: StubLedger, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        return 200, {}
+
+    def _status(self, ledger: StubLedger, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        return 200, ledger.status()
+
+    def _wait_for_block_after(self, ledger: StubLedger, body: bytes, round: str) -> Tuple[int, Dict[str, Any]]:
+        ledger.wait_for_block_after(int(round))
+        return 200, ledger.status()
+
+    def _params(self, ledger: StubLedger, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        return 200, ledger.params()
+
+    def _pending_info(self, ledger: StubLedger, body: bytes, txid: str) -> Tuple[int, Dict[str, Any]]:
+        info = ledger.pending_info(txid)
+        if info is None:
+            return 404, {"message": "txn does not exist"}
+        return 200, info
+
+    def _submit(self, ledger: StubLedger, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        return 200, {"txId": ledger.submit(body)}
+
+    def _compile(self, ledger: StubLedger, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        return 200, ledger.compile(body)
+
+    def _application_info(self, ledger: StubLedger, body: bytes, app_ID: str) -> Tuple[int, Dict[str, Any]]:
+        info = ledger.application_info(int(app_ID))
+        if info is None:
+            return 404, {"message": "application does not exist"}
+        return 200, info
+
+    def _account_info(self, ledger: StubLedger, body: bytes, address: str) -> Tuple[int, Dict[str, Any]]:
+        return 200, ledger.account_info(address)
+
+    def _block(self, ledger: StubLedger, body: bytes, round: str) -> Tuple[int, Union[Dict[str, Any], bytes]]:
+        block = ledger.block(int(round))
+        if block is None:
+            return 404, {"message": "failed to retrieve information from the ledger"}
+        return 200, msgpack.packb(block, use_bin_type=True)
+
+class StubAlgodServer(ThreadingHTTPServer):
+    """A local HTTP server speaking the algod REST API, backed by a StubLedger."""
+
+    daemon_threads = True
+
+    def __init__(
+        self, ledger: Optional[StubLedger] = None, host: str = "127.0.0.1", port: int = 0, latency: float = 0
+    ) -> None:
+        super().__init__((host, port), StubAlgodHandler)
+        self.ledger = StubLedger() if ledger is None else ledger
+        # a delay added to every request, to stand in for a slow or distant node.
+        self.latency = latency
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubAlgodServer":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.ledger.stopping.set()
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 4001
+    block_time = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    server = StubAlgodServer(StubLedger(block_time), port=port)
+    print(f"Stub algod listening on {server.address} with a block time of {block_time}s")
+    server.serve_forever()
@@ -0,0 +1,353 @@
+# Python imports
+import time
+import base64
+import hashlib
+import argparse
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Algorand library imports.
+from nacl.signing import SigningKey
+from algosdk import constants, encoding
+from algosdk.v2client.algod import AlgodClient
+from algosdk.future import transaction
+
+# Import the transaction builders, to derive the fees from, and to compare with.
+from operations import DEFAULT_PRICE, deposit_NFT_txns, pay_contract_txns
+
+# Import utility classes.
+from utils import Account, signing_key
+
+# Templates of the deposit and buy groups, producing the signed group bytes (ready for `send_raw_transaction`) of a
+# trade without building any SDK transaction. The canonical msgpack encoding of the transactions is assembled from
+# parts encoded once (keys, fee, validity window, genesis, constant app args), with only the fields varying per trade
+# encoded each time: addresses, app ID, NFT ID, price. The group ID is hashed over the transactions without it, as
+# algod does, and the transactions are signed with signing keys decoded once per account.
+#
+#   template = DepositTemplate(client.suggested_params())
+#   raw = template.sign(seller, application_ID, NFT_ID, price)
+#   client.send_raw_transaction(base64.b64encode(raw))
+#
+# `refresh` moves the templates to a new validity window. Flat fees are encoded once; fees paid per byte are worked out
+# per trade from the encoded size, as the SDK does. The bytes are identical to those of the SDK path (build the
+# transactions, `assign_group_id`, `sign`, `send_transactions`), which `python templates.py` checks, with flat and per
+# byte fees, before timing both.
+
+# the ID of a transaction and of a group are SHA-512/256 hashes; hashlib has it when built against a recent OpenSSL.
+try:
+    hashlib.new("sha512_256")
+
+    def _checksum(data: bytes) -> bytes:
+        return hashlib.new("sha512_256", data).digest()
+except ValueError:
+    _checksum = encoding.checksum
+
+# Canonical msgpack encoding
+# =============================================================================================
+
+def _uint(value: int) -> bytes:
+    """ The shortest msgpack encoding of an unsigned integer."""
+    if value < 0x80:
+        return bytes((value,))
+    if value <= 0xFF:
+        return b"\xcc" + bytes((value,))
+    if value <= 0xFFFF:
+        return b"\xcd" + value.to_bytes(2, "big")
+    if value <= 0xFFFFFFFF:
+        return b"\xce" + value.to_bytes(4, "big")
+    return b"\xcf" + value.to_bytes(8, "big")
+
+def _str(value: str) -> bytes:
+    data = value.encode()
+    if len(data) < 32:
+        return bytes((0xA0 | len(data),)) + data
+    return b"\xd9" + bytes((len(data),)) + data
+
+def _bin(data: bytes) -> bytes:
+    return b"\xc4" + bytes((len(data),)) + data
+
+def _map(size: int) -> bytes:
+    return bytes((0x80 | size,))
+
+K = {key: _str(key) for key in (
+    "aamt", "amt", "apaa", "apas", "apat", "apid", "arcv", "fee", "fv", "gen", "gh", "grp", "lv", "rcv", "snd", "type",
+    "xaid",
+)}
+BIN32 = b"\xc4\x20"
+BIN8 = b"\xc4\x08"
+APPL = _str("appl")
+AXFER = _str("axfer")
+PAY = _str("pay")
+DEPOSIT_ARGS = b"\x94" + _bin(b"deposit") + BIN32
+BUY_ARGS = b"\x92" + _bin(b"buy")
+SIGNED_TXN = _map(2) + _str("sig") + b"\xc4\x40"
+TXN_KEY = _str("txn")
+TXLIST = _map(1) + _str("txlist")
+
+# Keys and addresses
+# =============================================================================================
+
+_public_keys: Dict[str, bytes] = dict()
+
+def public_key(address: str) -> bytes:
+    """ The 32 bytes of an address, decoded once."""
+    key = _public_keys.get(address)
+    if key is None:
+        key = _public_keys[address] = encoding.decode_address(address)
+    return key
+
+def application_address(application_ID: int) -> bytes:
+    """ The 32 bytes of the address of an application, as `get_application_address` without the base32 round trip."""
+    return _checksum(b"appID" + application_ID.to_bytes(8, "big"))
+
+# Useful Classes
+# =============================================================================================
+
+# the value of the fields of the sample groups, which do not change their flat fees.
+MAX_UINT = 2 ** 64 - 1
+# the bytes a signed transaction adds to its body: the map, the signature and their keys.
+SIGNATURE_OVERHEAD = len(SIGNED_TXN) + 64 + len(TXN_KEY)
+# a transaction part: the number of keys of its map without the group ID and fee, the fields before the fee, the fields
+# after the last valid round.
+Part = Tuple[int, bytes, bytes]
+
+class GroupTemplate(ABC):
+    """The fields shared by every trade, encoded once per validity window: fees, validity window and genesis."""
+
+    def __init__(self, suggested_params: transaction.SuggestedParams) -> None:
+        self.refresh(suggested_params)
+
+    @abstractmethod
+    def _sample(self, suggested_params: transaction.SuggestedParams) -> List[transaction.Transaction]:
+        """ A group built by the SDK, to take the flat fee of each transaction from."""
+
+    def refresh(self, suggested_params: transaction.SuggestedParams) -> None:
+        """ Encode the fields of a new validity window (and fee), e.g. once per round."""
+        self.first_valid_round = suggested_params.first
+        self.last_valid_round = suggested_params.last
+        # a zero fee (paid by another transaction of the group) is left out of the canonical encoding.
+        self.fees = [K["fee"] + _uint(txn.fee) if txn.fee else b"" for txn in self._sample(suggested_params)]
+        # with fees paid per byte, the SDK sizes each transaction signed, without a group ID and with the fee per byte
+        # as its fee; the fee is that size times the fee per byte, and at least the minimum fee.
+        self.fee_per_byte = 0 if suggested_params.flat_fee else suggested_params.fee
+        self.estimated_fee = K["fee"] + _uint(self.fee_per_byte) if self.fee_per_byte else b""
+        self.window = (
+            K["fv"] + _uint(suggested_params.first)
+            + K["gen"] + _str(suggested_params.gen)
+            + K["gh"] + _bin(base64.b64decode(suggested_params.gh))
+        )
+        self.last = K["lv"] + _uint(suggested_params.last)
+
+    def _sign(self, parts: List[Part], key: SigningKey, txids: Optional[List[str]]) -> bytes:
+        """The signed group of transactions of the parts, as concatenated signed transactions.
+
+        Args:
+            parts: The parts of each transaction, the fee going between the fields before it and the validity window.
+            key: The signing key of the sender of every transaction.
+            txids: A list to append the transaction IDs of the group to, if given.
+        """
+        window, last = self.window, self.last
+        fees = self.fees
+        if self.fee_per_byte:
+            fees = [
+                K["fee"] + _uint(max(
+                    self.fee_per_byte * (
+                        SIGNATURE_OVERHEAD + len(_map(size)) + len(before) + len(self.estimated_fee) + len(window) + len(last)
+                        + len(after)
+                    ),
+                    constants.min_txn_fee,
+                ))
+                for size, before, after in parts
+            ]
+        # the group ID is hashed over the IDs of the transactions without it.
+        bodies = [
+            (size + (1 if fee else 0), before + fee + window, last + after)
+            for (size, before, after), fee in zip(parts, fees)
+        ]
+        group_txids = [_checksum(b"TX" + _map(size) + before + after) for size, before, after in bodies]
+        group = K["grp"] + BIN32 + _checksum(
+            b"TG" + TXLIST + bytes((0x90 | len(parts),)) + b"".join(BIN32 + txid for txid in group_txids)
+        )
+
+        signed: List[bytes] = []
+        for size, before, after in bodies:
+            body = _map(size + 1) + before + group + after
+            message = b"TX" + body
+            signed.append(SIGNED_TXN + key.sign(message).signature + TXN_KEY + body)
+            if txids is not None:
+                txids.append(base64.b32encode(_checksum(message)).decode().strip("="))
+        return b"".join(signed)
+
+class DepositTemplate(GroupTemplate):
+    """The 'deposit' app call and NFT transfer of `deposit_NFT_txns`."""
+
+    def _sample(self, suggested_params: transaction.SuggestedParams) -> List[transaction.Transaction]:
+        seller = Account("", encoding.encode_address(bytes(32)))
+        return deposit_NFT_txns(seller, MAX_UINT, MAX_UINT, suggested_params, MAX_UINT)
+
+    def sign(
+        self,
+        seller: Account,
+        application_ID: int,
+        NFT_ID: int,
+        price: int = DEFAULT_PRICE,
+        txids: Optional[List[str]] = None,
+    ) -> bytes:
+        """The signed deposit group of an NFT in an escrow contract.
+
+        Args:
+            seller: The account depositing the NFT.
+            application_ID: The app ID of the escrow contract.
+            NFT_ID: The NFT ID.
+            price: The price the NFT is sold at, in microAlgos.
+            txids: A list to append the transaction IDs of the group to, if given.
+
+        Returns:
+            The signed transactions of the group, concatenated.
+        """
+        seller_key = public_key(seller.getAddress())
+        sender = K["snd"] + BIN32 + seller_key
+        NFT = _uint(NFT_ID)
+
+        call = (
+            9,
+            K["apaa"] + DEPOSIT_ARGS + seller_key + BIN8 + NFT_ID.to_bytes(8, "big") + BIN8 + price.to_bytes(8, "big")
+            + K["apas"] + b"\x91" + NFT + K["apid"] + _uint(application_ID),
+            sender + K["type"] + APPL,
+        )
+        deposit = (
+            9,
+            K["aamt"] + b"\x01" + K["arcv"] + BIN32 + application_address(application_ID),
+            sender + K["type"] + AXFER + K["xaid"] + NFT,
+        )
+        return self._sign([call, deposit], signing_key(seller), txids)
+
+    def sign_many(self, trades: Iterable[Tuple[Account, int, int, int]]) -> List[bytes]:
+        """ The signed deposit groups of many (seller, app ID, NFT ID, price) trades."""
+        return [self.sign(seller, application_ID, NFT_ID, price) for seller, application_ID, NFT_ID, price in trades]
+
+class BuyTemplate(GroupTemplate):
+    """The buyer opt-in, payment and 'buy' app call of `pay_contract_txns`."""
+
+    def _sample(self, suggested_params: transaction.SuggestedParams) -> List[transaction.Transaction]:
+        buyer = Account("", encoding.encode_address(bytes(32)))
+        state = {b"seller": bytes(32), b"nft_id": MAX_UINT, b"price": MAX_UINT}
+        return pay_contract_txns(MAX_UINT, buyer, state, suggested_params)
+
+    def sign(
+        self,
+        buyer: Account,
+        application_ID: int,
+        seller_address: str,
+        NFT_ID: int,
+        price: int,
+        txids: Optional[List[str]] = None,
+    ) -> bytes:
+        """The signed purchase group of the NFT of an escrow contract.
+
+        Args:
+            buyer: The account buying the NFT.
+            application_ID: The app ID of the escrow contract.
+            seller_address: The seller of the NFT, as in the contract state.
+            NFT_ID: The NFT ID.
+            price: The price of the NFT in the contract state, in microAlgos.
+            txids: A list to append the transaction IDs of the group to, if given.
+
+        Returns:
+            The signed transactions of the group, concatenated.
+        """
+        buyer_key = BIN32 + public_key(buyer.getAddress())
+        sender = K["snd"] + buyer_key
+        NFT = _uint(NFT_ID)
+
+        opt_in = (8, K["arcv"] + buyer_key, sender + K["type"] + AXFER + K["xaid"] + NFT)
+        # a zero value is left out of the canonical encoding.
+        payment = (
+            8 if price else 7,
+            K["amt"] + _uint(price) if price else b"",
+            K["rcv"] + BIN32 + application_address(application_ID) + sender + K["type"] + PAY,
+        )
+        call = (
+            10,
+            K["apaa"] + BUY_ARGS + buyer_key + K["apas"] + b"\x91" + NFT
+            + K["apat"] + b"\x92" + BIN32 + public_key(seller_address) + buyer_key
+            + K["apid"] + _uint(application_ID),
+            sender + K["type"] + APPL,
+        )
+        return self._sign([opt_in, payment, call], signing_key(buyer), txids)
+
+    def sign_many(self, trades: Iterable[Tuple[Account, int, str, int, int]]) -> List[bytes]:
+        """ The signed purchase groups of many (buyer, app ID, seller address, NFT ID, price) trades."""
+        return [self.sign(*trade) for trade in trades]
+
+def send_group(client: AlgodClient, signed_group: bytes) -> str:
+    """ Send a signed group produced by a template, returning the ID of its first transaction."""
+    return client.send_raw_transaction(base64.b64encode(signed_group))
+
+
+if __name__ == "__main__":
+    from algosdk import account
+
+    parser = argparse.ArgumentParser(description="Compare the deposit and buy templates with the SDK code paths.")
+    parser.add_argument("--trades", type=int, default=2000, help="the number of groups to build of each kind")
+    arguments = parser.parse_args()
+
+    def testnet_params(fee: int, flat_fee: bool) -> transaction.SuggestedParams:
+        return transaction.SuggestedParams(
+            fee, 20_000_000, 20_001_000, "SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=", "testnet-v1.0", flat_fee, None,
+            1000,
+        )
+
+    sellers = [Account(account.generate_account()[0]) for _ in range(10)]
+    buyers = [Account(account.generate_account()[0]) for _ in range(10)]
+    trades = [
+        (sellers[index % 10], buyers[index % 10], 1_000_000 + index, 50_000_000 + index, 1_000_000 + index * 7)
+        for index in range(arguments.trades)
+    ]
+
+    def sdk_deposit(seller: Account, application_ID: int, NFT_ID: int, price: int) -> bytes:
+        txns = deposit_NFT_txns(seller, application_ID, NFT_ID, suggested_params, price)
+        signed_txns = [txn.sign(seller.getPrivateKey()) for txn in txns]
+        return b"".join(base64.b64decode(encoding.msgpack_encode(signed_txn)) for signed_txn in signed_txns)
+
+    def sdk_buy(buyer: Account, application_ID: int, seller: Account, NFT_ID: int, price: int) -> bytes:
+        state = {b"seller": encoding.decode_address(seller.getAddress()), b"nft_id": NFT_ID, b"price": price}
+        txns = pay_contract_txns(application_ID, buyer, state, suggested_params)
+        signed_txns = [txn.sign(buyer.getPrivateKey()) for txn in txns]
+        return b"".join(base64.b64decode(encoding.msgpack_encode(signed_txn)) for signed_txn in signed_txns)
+
+    def template_deposit(seller: Account, application_ID: int, NFT_ID: int, price: int) -> bytes:
+        return deposit_template.sign(seller, application_ID, NFT_ID, price)
+
+    def template_buy(buyer: Account, application_ID: int, seller: Account, NFT_ID: int, price: int) -> bytes:
+        return buy_template.sign(buyer, application_ID, seller.getAddress(), NFT_ID, price)
+
+    # the templates must produce exactly the bytes of the SDK path: with a fee per byte above the minimum fee, a flat
+    # fee, a flat fee of 0 (paid by another transaction) and the minimum fee, which the timings below use.
+    for suggested_params in (
+        testnet_params(10, False), testnet_params(2000, True), testnet_params(0, True), testnet_params(0, False)
+    ):
+        deposit_template = DepositTemplate(suggested_params)
+        buy_template = BuyTemplate(suggested_params)
+        for seller, buyer, application_ID, NFT_ID, price in trades[:50] + [(sellers[0], buyers[0], 1, 1, 0)]:
+            deposit_trade = (seller, application_ID, NFT_ID, price)
+            buy_trade = (buyer, application_ID, seller, NFT_ID, price)
+            assert template_deposit(*deposit_trade) == sdk_deposit(*deposit_trade), "deposit bytes differ from the SDK"
+            assert template_buy(*buy_trade) == sdk_buy(*buy_trade), "buy bytes differ from the SDK"
+
+    def timed(function, arguments_of) -> float:
+        started = time.perf_counter()
+        for trade in trades:
+            function(*arguments_of(trade))
+        return (time.perf_counter() - started) / len(trades) * 1e6
+
+    deposit_arguments = lambda trade: (trade[0], trade[2], trade[3], trade[4])
+    buy_arguments = lambda trade: (trade[1], trade[2], trade[0], trade[3], trade[4])
+    results = [
+        ("deposit", timed(sdk_deposit, deposit_arguments), timed(template_deposit, deposit_arguments)),
+        ("buy", timed(sdk_buy, buy_arguments), timed(template_buy, buy_arguments)),
+    ]
+
+    print(f"{'group':<10}{'sdk (us)':>12}{'template (us)':>16}{'speedup':>10}")
+    for name, sdk, template in results:
+        print(f"{name:<10}{sdk:>12.1f}{template:>16.1f}{sdk / template:>9.1f}x")
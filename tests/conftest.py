@@ -0,0 +1,30 @@
+# Python imports
+import os
+import sys
+import tempfile
+from typing import Iterator
+
+import pytest
+
+# the modules live at the root of the repository.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the stub algod "compiles" programs to placeholders, which must not end up in the real artifact cache; the cache
+# directory is read when artifacts.py is imported, so it is set before any test module imports it.
+os.environ["ESCROW_ARTIFACT_DIR"] = tempfile.mkdtemp(prefix="escrow-artifacts-")
+
+from stub_algod import StubAlgodServer, StubLedger
+from accounts import Keyring
+
+
+@pytest.fixture
+def stub_server() -> Iterator[StubAlgodServer]:
+    """ A stub algod node on an ephemeral port, producing blocks on demand."""
+    server = StubAlgodServer(StubLedger(), port=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def keyring() -> Keyring:
+    return Keyring()
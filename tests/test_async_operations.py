@@ -0,0 +1,98 @@
+# Python imports
+import time
+import asyncio
+
+# Algorand library imports.
+from algosdk import encoding
+
+# Import the async client and operations under test.
+from async_client import AsyncAlgodClient
+from async_operations import (
+    create_NFT, create_escrow_contract, deposit_NFT, fund_escrow_contract, get_app_global_state, pay_contract,
+    wait_for_transaction,
+)
+
+# Import the stub algod node the tests run against.
+from stub_algod import StubAlgodServer, StubLedger
+
+
+def test_escrow_lifecycle(stub_server, keyring):
+    creator, seller, buyer = keyring.generate("creator"), keyring.generate("seller"), keyring.generate("buyer")
+
+    async def lifecycle():
+        async with AsyncAlgodClient("", stub_server.address) as client:
+            application_ID = await create_escrow_contract(client, creator)
+            fund_txn_ID = await fund_escrow_contract(client, creator, application_ID)
+            NFT_ID = await create_NFT(seller, client)
+            await deposit_NFT(client, seller, application_ID, NFT_ID, 2_500_000)
+            deposited = await get_app_global_state(client, application_ID)
+            pay_txn_ID = await pay_contract(client, application_ID, buyer)
+            bought = await get_app_global_state(client, application_ID)
+            funded = await wait_for_transaction(client, fund_txn_ID)
+            return application_ID, NFT_ID, deposited, bought, funded, pay_txn_ID
+
+    application_ID, NFT_ID, deposited, bought, funded, pay_txn_ID = asyncio.run(lifecycle())
+
+    assert application_ID in stub_server.ledger.apps
+    assert NFT_ID > 0 and NFT_ID != application_ID
+    assert funded.confirmedRound is not None
+    assert deposited == {
+        b"seller": encoding.decode_address(seller.getAddress()), b"nft_id": NFT_ID, b"price": 2_500_000,
+    }
+    assert bought[b"buyer"] == encoding.decode_address(buyer.getAddress())
+    assert stub_server.ledger.pending_info(pay_txn_ID)["confirmed-round"] > 0
+
+
+def test_concurrent_trades_share_the_connection_pool(stub_server, keyring):
+    # identical transactions of a single creator would share a transaction ID: one creator per trade.
+    creators = [keyring.generate(f"creator-{index}") for index in range(8)]
+    sellers = [keyring.generate(f"seller-{index}") for index in range(8)]
+
+    async def trades():
+        async with AsyncAlgodClient("", stub_server.address, max_connections=4) as client:
+            application_IDs = await asyncio.gather(*(create_escrow_contract(client, creator) for creator in creators))
+            NFT_IDs = await asyncio.gather(*(create_NFT(seller, client) for seller in sellers))
+            await asyncio.gather(*(
+                deposit_NFT(client, seller, application_ID, NFT_ID)
+                for seller, application_ID, NFT_ID in zip(sellers, application_IDs, NFT_IDs)
+            ))
+            states = await asyncio.gather(*(get_app_global_state(client, app_ID) for app_ID in application_IDs))
+            return application_IDs, NFT_IDs, states, client.pool.connections_opened
+
+    application_IDs, NFT_IDs, states, connections_opened = asyncio.run(trades())
+
+    assert len(set(application_IDs)) == len(sellers) and len(set(NFT_IDs)) == len(sellers)
+    assert [state[b"nft_id"] for state in states] == NFT_IDs
+    assert connections_opened <= 4
+
+
+def test_pool_limits_concurrent_requests():
+    # every request takes 50ms on the node: 12 requests over 3 connections take at least 4 rounds of requests.
+    server = StubAlgodServer(StubLedger(), port=0, latency=0.05).start()
+    try:
+        async def requests():
+            async with AsyncAlgodClient("", server.address, max_connections=3) as client:
+                started = time.perf_counter()
+                await asyncio.gather(*(client.status() for _ in range(12)))
+                return time.perf_counter() - started, client.pool.connections_opened
+
+        elapsed, connections_opened = asyncio.run(requests())
+    finally:
+        server.stop()
+
+    assert connections_opened == 3
+    assert elapsed >= 4 * 0.05
+
+
+def test_deposit_in_a_sold_escrow_clears_the_buyer(stub_server, keyring):
+    creator, seller, buyer = keyring.generate("creator"), keyring.generate("seller"), keyring.generate("buyer")
+
+    async def resale():
+        async with AsyncAlgodClient("", stub_server.address) as client:
+            application_ID = await create_escrow_contract(client, creator)
+            await deposit_NFT(client, seller, application_ID, await create_NFT(seller, client))
+            await pay_contract(client, application_ID, buyer)
+            await deposit_NFT(client, seller, application_ID, await create_NFT(seller, client))
+            return await get_app_global_state(client, application_ID)
+
+    assert b"buyer" not in asyncio.run(resale())
@@ -0,0 +1,103 @@
+# Python imports
+import io
+import socket
+import contextlib
+
+import pytest
+
+# Algorand library imports.
+from algosdk import encoding
+
+# Import the client pool under test, and the stub algod nodes it runs against.
+from client_pool import ClientPool
+from stub_algod import StubAlgodServer, StubLedger
+
+# Import the blocking operations run through the pool.
+from operations import create_escrow_contract, deposit_NFT, fund_escrow_contract, pay_contract
+from utils import create_NFT, get_app_global_state
+
+
+@pytest.fixture
+def ledger() -> StubLedger:
+    return StubLedger(start_round=100)
+
+
+@pytest.fixture
+def nodes(ledger):
+    """ Three stub nodes over the same ledger, the last one slow."""
+    servers = [
+        StubAlgodServer(ledger).start(),
+        StubAlgodServer(ledger).start(),
+        StubAlgodServer(ledger, latency=0.05).start(),
+    ]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def unused_address() -> str:
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{unused.getsockname()[1]}"
+
+
+def trade(client, keyring):
+    creator, seller, buyer = keyring.generate("creator"), keyring.generate("seller"), keyring.generate("buyer")
+    with contextlib.redirect_stdout(io.StringIO()):
+        application_ID = create_escrow_contract(client, creator)
+        fund_escrow_contract(client, creator, application_ID)
+        NFT_ID = create_NFT(seller, client)
+        deposit_NFT(client, seller, application_ID, NFT_ID, 3_000_000)
+        pay_contract(client, application_ID, buyer)
+    return application_ID, buyer
+
+
+def test_lifecycle_fails_over_from_dead_and_stopped_nodes(nodes, keyring):
+    pool = ClientPool([unused_address()] + [server.address for server in nodes], "", cooldown=60)
+    nodes[0].stop()
+
+    application_ID, buyer = trade(pool, keyring)
+
+    assert get_app_global_state(pool, application_ID)[b"buyer"] == encoding.decode_address(buyer.getAddress())
+    stats = pool.stats()
+    assert not stats[0]["available"] and stats[0]["failures"] > 0
+    assert not stats[1]["available"] and stats[1]["failures"] > 0
+    assert stats[2]["available"] and stats[3]["available"]
+
+
+def test_reads_go_to_the_fastest_node(nodes):
+    pool = ClientPool([server.address for server in nodes], "")
+    for _ in range(10):
+        pool.status()
+
+    first, second, slow = pool.stats()
+    # the slow node is only asked by the health check, every read goes to one of the fast ones.
+    assert slow["requests"] == 1
+    assert first["requests"] + second["requests"] == 2 + 10
+
+
+def test_reads_never_go_behind_the_latest_round_seen(nodes, ledger, keyring):
+    # a node stuck 10 rounds behind, with none of the apps of the others.
+    behind = StubAlgodServer(StubLedger(start_round=90)).start()
+    try:
+        pool = ClientPool([behind.address] + [server.address for server in nodes[:2]], "")
+        trade(pool, keyring)
+    finally:
+        behind.stop()
+
+    # only health checks went there: no read of a state it does not have, no submission it would lose.
+    assert set(behind.ledger.request_counts) == {"status"}
+
+
+def test_a_confirmed_round_moves_reads_to_the_nodes_that_have_it(nodes, ledger):
+    pool = ClientPool([server.address for server in nodes[:2]], "", submit_lag=2)
+    pool.check()
+    first, second = pool.endpoints
+
+    # the first node confirms a transaction one round after the last health check.
+    pool._succeeded(first, {"confirmed-round": ledger.round + 1, "pool-error": ""}, None)
+
+    assert pool._order(submission=False) == [first, second]
+    assert set(pool._order(submission=True)) == {first, second}
+    second.last_round = ledger.round + 1
+    assert set(pool._order(submission=False)) == {first, second}
@@ -0,0 +1,211 @@
+# Python imports
+import pytest
+
+# Algorand library imports.
+from algosdk import encoding
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+
+# Import the simulated ledger the contracts run on.
+from simulator import SimulatedAlgod
+
+# Import the operations and helpers driving the contracts.
+from operations import (
+    buy_listing, buy_listing_txns, cancel_listing, create_escrow_contract, create_multi_listing_contract, deposit_NFT,
+    fund_escrow_contract, fund_multi_listing_contract, list_NFT, pay_contract, pay_contract_txns,
+)
+from utils import Listing, create_NFT, get_app_global_state, get_listings, sign_and_send, sign_txns
+
+
+@pytest.fixture
+def client() -> SimulatedAlgod:
+    return SimulatedAlgod(default_balance=10**12)
+
+
+def deposit_call(sender, application_ID, NFT_ID, price, client):
+    """ A lone 'deposit' app call, without the NFT transfer of `deposit_NFT_txns`."""
+    return transaction.ApplicationCallTxn(
+        sender=sender.getAddress(),
+        index=application_ID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=[b"deposit", encoding.decode_address(sender.getAddress()), NFT_ID.to_bytes(8, "big"),
+                  price.to_bytes(8, "big")],
+        foreign_assets=[NFT_ID],
+        sp=client.suggested_params(),
+    )
+
+
+def send_group(client, txns, signers):
+    """ Group transactions signed by several accounts, one per transaction, send them and wait for the next round."""
+    for txn in txns:
+        txn.group = None
+    transaction.assign_group_id(txns)
+    client.send_transactions([sign_txns([txn], signer)[0] for txn, signer in zip(txns, signers)])
+    client.status_after_block(client.status()["last-round"])
+
+
+@pytest.fixture
+def escrow(client, keyring):
+    """ A funded escrow contract holding an NFT of the seller, for sale at 5 Algo."""
+    creator, seller = keyring.generate("creator"), keyring.generate("seller")
+    application_ID = create_escrow_contract(client, creator)
+    fund_escrow_contract(client, creator, application_ID)
+    NFT_ID = create_NFT(seller, client)
+    deposit_NFT(client, seller, application_ID, NFT_ID, 5_000_000)
+    return application_ID, seller, NFT_ID
+
+
+# The escrow contract
+# =============================================================================================
+
+def test_deposit_over_a_listed_NFT_is_rejected(client, keyring, escrow):
+    application_ID, seller, NFT_ID = escrow
+    attacker = keyring.generate("attacker")
+
+    # the listing of the seller rewritten at a price of 0, without depositing anything.
+    with pytest.raises(AlgodHTTPError):
+        sign_and_send(client, [deposit_call(attacker, application_ID, NFT_ID, 0, client)], attacker)
+    # a real deposit of another NFT does not replace an unsold one either.
+    with pytest.raises(AlgodHTTPError):
+        deposit_NFT(client, attacker, application_ID, create_NFT(attacker, client), 0)
+
+    state = get_app_global_state(client, application_ID)
+    assert state[b"seller"] == encoding.decode_address(seller.getAddress()) and state[b"price"] == 5_000_000
+    # so buying it still costs its price.
+    pay_contract(client, application_ID, attacker)
+    assert client.ledger.state.balance(seller.getAddress()) == 10**12 + 5_000_000 - 3 * 1_000
+
+
+def test_deposit_needs_the_NFT_transfer_of_the_sender(client, keyring):
+    creator, seller, other = keyring.generate("creator"), keyring.generate("seller"), keyring.generate("other")
+    application_ID = create_escrow_contract(client, creator)
+    fund_escrow_contract(client, creator, application_ID)
+    NFT_ID = create_NFT(seller, client)
+
+    # no NFT transfer.
+    with pytest.raises(AlgodHTTPError):
+        sign_and_send(client, [deposit_call(seller, application_ID, NFT_ID, 1, client)], seller)
+    # a deposit in the name of another account.
+    with pytest.raises(AlgodHTTPError):
+        deposit_NFT(client, other, application_ID, NFT_ID, 1)
+    assert get_app_global_state(client, application_ID) == {}
+
+
+def test_deposit_after_a_sale_reuses_the_escrow(client, keyring, escrow):
+    application_ID, seller, _ = escrow
+    pay_contract(client, application_ID, keyring.generate("buyer"))
+    # the fees of the inner transactions of the sale are topped up, as the escrow pool does.
+    fund_escrow_contract(client, keyring.generate("creator"), application_ID)
+
+    NFT_ID = create_NFT(seller, client)
+    deposit_NFT(client, seller, application_ID, NFT_ID, 2_000_000)
+
+    state = get_app_global_state(client, application_ID)
+    assert b"buyer" not in state and state[b"nft_id"] == NFT_ID and state[b"price"] == 2_000_000
+
+
+def test_buy_needs_the_price_paid_to_the_contract_by_the_caller(client, keyring, escrow):
+    application_ID, _, _ = escrow
+    buyer, payer = keyring.generate("buyer"), keyring.generate("payer")
+    state = get_app_global_state(client, application_ID)
+
+    def buy(tamper, payment_signer=buyer):
+        opt_in, payment, call = pay_contract_txns(application_ID, buyer, state, client.suggested_params())
+        tamper(payment)
+        send_group(client, [opt_in, payment, call], [buyer, payment_signer, buyer])
+
+    def short(payment):
+        payment.amt -= 1
+    def elsewhere(payment):
+        payment.receiver = payer.getAddress()
+    def by_another(payment):
+        payment.sender = payer.getAddress()
+
+    for tamper, payment_signer in ((short, buyer), (elsewhere, buyer), (by_another, payer)):
+        with pytest.raises(AlgodHTTPError):
+            buy(tamper, payment_signer)
+    assert b"buyer" not in get_app_global_state(client, application_ID)
+
+    buy(lambda payment: None)
+    assert get_app_global_state(client, application_ID)[b"buyer"] == encoding.decode_address(buyer.getAddress())
+
+
+def test_a_sold_NFT_cannot_be_bought_again(client, keyring, escrow):
+    application_ID, _, _ = escrow
+    buyer, second_buyer = keyring.generate("buyer"), keyring.generate("second buyer")
+    pay_contract(client, application_ID, buyer)
+
+    with pytest.raises(AlgodHTTPError):
+        pay_contract(client, application_ID, second_buyer)
+    assert get_app_global_state(client, application_ID)[b"buyer"] == encoding.decode_address(buyer.getAddress())
+
+
+# The multi-listing contract
+# =============================================================================================
+
+@pytest.fixture
+def listed(client, keyring):
+    """ A funded multi-listing contract with an NFT of the seller listed at 5 Algo."""
+    creator, seller = keyring.generate("creator"), keyring.generate("seller")
+    application_ID = create_multi_listing_contract(client, creator)
+    fund_multi_listing_contract(client, creator, application_ID)
+    NFT_ID = create_NFT(seller, client)
+    list_NFT(client, seller, application_ID, NFT_ID, 5_000_000)
+    return application_ID, seller, NFT_ID
+
+
+def test_a_listed_NFT_cannot_be_listed_again(client, keyring):
+    creator, seller = keyring.generate("creator"), keyring.generate("seller")
+    application_ID = create_multi_listing_contract(client, creator)
+    fund_multi_listing_contract(client, creator, application_ID)
+    # an asset of 2 units, so the seller still holds one to send with a second listing.
+    sign_and_send(client, [transaction.AssetConfigTxn(
+        seller.getAddress(), client.suggested_params(), total=2, default_frozen=False, strict_empty_address_check=False,
+    )], seller)
+    client.status_after_block(client.status()["last-round"])
+    NFT_ID = client.account_info(seller.getAddress())["created-assets"][0]["index"]
+    list_NFT(client, seller, application_ID, NFT_ID, 5_000_000)
+
+    with pytest.raises(AlgodHTTPError):
+        list_NFT(client, seller, application_ID, NFT_ID, 1)
+
+    assert get_listings(client, application_ID)[NFT_ID] == Listing(NFT_ID, seller.getAddress(), 5_000_000)
+
+
+def test_only_the_seller_cancels_a_listing(client, keyring, listed):
+    application_ID, seller, NFT_ID = listed
+    other = keyring.generate("other")
+    # opted into the NFT, so only the seller check stands in the way.
+    sign_and_send(client, [transaction.AssetTransferTxn(
+        other.getAddress(), client.suggested_params(), other.getAddress(), 0, NFT_ID
+    )], other)
+    client.status_after_block(client.status()["last-round"])
+
+    with pytest.raises(AlgodHTTPError):
+        cancel_listing(client, other, application_ID, NFT_ID)
+    assert NFT_ID in get_listings(client, application_ID)
+
+    cancel_listing(client, seller, application_ID, NFT_ID)
+    assert get_listings(client, application_ID) == {}
+    assert client.ledger.state.holding(seller.getAddress(), NFT_ID) == 1
+
+
+def test_a_listing_is_bought_at_its_price(client, keyring, listed):
+    application_ID, seller, NFT_ID = listed
+    buyer = keyring.generate("buyer")
+    listing = get_listings(client, application_ID)[NFT_ID]
+
+    with pytest.raises(AlgodHTTPError):
+        buy_listing(client, buyer, application_ID, NFT_ID, listing._replace(price=listing.price - 1))
+    opt_in, payment, call = buy_listing_txns(buyer, application_ID, listing, client.suggested_params())
+    payment.receiver = seller.getAddress()
+    with pytest.raises(AlgodHTTPError):
+        send_group(client, [opt_in, payment, call], [buyer, buyer, buyer])
+    assert NFT_ID in get_listings(client, application_ID)
+
+    buy_listing(client, buyer, application_ID, NFT_ID)
+    assert get_listings(client, application_ID) == {}
+    assert client.ledger.state.holding(buyer.getAddress(), NFT_ID) == 1
+    # a second purchase finds no listing.
+    with pytest.raises(AlgodHTTPError):
+        buy_listing(client, keyring.generate("second buyer"), application_ID, NFT_ID, listing)
@@ -0,0 +1,69 @@
+# Python imports
+import pytest
+
+# Import the cache under test and the block follower feeding it.
+from state_cache import GlobalStateCache
+from follower import BlockFollower, ListingIndex
+
+# Import the simulated ledger and the operations calling the escrow contract.
+from simulator import SimulatedAlgod
+from operations import create_escrow_contract, deposit_NFT, fund_escrow_contract, pay_contract
+from utils import create_NFT, get_app_global_state
+
+
+@pytest.fixture
+def client() -> SimulatedAlgod:
+    return SimulatedAlgod(default_balance=10**12)
+
+
+def wait_rounds(client, rounds):
+    for _ in range(rounds):
+        client.status_after_block(client.status()["last-round"])
+
+
+def test_steady_state_trading_does_not_fetch(client, keyring):
+    cache = GlobalStateCache(client)
+    creator, seller, buyer = keyring.generate("creator"), keyring.generate("seller"), keyring.generate("buyer")
+
+    application_ID = create_escrow_contract(client, creator, state_cache=cache)
+    fund_escrow_contract(client, creator, application_ID)
+    deposit_NFT(client, seller, application_ID, create_NFT(seller, client), state_cache=cache)
+    # rounds pass without any call of the app: nothing to fetch again.
+    wait_rounds(client, 10)
+    pay_contract(client, application_ID, buyer, state_cache=cache)
+
+    assert cache.fetches == 0 and client.ledger.request_counts.get("application_info", 0) == 0
+    assert cache.get(application_ID) == get_app_global_state(client, application_ID)
+
+
+def test_a_call_by_another_client_is_fetched_again(client, keyring):
+    cache = GlobalStateCache(client)
+    follower = BlockFollower(client, ListingIndex(), start_round=client.status()["last-round"])
+    cache.follow(follower)
+    creator, seller, buyer = keyring.generate("creator"), keyring.generate("seller"), keyring.generate("buyer")
+
+    application_ID = create_escrow_contract(client, creator, state_cache=cache)
+    fund_escrow_contract(client, creator, application_ID)
+    deposit_NFT(client, seller, application_ID, create_NFT(seller, client), state_cache=cache)
+    follower.catch_up()
+    # the calls of the operations are matched with the follower's, and trusted.
+    assert cache.get(application_ID)[b"price"] == 1_000_000 and cache.fetches == 0
+
+    # another client, without the cache, buys the NFT.
+    pay_contract(client, application_ID, buyer)
+    follower.catch_up()
+
+    assert b"buyer" in cache.get(application_ID)
+    assert cache.fetches == 1
+
+
+def test_a_fetch_is_stamped_with_the_round_of_the_node(client, keyring):
+    cache = GlobalStateCache(client)
+    creator, seller = keyring.generate("creator"), keyring.generate("seller")
+    application_ID = create_escrow_contract(client, creator)
+    fund_escrow_contract(client, creator, application_ID)
+    deposit_NFT(client, seller, application_ID, create_NFT(seller, client))
+
+    cache.get(application_ID)
+
+    assert cache.fetched_rounds[application_ID] == client.status()["last-round"]
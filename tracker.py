@@ -0,0 +1,252 @@
+# Python imports
+import threading
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+# Algorand library imports.
+from algosdk.v2client.algod import AlgodClient
+from algosdk.future.transaction import SignedTransaction
+
+# Import utility classes.
+from utils import Pending_txn_response
+
+# A single confirmation tracker follows the chain one round at a time and checks every registered transaction once
+# per round, instead of each caller running its own `pending_transaction_info` / `status_after_block` loop. Any number
+# of threads can wait on it: whichever thread gets there first drives the polling, the others just wait for their
+# futures. Alternatively, `start` runs the polling in a background thread.
+
+class TransactionExpired(Exception):
+    """Raised for a transaction that can no longer be confirmed: its timeout or last valid round has passed."""
+
+class _Entry:
+    """A group of transactions confirmed together, checked through its first transaction ID."""
+
+    def __init__(self, txids: List[str], expiry_round: int, timeout: Optional[int]) -> None:
+        self.txids = txids
+        self.expiry_round = expiry_round
+        self.timeout = timeout
+        self.futures: List[Future] = [Future() for _ in txids]
+
+class ConfirmationTracker:
+    """Tracks the confirmation of many transactions, checking all of them once per round."""
+
+    def __init__(self, client: AlgodClient, timeout: int = 10) -> None:
+        self.client = client
+        self.timeout = timeout
+        self.last_round: Optional[int] = None
+
+        self.entries: Dict[str, _Entry] = dict()
+        self.futures: Dict[str, Future] = dict()
+        self.round_listeners: List[Callable[[int], None]] = []
+
+        # guards the registered entries, and makes sure a single thread talks to algod at a time.
+        self.lock = threading.Lock()
+        self.drive_lock = threading.Lock()
+        self.registered = threading.Event()
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def current_round(self) -> int:
+        if self.last_round is None:
+            self.advance_to(self.client.status()["last-round"])
+        return self.last_round
+
+    def add_round_listener(self, listener: Callable[[int], None]) -> None:
+        """ Call `listener` with the round number every time the tracker sees a new round."""
+        self.round_listeners.append(listener)
+
+    def advance_to(self, round: int) -> None:
+        if self.last_round is not None and round <= self.last_round:
+            return
+        self.last_round = round
+        for listener in self.round_listeners:
+            listener(round)
+
+    # Registering transactions
+    # =============================================================================================
+
+    def register_group(
+        self,
+        txids: List[str],
+        last_valid: Optional[int] = None,
+        timeout: Optional[int] = None,
+        callback: Optional[Callable[[Pending_txn_response], None]] = None,
+    ) -> List[Future]:
+        """Register a group of transactions sent together, which are confirmed (or rejected) in the same round.
+
+        Args:
+            txids: The transaction IDs of the group.
+            last_valid: The last valid round of the transactions, after which they can no longer be confirmed.
+            timeout: The number of rounds to wait when the last valid round is not given, the tracker default if None.
+            callback: Called with the response of each transaction once it is confirmed.
+
+        Returns:
+            A list of futures, one per transaction, resolving to their Pending_txn_response.
+        """
+        with self.lock:
+            if txids[0] in self.futures:
+                return [self.futures[txid] for txid in txids]
+
+            timeout = self.timeout if timeout is None else timeout
+            # the round at which the group can no longer be confirmed.
+            expiry_round = last_valid + 1 if last_valid is not None else self.current_round() + timeout
+            entry = _Entry(list(txids), expiry_round, None if last_valid is not None else timeout)
+            self.entries[txids[0]] = entry
+            self.futures.update(zip(txids, entry.futures))
+
+        if callback is not None:
+            def on_done(future: Future) -> None:
+                if future.exception() is None:
+                    callback(future.result())
+
+            for future in entry.futures:
+                future.add_done_callback(on_done)
+        self.registered.set()
+        return entry.futures
+
+    def register(
+        self,
+        txid: str,
+        last_valid: Optional[int] = None,
+        timeout: Optional[int] = None,
+        callback: Optional[Callable[[Pending_txn_response], None]] = None,
+    ) -> Future:
+        """ Register a single transaction, see `register_group`."""
+        return self.register_group([txid], last_valid, timeout, callback)[0]
+
+    def track(self, signed_txns: List[SignedTransaction]) -> List[Future]:
+        """ Register a sent group of signed transactions, expiring it at the last valid round of its transactions."""
+        return self.register_group(
+            [signed_txn.get_txid() for signed_txn in signed_txns],
+            last_valid=min(signed_txn.transaction.last_valid_round for signed_txn in signed_txns),
+        )
+
+    # Polling
+    # =============================================================================================
+
+    def poll(self) -> int:
+        """Check every registered transaction at the current round, then wait for the next round if any are left.
+
+        Returns:
+            The last round seen.
+        """
+        with self.drive_lock:
+            self._poll()
+            return self.last_round
+
+    def _poll(self) -> None:
+        self.current_round()
+        with self.lock:
+            entries = list(self.entries.values())
+
+        for entry in entries:
+            self._check(entry)
+
+        with self.lock:
+            if not self.entries:
+                self.registered.clear()
+                return
+
+        self.advance_to(self.client.status_after_block(self.last_round + 1)["last-round"])
+
+    def _check(self, entry: _Entry) -> None:
+        try:
+            pending_txn = self.client.pending_transaction_info(entry.txids[0])
+        except Exception as error:
+            self._resolve(entry, error=error)
+            return
+
+        if pending_txn.get("confirmed-round", 0) > 0:
+            try:
+                responses = [pending_txn] + [self.client.pending_transaction_info(txid) for txid in entry.txids[1:]]
+            except Exception as error:
+                self._resolve(entry, error=error)
+                return
+            self._resolve(entry, responses=[Pending_txn_response(response) for response in responses])
+        elif pending_txn["pool-error"]:
+            self._resolve(entry, error=Exception("Pool error: {}".format(pending_txn["pool-error"])))
+        elif self.last_round >= entry.expiry_round:
+            if entry.timeout is not None:
+                message = "Transaction {} not confirmed after {} rounds".format(entry.txids[0], entry.timeout)
+            else:
+                message = "Transaction {} expired after round {}".format(entry.txids[0], entry.expiry_round - 1)
+            self._resolve(entry, error=TransactionExpired(message))
+
+    def _resolve(
+        self, entry: _Entry, responses: Optional[List[Pending_txn_response]] = None, error: Optional[Exception] = None
+    ) -> None:
+        with self.lock:
+            del self.entries[entry.txids[0]]
+            for txid in entry.txids:
+                del self.futures[txid]
+
+        for index, future in enumerate(entry.futures):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(responses[index])
+
+    # Waiting
+    # =============================================================================================
+
+    def wait_any(self, futures: Iterable[Future]) -> Set[Future]:
+        """Wait until at least one of the futures is done, polling algod from this thread if no other thread is.
+
+        Returns:
+            The set of futures that are done.
+        """
+        futures = list(futures)
+        while True:
+            done = {future for future in futures if future.done()}
+            if done or not futures:
+                return done
+
+            if self.thread is None and self.drive_lock.acquire(blocking=False):
+                try:
+                    self._poll()
+                finally:
+                    self.drive_lock.release()
+            else:
+                # someone else is polling, the round they are waiting on resolves our futures too.
+                wait(futures, timeout=0.5, return_when=FIRST_COMPLETED)
+
+    def wait(self, future: Future) -> Pending_txn_response:
+        """ Wait for a registered transaction and return its response, raising if it failed."""
+        self.wait_any([future])
+        return future.result()
+
+    def wait_all(self, futures: Iterable[Future]) -> List[Pending_txn_response]:
+        return [self.wait(future) for future in futures]
+
+    # Background polling
+    # =============================================================================================
+
+    def start(self) -> "ConfirmationTracker":
+        """ Poll algod from a background thread, so waiting callers never have to."""
+        if self.thread is None:
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name="confirmation-tracker", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self.thread is not None:
+            self.stopping.set()
+            self.registered.set()
+            self.thread.join()
+            self.thread = None
+
+    def _run(self) -> None:
+        while not self.stopping.is_set():
+            self.registered.wait()
+            if self.stopping.is_set():
+                return
+            with self.drive_lock:
+                try:
+                    self._poll()
+                except Exception as error:
+                    # a failure talking to algod fails everything currently registered rather than the thread.
+                    with self.lock:
+                        entries = list(self.entries.values())
+                    for entry in entries:
+                        self._resolve(entry, error=error)
@@ -1,23 +1,39 @@
 # Python imports
 import os
-from typing import List, Dict, Any, Optional, Union
-from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple, Union, TYPE_CHECKING
+from base64 import b64decode, b64encode
 
 # Algorand library and Pyteal imports.
 from algosdk.v2client.algod import AlgodClient
-from algosdk.future.transaction import AssetConfigTxn, wait_for_confirmation
-from algosdk import account, mnemonic
+from algosdk.future.transaction import AssetConfigTxn, SignedTransaction, SuggestedParams, Transaction
+from algosdk import account, constants, encoding, mnemonic
+from nacl.signing import SigningKey
 from pyteal import compileTeal, Mode, Expr
 
+# Compiled program artifact cache.
+from artifacts import default_cache, TEAL_VERSION
+
+# Instrumentation of the trade stages.
+from instrumentation import instrumented, span
+
+if TYPE_CHECKING:
+    from tracker import ConfirmationTracker
+    from params import SuggestedParamsProvider
+    from state_cache import GlobalStateCache
+    from scheduler import SubmissionScheduler
+    from client_pool import ClientPool
+
 # Useful Classes 
 # =============================================================================================
 
 class Account:
     """Represents a private key and address for an Algorand account"""
 
-    def __init__(self, privateKey: str) -> None:
+    def __init__(self, privateKey: str, address: Optional[str] = None) -> None:
         self.sk = privateKey
-        self.addr = account.address_from_private_key(privateKey)
+        # the address can be passed when already known (e.g. by the keyring), to skip deriving it again.
+        self.addr = account.address_from_private_key(privateKey) if address is None else address
 
     def getAddress(self) -> str:
         return self.addr
@@ -56,74 +72,198 @@ class Pending_txn_response:
 # ============================================================================================= 
 
 def fully_compile_contract(client: AlgodClient, contract: Expr) -> bytes:
-    teal = compileTeal(contract, mode=Mode.Application, version=5)
-    response = client.compile(teal)
-    return b64decode(response["result"])
+    with span("stage", stage="pyteal_compile"):
+        teal = compileTeal(contract, mode=Mode.Application, version=TEAL_VERSION)
+    return default_cache.compile(client, teal).program
+
+ALGOD_ADDRESS = "http://localhost:4001"
+ALGOD_TOKEN = "aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"
+
+# the client pool over the nodes of ALGOD_ADDRESSES, shared by the whole process.
+_client_pool: Optional["ClientPool"] = None
 
 def get_client():
-    algod_address = "http://localhost:4001"
-    algod_token = "aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"
+    """ A client of the sandbox node, or the client pool over the nodes of ALGOD_ADDRESSES (comma separated) if set."""
+    global _client_pool
+    addresses = os.environ.get("ALGOD_ADDRESSES")
+    if addresses:
+        if _client_pool is None:
+            from client_pool import ClientPool
+            token = os.environ.get("ALGOD_TOKEN", ALGOD_TOKEN)
+            _client_pool = ClientPool([address.strip() for address in addresses.split(",")], token).start()
+        return _client_pool
+
+    algod_address = ALGOD_ADDRESS
+    algod_token = ALGOD_TOKEN
     algod_client = AlgodClient(algod_token, algod_address)
     return algod_client
 
+def get_suggested_params(
+    client: AlgodClient, params: Optional["SuggestedParamsProvider"] = None
+) -> SuggestedParams:
+    """ Suggested params from the shared provider if one is given, or straight from the node otherwise."""
+    with span("stage", stage="suggested_params"):
+        if params is not None:
+            return params.get()
+        return client.suggested_params()
+
+# the signing keys of the accounts, by address, decoded from their private keys once per process.
+_signing_keys: Dict[str, SigningKey] = dict()
+
+def signing_key(signer: Account) -> SigningKey:
+    """ The signing key of an account, decoded from its private key on first use."""
+    key = _signing_keys.get(signer.getAddress())
+    if key is None:
+        key = _signing_keys[signer.getAddress()] = SigningKey(
+            b64decode(signer.getPrivateKey())[:constants.key_len_bytes]
+        )
+    return key
+
+def sign_txns(txns: List[Transaction], signer: Account) -> List[SignedTransaction]:
+    """ Sign transactions by an account, as `txn.sign` does, without decoding its private key every time."""
+    key = signing_key(signer)
+    address = signer.getAddress()
+    return [
+        SignedTransaction(
+            txn,
+            b64encode(key.sign(constants.txid_prefix + b64decode(encoding.msgpack_encode(txn))).signature).decode(),
+            # a rekeyed sender is signed for by another account.
+            None if txn.sender == address else address,
+        )
+        for txn in txns
+    ]
+
+def sign_and_send(client: AlgodClient, txns: List[Transaction], signer: Account) -> List[SignedTransaction]:
+    """ Sign transactions (a single one, or a group) by an account and submit them together."""
+    with span("stage", stage="sign"):
+        signed_txns = sign_txns(txns, signer)
+    with span("stage", stage="submit"):
+        client.send_transactions(signed_txns)
+    return signed_txns
+
+def send_and_wait(
+    client: AlgodClient,
+    txns: List[Transaction],
+    signer: Account,
+    waited: int = -1,
+    tracker: Optional["ConfirmationTracker"] = None,
+    scheduler: Optional["SubmissionScheduler"] = None,
+) -> Tuple[List[SignedTransaction], Pending_txn_response]:
+    """Sign and send transactions (a single one, or a group) by an account, and wait for them.
+
+    Args:
+        client: An algod client.
+        txns: The transactions, grouped already if there are several.
+        signer: The account signing every transaction.
+        waited: The index of the transaction whose response is returned.
+        tracker: A confirmation tracker to wait on, if any.
+        scheduler: A submission scheduler to go through, if any; the transactions are then re-signed with a fresh
+            validity window if they expire, so the signed transactions returned are the ones that got confirmed.
+
+    Returns:
+        The signed transactions, and the response of the waited transaction.
+    """
+    if scheduler is None:
+        signed_txns = sign_and_send(client, txns, signer)
+        return signed_txns, wait_for_transaction(client, signed_txns[waited].get_txid(), tracker=tracker)
+
+    with span("stage", stage="submit"):
+        future = scheduler.submit(txns, signer)
+    with span("stage", stage="confirmation"):
+        result = future.result()
+    return result.signed_txns, result.responses[waited]
+
 def wait_for_transaction(
-    client: AlgodClient, txID: str, timeout: int = 10
+    client: AlgodClient, txID: str, timeout: int = 10, tracker: Optional["ConfirmationTracker"] = None
 ) -> Pending_txn_response:
-    lastStatus = client.status()
-    lastRound = lastStatus["last-round"]
-    startRound = lastRound
+    with span("stage", stage="confirmation") as confirmation_span:
+        if tracker is not None:
+            # share the tracker's round-by-round polling with every other waiting transaction.
+            startRound = tracker.current_round()
+            response = tracker.wait(tracker.register(txID, timeout=timeout))
+            if response.confirmedRound is not None:
+                confirmation_span.tag(rounds=max(response.confirmedRound - startRound, 0))
+            return response
+
+        lastStatus = client.status()
+        lastRound = lastStatus["last-round"]
+        startRound = lastRound
 
-    while lastRound < startRound + timeout:
-        pending_txn = client.pending_transaction_info(txID)
+        while lastRound < startRound + timeout:
+            pending_txn = client.pending_transaction_info(txID)
 
-        if pending_txn.get("confirmed-round", 0) > 0:
-            return Pending_txn_response(pending_txn)
+            if pending_txn.get("confirmed-round", 0) > 0:
+                confirmation_span.tag(rounds=pending_txn["confirmed-round"] - startRound)
+                return Pending_txn_response(pending_txn)
 
-        if pending_txn["pool-error"]:
-            raise Exception("Pool error: {}".format(pending_txn["pool-error"]))
+            if pending_txn["pool-error"]:
+                raise Exception("Pool error: {}".format(pending_txn["pool-error"]))
 
-        lastStatus = client.status_after_block(lastRound + 1)
+            lastStatus = client.status_after_block(lastRound + 1)
 
-        lastRound += 1
+            lastRound += 1
 
     raise Exception(
         "Transaction {} not confirmed after {} rounds".format(txID, timeout)
     )
 
-def create_NFT(seller: Account):
-    """ Create NFT in the sender account. 
-    Args: 
-        Seller: A seller account.
-    
-    Returns: 
-        NFT_ID: The NFT ID.
-    """
-
-    algod_client = get_client()
+def carbon_credit_txn(
+    seller: Account,
+    suggested_params: SuggestedParams,
+    unit_name: str = "CC",
+    asset_name: str = "Carbon Credit: 1 Ton",
+    url: Optional[str] = None,
+    metadata_hash: Optional[bytes] = None,
+    note: Optional[bytes] = None,
+) -> AssetConfigTxn:
+    """ The transaction creating a carbon credit NFT managed by the seller."""
     seller_address = seller.getAddress()
 
-    create_NFT_txn = AssetConfigTxn(sender=seller_address,
-                        sp=algod_client.suggested_params(),
+    return AssetConfigTxn(sender=seller_address,
+                        sp=suggested_params,
                         total=1,          
                         default_frozen=False,
-                        unit_name="CC",
-                        asset_name="Carbon Credit: 1 Ton",
+                        unit_name=unit_name,
+                        asset_name=asset_name,
                         manager=seller_address,
                         reserve=seller_address,
                         freeze=seller_address,
                         clawback=seller_address,
+                        url=url,
+                        metadata_hash=metadata_hash,
+                        note=note,
                         decimals=0)       
 
-    signed_NFT_txn = create_NFT_txn.sign(seller.getPrivateKey())
-    NFT_creation_txn = algod_client.send_transaction(signed_NFT_txn)
-    print(f"NFT creation transaction ID: {NFT_creation_txn}")
-    wait_for_confirmation(algod_client, NFT_creation_txn)
+@instrumented(result_tag="nft_id")
+def create_NFT(
+    seller: Account,
+    client: Optional[AlgodClient] = None,
+    tracker: Optional["ConfirmationTracker"] = None,
+    params: Optional["SuggestedParamsProvider"] = None,
+    scheduler: Optional["SubmissionScheduler"] = None,
+):
+    """ Create NFT in the sender account. 
+    Args: 
+        Seller: A seller account.
+        client: An algod client, a new one if not given.
+        tracker: A confirmation tracker to wait on, if any.
+        params: A suggested params provider to build the transaction with, if any.
+        scheduler: A submission scheduler to send the transaction through, if any.
+    
+    Returns: 
+        NFT_ID: The NFT ID.
+    """
 
-    try:
-        pending_txn= algod_client.pending_transaction_info(NFT_creation_txn)
-        NFT_ID = pending_txn["asset-index"]
-    except Exception as error:
-        print(error)
+    algod_client = get_client() if client is None else client
+
+    create_NFT_txn = carbon_credit_txn(seller, get_suggested_params(algod_client, params))
+
+    # the confirmed response already carries the asset index.
+    (signed_NFT_txn,), response = send_and_wait(
+        algod_client, [create_NFT_txn], seller, tracker=tracker, scheduler=scheduler
+    )
+    print(f"NFT creation transaction ID: {signed_NFT_txn.get_txid()}")
+    NFT_ID = response.assetIndex
 
     return NFT_ID
 
@@ -152,12 +292,72 @@ def decodeState(stateArray: List[Any]) -> Dict[bytes, Union[int, bytes]]:
 
     return state
 
+def applyStateDelta(state: Dict[bytes, Union[int, bytes]], delta: List[Any]) -> None:
+    """ Apply a global state delta, as found in a confirmed transaction, to a decoded state in place."""
+    for pair in delta:
+        key = b64decode(pair["key"])
+
+        value = pair["value"]
+        action = value["action"]
+
+        if action == 1:
+            # set a byte array
+            state[key] = b64decode(value.get("bytes", ""))
+        elif action == 2:
+            # set a uint64
+            state[key] = value.get("uint", 0)
+        elif action == 3:
+            # delete
+            state.pop(key, None)
+        else:
+            raise Exception(f"Unexpected state delta action: {action}")
+
 def get_app_global_state(
-    client: AlgodClient, appID: int
+    client: AlgodClient, appID: int, state_cache: Optional["GlobalStateCache"] = None
 ) -> Dict[bytes, Union[int, bytes]]:
+    if state_cache is not None:
+        return state_cache.get(appID)
     appInfo = client.application_info(appID)
     return decodeState(appInfo["params"]["global-state"])
 
+def get_app_global_states(
+    client: AlgodClient,
+    appIDs: List[int],
+    state_cache: Optional["GlobalStateCache"] = None,
+    max_workers: int = 16,
+) -> Dict[int, Dict[bytes, Union[int, bytes]]]:
+    """ The global state of many apps, by app ID; the states not in the cache are fetched concurrently."""
+    if not appIDs:
+        return dict()
+    with ThreadPoolExecutor(min(max_workers, len(appIDs))) as executor:
+        states = executor.map(lambda appID: get_app_global_state(client, appID, state_cache), appIDs)
+        return dict(zip(appIDs, states))
+
+class Listing(NamedTuple):
+    """Represents a listing of the multi-listing escrow contract."""
+
+    nft_id: int
+    seller: str
+    price: int
+
+def decode_listings(state: Dict[bytes, Union[int, bytes]]) -> Dict[int, Listing]:
+    """ Decode the listing table of a multi-listing contract from its global state, by NFT ID."""
+    listings: Dict[int, Listing] = dict()
+
+    for key, value in state.items():
+        # listing keys are the 8 byte NFT ID, and values the seller address followed by the 8 byte price.
+        if len(key) != 8 or not isinstance(value, bytes) or len(value) != 40:
+            continue
+        nft_id = int.from_bytes(key, "big")
+        listings[nft_id] = Listing(nft_id, encoding.encode_address(value[:32]), int.from_bytes(value[32:], "big"))
+
+    return listings
+
+def get_listings(
+    client: AlgodClient, appID: int, state_cache: Optional["GlobalStateCache"] = None
+) -> Dict[int, Listing]:
+    return decode_listings(get_app_global_state(client, appID, state_cache))
+
 
 # Account Operations
 # =============================================================================================
@@ -174,20 +374,13 @@ def generate_algorand_keypair():
 
     return private_key, address, seed_phrase
 
-creator_pk = os.environ.get("CREATOR_PK")
-buyer_pk = os.environ.get("BUYER_PK")
-seller_pk = os.environ.get("SELLER_PK")
-
-def get_account(role: str):
-    """ Get an Account class instance representing either the creator, seller or buyer account."""
-    if role == "creator":
-        private_key = creator_pk
-    elif role == "seller":
-        private_key = seller_pk
-    elif role == "buyer":
-        private_key = buyer_pk
-    else:
-        print("Invalid role. Please pass through creator, seller or buyer.")
-    return Account(private_key)
+def get_account(role: str) -> Account:
+    """ Get the Account class instance representing either the creator, seller or buyer account, from the shared keyring."""
+    from accounts import get_keyring
+
+    role_account = get_keyring().get(role)
+    if role_account is None:
+        raise Exception(f"Invalid role {role}. Please pass through creator, seller or buyer, and set its private key in .env.")
+    return role_account
 
 